@@ -0,0 +1,402 @@
+"""Нагрузочный прогон обработчиков бота без обращения к Telegram.
+
+Синтетические обновления от N пользователей проходят через
+register_handlers и настоящую базу данных (DB_CONFIG из окружения), а
+запросы к Bot API подменяются фиктивным транспортом, который только
+записывает отправленные сообщения. Пользователи получают идентификаторы
+из отдельного диапазона (--user-base), их данные удаляются после прогона.
+
+Запуск из корня проекта:
+    python -m benchmarks.handlers --users 50 --rounds 20 --threads 4
+    python -m benchmarks.handlers --baseline benchmarks/results/old.json
+
+Результат пишется в JSON: пропускная способность, p50/p95/p99 по каждому
+обработчику и число SQL-запросов на обновление.
+"""
+import os
+import json
+import math
+import time
+import random
+import logging
+import argparse
+import platform
+import threading
+import subprocess
+from collections import defaultdict
+from datetime import datetime, timezone
+from functools import wraps
+
+import psycopg2.extensions
+from telebot import TeleBot, apihelper, custom_filters, types
+
+from bot.handlers import register_handlers
+from bot.keyboards import NEXT_BUTTON, ADD_BUTTON, DELETE_BUTTON, START_BUTTON
+from database.db import Database
+
+logger = logging.getLogger(__name__)
+
+_CONTROL_BUTTONS = {NEXT_BUTTON, ADD_BUTTON, DELETE_BUTTON, START_BUTTON}
+
+
+class SqlCounter:
+    """Число выполненных SQL-запросов по потокам"""
+
+    def __init__(self):
+        self._counts = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, n: int = 1):
+        ident = threading.get_ident()
+        with self._lock:
+            self._counts[ident] += n
+
+    def get(self, ident: int = None) -> int:
+        with self._lock:
+            if ident is None:
+                return sum(self._counts.values())
+            return self._counts[ident]
+
+
+sql_counter = SqlCounter()
+
+
+class CountingCursor(psycopg2.extensions.cursor):
+    """Курсор, считающий запросы; подключается через cursor_factory"""
+
+    def execute(self, query, vars=None):
+        sql_counter.add()
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        sql_counter.add()
+        return super().executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        sql_counter.add()
+        return super().copy_expert(sql, file, size)
+
+
+class _FakeResponse:
+    status_code = 200
+    reason = "OK"
+
+    def __init__(self, payload: dict):
+        self._payload = payload
+        self.text = json.dumps(payload)
+
+    def json(self):
+        return self._payload
+
+
+class FakeTransport:
+    """Подмена HTTP-запросов TeleBot: запоминает последнюю клавиатуру в каждом чате"""
+
+    def __init__(self):
+        self.sent = 0
+        self.keyboards = {}
+        self._message_id = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, method, url, params=None, files=None, **kwargs):
+        params = params or {}
+        chat_id = int(params.get("chat_id", 0))
+        with self._lock:
+            self.sent += 1
+            self._message_id += 1
+            message_id = self._message_id
+            markup = params.get("reply_markup")
+            if markup:
+                self.keyboards[chat_id] = json.loads(markup)
+        return _FakeResponse({"ok": True, "result": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": params.get("text", ""),
+        }})
+
+    def answer_options(self, chat_id: int) -> list:
+        """Варианты ответа на последней показанной карточке"""
+        with self._lock:
+            keyboard = self.keyboards.get(chat_id)
+        if not keyboard:
+            return []
+        return [
+                button["text"] for row in keyboard["keyboard"] for button in row
+                if button["text"] not in _CONTROL_BUTTONS
+        ]
+
+
+class InlineScheduler:
+    """Планировщик без задержки: следующая карточка входит в замер ответа"""
+
+    def schedule(self, key, func, *args, delay=None):
+        func(*args)
+
+    def cancel(self, key):
+        pass
+
+    def stop(self):
+        pass
+
+
+class HandlerTimer:
+    """Время выполнения каждого обработчика"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def wrap(self, bot: TeleBot):
+        for handler in bot.message_handlers:
+            handler["function"] = self._timed(handler["function"])
+
+    def _timed(self, func):
+        @wraps(func)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    self.samples[func.__name__].append(elapsed)
+
+        return timed
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    """Перцентиль по ближайшему рангу"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples: list) -> dict:
+    values = sorted(samples)
+    return {
+            "count": len(values),
+            "mean_ms": sum(values) / len(values) * 1000 if values else 0.0,
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+    }
+
+
+def make_update(update_id: int, user_id: int, text: str) -> types.Update:
+    user = {"id": user_id, "is_bot": False, "first_name": "bench"}
+    return types.Update.de_json({
+            "update_id": update_id,
+            "message": {
+                    "message_id": update_id,
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": user,
+                    "text": text,
+            },
+    })
+
+
+class Simulation:
+    def __init__(self, bot: TeleBot, transport: FakeTransport, user_ids: list,
+                 rounds: int, next_ratio: float, seed: int):
+        self.bot = bot
+        self.transport = transport
+        self.user_ids = user_ids
+        self.rounds = rounds
+        self.next_ratio = next_ratio
+        self.seed = seed
+        self.processed = 0
+        self.sql_inline = 0
+        self._update_id = 0
+        self._lock = threading.Lock()
+
+    def _next_update_id(self) -> int:
+        with self._lock:
+            self._update_id += 1
+            return self._update_id
+
+    def _send(self, user_id: int, text: str):
+        self.bot.process_new_updates([make_update(self._next_update_id(), user_id, text)])
+
+    def _script(self, user_id: int, rng: random.Random):
+        """Тексты сообщений одного пользователя по ходу прогона"""
+        yield "/start"
+        yield START_BUTTON
+        for _ in range(self.rounds):
+            options = self.transport.answer_options(user_id)
+            if not options or rng.random() < self.next_ratio:
+                yield NEXT_BUTTON
+            else:
+                yield rng.choice(options)
+
+    def run_thread(self, user_ids: list):
+        ident = threading.get_ident()
+        sql_before = sql_counter.get(ident)
+        scripts = [
+                (user_id, self._script(user_id, random.Random(self.seed + user_id)))
+                for user_id in user_ids
+        ]
+        processed = 0
+        # Пользователи потока ходят по очереди, как в живом чате
+        while scripts:
+            for item in list(scripts):
+                user_id, script = item
+                text = next(script, None)
+                if text is None:
+                    scripts.remove(item)
+                    continue
+                self._send(user_id, text)
+                processed += 1
+
+        with self._lock:
+            self.processed += processed
+            self.sql_inline += sql_counter.get(ident) - sql_before
+
+    def run(self, threads: int) -> float:
+        chunks = [self.user_ids[i::threads] for i in range(threads)]
+        workers = [
+                threading.Thread(target=self.run_thread, args=(chunk,), name=f"bench-{i}")
+                for i, chunk in enumerate(chunks) if chunk
+        ]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return time.perf_counter() - started
+
+
+def cleanup(db: Database, user_ids: list):
+    """Удаляет данные синтетических пользователей"""
+    with db._connection() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM answer_events WHERE user_id = ANY(%s)", (user_ids,))
+        cur.execute("DELETE FROM user_stats WHERE user_id = ANY(%s)", (user_ids,))
+        cur.execute("DELETE FROM user_states WHERE user_id = ANY(%s)", (user_ids,))
+        cur.execute("DELETE FROM user_words WHERE user_id = ANY(%s)", (user_ids,))
+        cur.execute("DELETE FROM users WHERE user_id = ANY(%s)", (user_ids,))
+        conn.commit()
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(result: dict, baseline_path: str):
+    """Печатает изменение основных показателей относительно прошлого прогона"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    def change(new, old):
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    print(f"Сравнение с {baseline_path} ({baseline.get('revision')}):")
+    print(f"  updates/s: {result['throughput_ups']:.1f} "
+          f"({change(result['throughput_ups'], baseline['throughput_ups'])})")
+    print(f"  sql/update: {result['sql']['per_update_inline']:.2f} "
+          f"({change(result['sql']['per_update_inline'], baseline['sql']['per_update_inline'])})")
+    for name, stats in result["handlers"].items():
+        old = baseline["handlers"].get(name)
+        if old:
+            print(f"  {name} p95: {stats['p95_ms']:.2f} ms ({change(stats['p95_ms'], old['p95_ms'])})")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50, help="число пользователей")
+    parser.add_argument("--rounds", type=int, default=20, help="ответов на пользователя")
+    parser.add_argument("--threads", type=int, default=4, help="параллельных потоков обработки")
+    parser.add_argument("--next-ratio", type=float, default=0.1, help="доля нажатий «Дальше» вместо ответа")
+    parser.add_argument("--user-base", type=int, default=9_000_000_000, help="первый user_id")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="файл результата (по умолчанию benchmarks/results/)")
+    parser.add_argument("--baseline", help="прошлый результат для сравнения")
+    parser.add_argument("--keep-data", action="store_true", help="не удалять данные пользователей")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    transport = FakeTransport()
+    apihelper.CUSTOM_REQUEST_SENDER = transport
+
+    db = Database(cursor_factory=CountingCursor)
+    db.initialize()
+
+    # Обработчики выполняются в потоке, вызвавшем process_new_updates
+    bot = TeleBot("123456:benchmark", threaded=False)
+    register_handlers(bot, db, InlineScheduler())
+    bot.add_custom_filter(custom_filters.StateFilter(bot))
+    timer = HandlerTimer()
+    timer.wrap(bot)
+
+    user_ids = [args.user_base + i for i in range(args.users)]
+    simulation = Simulation(bot, transport, user_ids, args.rounds, args.next_ratio, args.seed)
+
+    sql_before = sql_counter.get()
+    try:
+        elapsed = simulation.run(args.threads)
+        db.flush_sessions()
+        db.flush_answers()
+        sql_total = sql_counter.get() - sql_before
+    finally:
+        if not args.keep_data:
+            cleanup(db, user_ids)
+        db.close()
+
+    processed = simulation.processed
+    result = {
+            "benchmark": "handlers",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "params": {
+                    "users": args.users,
+                    "rounds": args.rounds,
+                    "threads": args.threads,
+                    "next_ratio": args.next_ratio,
+                    "seed": args.seed,
+            },
+            "updates": processed,
+            "elapsed_s": elapsed,
+            "throughput_ups": processed / elapsed if elapsed else 0.0,
+            "messages_sent": transport.sent,
+            "sql": {
+                    "total": sql_total,
+                    "inline": simulation.sql_inline,
+                    # Запросы фонового сохранения сессий сюда не входят
+                    "per_update_inline": simulation.sql_inline / processed if processed else 0.0,
+                    "per_update_total": sql_total / processed if processed else 0.0,
+            },
+            "handlers": {name: summarize(samples) for name, samples in sorted(timer.samples.items())},
+    }
+
+    output = args.output
+    if not output:
+        os.makedirs(os.path.join("benchmarks", "results"), exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join("benchmarks", "results", f"handlers-{stamp}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    print(f"{processed} обновлений за {elapsed:.2f} с: {result['throughput_ups']:.1f} updates/s, "
+          f"{result['sql']['per_update_inline']:.2f} SQL/update")
+    for name, stats in result["handlers"].items():
+        print(f"  {name:<20} n={stats['count']:<6} p50={stats['p50_ms']:.2f} ms "
+              f"p95={stats['p95_ms']:.2f} ms p99={stats['p99_ms']:.2f} ms")
+    print(f"Результат: {output}")
+
+    if args.baseline:
+        compare(result, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""Прогон очереди исходящих сообщений против локальной заглушки Bot API.
+
+Заглушка принимает sendMessage по HTTP/1.1 (с keep-alive), как Telegram
+отвечает 429 с retry_after, если чат или бот превышает свой лимит, и
+запоминает порядок сообщений в каждом чате. apihelper.API_URL
+направляется на неё, так что Outbox работает без изменений.
+
+Запуск из корня проекта:
+    python -m benchmarks.outbox --messages 300 --chats 30 --workers 4
+
+Результат пишется в JSON: время постановки в очередь, время доставки,
+число ответов 429 и открытых соединений, сохранился ли порядок в чатах.
+"""
+import os
+import json
+import time
+import logging
+import argparse
+import platform
+import threading
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from telebot import apihelper
+
+from benchmarks.handlers import summarize, git_revision
+from bot.outbox import Outbox
+
+logger = logging.getLogger(__name__)
+
+
+class StubApi(ThreadingHTTPServer):
+    """Заглушка Bot API с лимитами: не больше chat_limit сообщений в чат
+    и global_limit сообщений всего за последнюю секунду"""
+
+    daemon_threads = True
+
+    def __init__(self, chat_limit: int, global_limit: int, latency: float):
+        self.chat_limit = chat_limit
+        self.global_limit = global_limit
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.recent = defaultdict(deque)
+        self.recent_all = deque()
+        self.delivered = defaultdict(list)
+        self.rejected = 0
+        self.connections = 0
+        super().__init__(("127.0.0.1", 0), self._make_handler())
+
+    def get_request(self):
+        request = super().get_request()
+        with self.lock:
+            self.connections += 1
+        return request
+
+    def accept(self, chat_id: str, text: str) -> bool:
+        now = time.monotonic()
+        with self.lock:
+            for window in (self.recent[chat_id], self.recent_all):
+                while window and now - window[0] >= 1:
+                    window.popleft()
+            if len(self.recent[chat_id]) >= self.chat_limit or len(self.recent_all) >= self.global_limit:
+                self.rejected += 1
+                return False
+            self.recent[chat_id].append(now)
+            self.recent_all.append(now)
+            self.delivered[chat_id].append(text)
+            return True
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                params = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode("utf-8")).items()}
+                if server.latency:
+                    time.sleep(server.latency)
+                if server.accept(params.get("chat_id"), params.get("text")):
+                    status, body = 200, {"ok": True, "result": {"message_id": 1}}
+                else:
+                    status, body = 429, {"ok": False, "error_code": 429,
+                                         "description": "Too Many Requests: retry after 1",
+                                         "parameters": {"retry_after": 1}}
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=300, help="число сообщений")
+    parser.add_argument("--chats", type=int, default=30, help="число чатов")
+    parser.add_argument("--workers", type=int, default=4, help="потоков отправки")
+    parser.add_argument("--chat-rate", type=float, default=1, help="лимит Outbox на чат, сообщений/с")
+    parser.add_argument("--chat-burst", type=int, default=3, help="запас Outbox на чат")
+    parser.add_argument("--global-rate", type=float, default=30, help="лимит Outbox на бота, сообщений/с")
+    parser.add_argument("--stub-chat-limit", type=int, default=4,
+                        help="лимит заглушки на чат за секунду (запас Outbox плюс одна секунда его лимита)")
+    parser.add_argument("--stub-global-limit", type=int, default=30, help="лимит заглушки на бота за секунду")
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка ответа заглушки, с")
+    parser.add_argument("--timeout", type=float, default=120, help="сколько ждать доставки, с")
+    parser.add_argument("--output", help="файл результата (по умолчанию benchmarks/results/)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    stub = StubApi(args.stub_chat_limit, args.stub_global_limit, args.latency)
+    threading.Thread(target=stub.serve_forever, name="stub-api", daemon=True).start()
+    host, port = stub.server_address[:2]
+    apihelper.API_URL = f"http://{host}:{port}/bot{{0}}/{{1}}"
+
+    outbox = Outbox("123456:benchmark", args.workers, args.chat_rate, args.chat_burst,
+                    args.global_rate, max_retries=5)
+    chat_ids = [1000 + i for i in range(args.chats)]
+    enqueue = []
+    started = time.perf_counter()
+    for i in range(args.messages):
+        chat_id = chat_ids[i % args.chats]
+        t = time.perf_counter()
+        outbox.send_message(chat_id, f"{i // args.chats}")
+        enqueue.append(time.perf_counter() - t)
+    outbox.close(timeout=args.timeout)
+    elapsed = time.perf_counter() - started
+    stub.shutdown()
+
+    delivered = sum(len(texts) for texts in stub.delivered.values())
+    order_ok = all(
+            [int(text) for text in texts] == sorted(int(text) for text in texts)
+            for texts in stub.delivered.values()
+    )
+    result = {
+            "benchmark": "outbox",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "params": {k: v for k, v in vars(args).items() if k != "output"},
+            "enqueue": summarize(enqueue),
+            "delivered": delivered,
+            "elapsed_s": elapsed,
+            "throughput_mps": delivered / elapsed if elapsed else 0.0,
+            "rejected_429": stub.rejected,
+            "connections": stub.connections,
+            "order_ok": order_ok,
+    }
+
+    output = args.output
+    if not output:
+        os.makedirs(os.path.join("benchmarks", "results"), exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join("benchmarks", "results", f"outbox-{stamp}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    print(f"Доставлено {delivered}/{args.messages} за {elapsed:.2f} с ({result['throughput_mps']:.1f} msg/s), "
+          f"429: {stub.rejected}, соединений: {stub.connections}, порядок {'сохранён' if order_ok else 'НАРУШЕН'}")
+    print(f"  постановка в очередь: p50={result['enqueue']['p50_ms'] * 1000:.1f} мкс "
+          f"p99={result['enqueue']['p99_ms'] * 1000:.1f} мкс")
+    print(f"Результат: {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Задержка горячих запросов Database с подготовленными запросами и без них.
+
+Два экземпляра Database (prepared_statements=True и False) по очереди
+выполняют одни и те же методы для синтетического пользователя; кэши
+колод и сессий сбрасываются перед каждым вызовом, чтобы каждый раз шёл
+запрос в БД. Данные пользователя удаляются после прогона.
+
+Запуск из корня проекта:
+    python -m benchmarks.prepared --iterations 2000
+"""
+import os
+import json
+import time
+import logging
+import argparse
+import platform
+from datetime import datetime, timezone
+
+from benchmarks.handlers import summarize, git_revision
+from database.db import Database
+
+logger = logging.getLogger(__name__)
+
+
+def hot_calls(db: Database, user_id: int, word_id: int) -> dict:
+    """Вызовы, которые замеряются: название -> функция без аргументов"""
+
+    def get_user_words():
+        db.decks.invalidate(user_id)
+        db.get_user_words(user_id)
+
+    return {
+            "get_user_state": lambda: db.get_user_state(user_id),
+            "get_word_by_id": lambda: db.get_word_by_id(word_id),
+            "get_user_words": get_user_words,
+            "update_user_state": lambda: db.update_user_state(user_id, word_id),
+    }
+
+
+def measure(variants: dict, iterations: int, warmup: int) -> dict:
+    """Чередует варианты на каждой итерации, чтобы фон влиял на них одинаково"""
+    samples = {variant: {} for variant in variants}
+    for i in range(warmup + iterations):
+        for variant, calls in variants.items():
+            for name, call in calls.items():
+                started = time.perf_counter()
+                call()
+                elapsed = time.perf_counter() - started
+                if i >= warmup:
+                    samples[variant].setdefault(name, []).append(elapsed)
+    return {
+            variant: {name: summarize(values) for name, values in sorted(by_name.items())}
+            for variant, by_name in samples.items()
+    }
+
+
+def cleanup(db: Database, user_id: int):
+    with db._connection() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM user_states WHERE user_id = %s", (user_id,))
+        cur.execute("DELETE FROM users WHERE user_id = %s", (user_id,))
+        conn.commit()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000, help="замеров на запрос")
+    parser.add_argument("--warmup", type=int, default=100, help="вызовов без замера")
+    parser.add_argument("--user-id", type=int, default=9_100_000_000)
+    parser.add_argument("--output", help="файл результата (по умолчанию benchmarks/results/)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    prepared = Database(prepared_statements=True)
+    plain = Database(prepared_statements=False)
+    prepared.initialize()
+    try:
+        words = prepared.get_user_words(args.user_id)
+        if not words:
+            raise SystemExit("В колоде пользователя нет слов - нечего замерять")
+        word_id = words[0].id
+        results = measure(
+                {
+                        "prepared": hot_calls(prepared, args.user_id, word_id),
+                        "plain": hot_calls(plain, args.user_id, word_id),
+                },
+                args.iterations, args.warmup
+        )
+    finally:
+        cleanup(prepared, args.user_id)
+        plain.close()
+        prepared.close()
+
+    result = {
+            "benchmark": "prepared",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "params": {"iterations": args.iterations, "warmup": args.warmup},
+            "queries": results,
+    }
+
+    output = args.output
+    if not output:
+        os.makedirs(os.path.join("benchmarks", "results"), exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join("benchmarks", "results", f"prepared-{stamp}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    for name, stats in results["prepared"].items():
+        base = results["plain"][name]
+        change = (stats["p50_ms"] - base["p50_ms"]) / base["p50_ms"] * 100 if base["p50_ms"] else 0.0
+        print(f"  {name:<20} p50 {base['p50_ms']:.3f} -> {stats['p50_ms']:.3f} ms ({change:+.1f}%), "
+              f"p95 {base['p95_ms']:.3f} -> {stats['p95_ms']:.3f} ms")
+    print(f"Результат: {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+import io
+import asyncio
+import tempfile
+import logging
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+
+from bot.states import AddWordStates, ImportStates
+from database.async_db import AsyncDatabase
+from database.bulk import WordListParser, ExportWriter
+from bot.async_utils import show_next_card
+from bot.keyboards import NEXT_KEYBOARD, WELCOME_KEYBOARD
+from config import NEXT_CARD_DELAY, IMPORT_MAX_FILE_SIZE, EXPORT_SPOOL_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+def register_async_handlers(bot: AsyncTeleBot, db: AsyncDatabase):
+    # Отложенные показы следующей карточки: user_id -> задача
+    pending_cards = {}
+
+    def cancel_next_card(user_id: int):
+        task = pending_cards.pop(user_id, None)
+        if task is not None:
+            task.cancel()
+
+    def schedule_next_card(message: types.Message):
+        user_id = message.from_user.id
+
+        async def delayed():
+            await asyncio.sleep(NEXT_CARD_DELAY)
+            pending_cards.pop(user_id, None)
+            await show_next_card(bot, message, db)
+
+        cancel_next_card(user_id)
+        pending_cards[user_id] = asyncio.create_task(delayed())
+
+    @bot.message_handler(commands=['start', 'help'])
+    async def send_welcome(message: types.Message):
+        chat_id = message.chat.id
+        user_id = message.from_user.id
+
+        # Очищаем состояние пользователя
+        cancel_next_card(user_id)
+        await db.clear_user_state(user_id)
+
+        welcome_text = (
+                "Привет 👋 Давай попрактикуемся в английском языке. "
+                "Тренировки можешь проходить в удобном для себя темпе.\n\n"
+                "У тебя есть возможность использовать тренажёр как конструктор:\n"
+                "- Добавить слово ➕\n"
+                "- Удалить слово 🔙\n"
+                "- Загрузить список слов: /import\n"
+                "- Выгрузить свои слова: /export (или /export jsonl)\n"
+                "- Посмотреть статистику ответов: /stats\n\n"
+                "Ну что, начнём ⬇️"
+        )
+
+        # Готовая клавиатура с кнопкой "Начать обучение"
+        markup = WELCOME_KEYBOARD
+
+        await bot.send_message(chat_id, welcome_text, reply_markup=markup)
+
+    @bot.message_handler(func=lambda m: m.text == "Начать обучение ▶️")
+    async def start_learning(message: types.Message):
+        cancel_next_card(message.from_user.id)
+        await db.clear_user_state(message.from_user.id)
+        await show_next_card(bot, message, db)
+
+    @bot.message_handler(func=lambda m: m.text == "Дальше ⏭")
+    async def next_card_handler(message: types.Message):
+        # Пользователь не стал ждать - отложенная карточка больше не нужна
+        cancel_next_card(message.from_user.id)
+
+        # Пропущенное без ответа слово уходит дальше по очереди
+        await db.skip_card(message.from_user.id)
+
+        # Готовая клавиатура с кнопкой "Дальше"
+        markup = NEXT_KEYBOARD
+
+        # Отправляем сообщение с клавиатурой
+        await bot.send_message(
+                message.chat.id,
+                "Загружаю следующую карточку...",
+                reply_markup=markup
+        )
+
+        # Показываем следующую карточку
+        await show_next_card(bot, message, db)
+
+    @bot.message_handler(func=lambda m: m.text == "Добавить слово ➕")
+    async def add_word_start(message: types.Message):
+        # Очищаем состояние перед добавлением слова
+        cancel_next_card(message.from_user.id)
+        await db.clear_user_state(message.from_user.id)
+        await bot.send_message(message.chat.id, "Введите английское слово:")
+        await bot.set_state(message.from_user.id, AddWordStates.english, message.chat.id)
+
+    @bot.message_handler(state=AddWordStates.english)
+    async def add_word_english(message: types.Message):
+        # Сохраняем английское слово во временных данных
+        async with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
+            data['english'] = message.text
+
+        await bot.send_message(message.chat.id, "Теперь введите перевод:")
+        await bot.set_state(message.from_user.id, AddWordStates.russian, message.chat.id)
+
+    @bot.message_handler(state=AddWordStates.russian)
+    async def add_word_russian(message: types.Message):
+        user_id = message.from_user.id
+        chat_id = message.chat.id
+
+        async with bot.retrieve_data(user_id, chat_id) as data:
+            english = data.get('english', '').strip()
+            russian = message.text.strip()
+
+            if not english or not russian:
+                await bot.send_message(chat_id, "Ошибка: не указано слово или перевод")
+                return
+
+            if await db.add_word(user_id, english, russian):
+                await bot.send_message(chat_id, f"Слово '{english}' добавлено!")
+            else:
+                await bot.send_message(chat_id, "Не удалось добавить слово. Попробуйте позже.")
+
+        # Очищаем состояние
+        await bot.delete_state(user_id, chat_id)
+
+        # Показываем следующую карточку
+        await show_next_card(bot, message, db)
+
+    @bot.message_handler(commands=['import'])
+    async def import_start(message: types.Message):
+        cancel_next_card(message.from_user.id)
+        await bot.send_message(
+                message.chat.id,
+                "Пришлите файл CSV/TSV или вставьте список слов, по одному на строку:\n"
+                "<code>apple - яблоко</code>\n"
+                "<code>cat;кошка</code>",
+                parse_mode="HTML"
+        )
+        await bot.set_state(message.from_user.id, ImportStates.waiting, message.chat.id)
+
+    async def import_lines(message: types.Message, lines):
+        user_id = message.from_user.id
+        chat_id = message.chat.id
+
+        parser = WordListParser(lines)
+        imported = await db.import_words(user_id, parser)
+        await bot.delete_state(user_id, chat_id)
+
+        if imported is None:
+            await bot.send_message(chat_id, "Не удалось импортировать слова. Проверьте файл и попробуйте позже.")
+        else:
+            text = f"Импортировано слов: {imported}"
+            if parser.skipped:
+                text += f"\nПропущено строк: {parser.skipped}"
+            await bot.send_message(chat_id, text)
+
+        await show_next_card(bot, message, db)
+
+    @bot.message_handler(state=ImportStates.waiting, content_types=['document'])
+    async def import_document(message: types.Message):
+        if message.document.file_size and message.document.file_size > IMPORT_MAX_FILE_SIZE:
+            await bot.send_message(
+                    message.chat.id,
+                    f"Файл слишком большой (максимум {IMPORT_MAX_FILE_SIZE // 1024} КБ)"
+            )
+            return
+
+        file_info = await bot.get_file(message.document.file_id)
+        data = await bot.download_file(file_info.file_path)
+        lines = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig", errors="replace")
+        await import_lines(message, lines)
+
+    @bot.message_handler(state=ImportStates.waiting, content_types=['text'])
+    async def import_text(message: types.Message):
+        await import_lines(message, io.StringIO(message.text))
+
+    @bot.message_handler(commands=['export'])
+    async def export_words(message: types.Message):
+        chat_id = message.chat.id
+        user_id = message.from_user.id
+
+        args = message.text.split()[1:]
+        fmt = args[0].lower() if args else "csv"
+        if fmt not in ExportWriter.FORMATS:
+            await bot.send_message(chat_id, "Доступные форматы: " + ", ".join(ExportWriter.FORMATS))
+            return
+
+        # Небольшие колоды остаются в памяти, большие уходят во временный файл
+        with tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE) as out:
+            exported = await db.export_words(user_id, out, fmt)
+            if exported is None:
+                await bot.send_message(chat_id, "Не удалось выгрузить слова. Попробуйте позже.")
+                return
+
+            out.seek(0)
+            await bot.send_document(
+                    chat_id,
+                    out,
+                    visible_file_name=f"words.{fmt}",
+                    caption=f"Ваши слова: {exported}"
+            )
+
+    @bot.message_handler(commands=['stats'])
+    async def stats_handler(message: types.Message):
+        chat_id = message.chat.id
+        stats = await db.get_user_stats(message.from_user.id)
+        if stats is None:
+            await bot.send_message(chat_id, "Не удалось получить статистику. Попробуйте позже.")
+            return
+        if not stats.answers:
+            await bot.send_message(chat_id, "Вы ещё не ответили ни на одну карточку.")
+            return
+
+        await bot.send_message(
+                chat_id,
+                f"📊 Ваша статистика\n"
+                f"Ответов: {stats.answers}\n"
+                f"Верных: {stats.correct} ({stats.accuracy:.0%})"
+        )
+
+    @bot.message_handler(func=lambda m: m.text == "Удалить слово 🔙")
+    async def delete_word_handler(message: types.Message):
+        chat_id = message.chat.id
+        user_id = message.from_user.id
+        cancel_next_card(user_id)
+
+        word = await db.get_current_word(user_id)
+        if not word:
+            await bot.send_message(chat_id, "Нет активного слова для удаления")
+            await show_next_card(bot, message, db)
+            return
+
+        # Стандартное слово скрывается только из колоды этого пользователя
+        if await db.delete_word(user_id, word.id):
+            done = "✅ Слово успешно удалено!" if word.is_custom else "✅ Стандартное слово убрано из вашей колоды"
+            await bot.send_message(chat_id, done)
+        else:
+            await bot.send_message(chat_id, "❌ Не удалось удалить слово. Попробуйте позже.")
+
+        await show_next_card(bot, message, db)
+
+    @bot.message_handler(func=lambda message: True, content_types=['text'])
+    async def handle_answer(message: types.Message):
+        chat_id = message.chat.id
+        user_id = message.from_user.id
+        user_answer = message.text
+
+        # Пропускаем команды
+        if user_answer in ["Дальше ⏭", "Добавить слово ➕", "Удалить слово 🔙", "Начать обучение ▶️"]:
+            return
+
+        # Готовая клавиатура с кнопкой "Дальше"
+        markup = NEXT_KEYBOARD
+
+        # Получаем слово текущей карточки (обычно из памяти, без запроса к БД)
+        word = await db.get_current_word(user_id)
+        if not word:
+            await bot.send_message(
+                    chat_id,
+                    "Нажмите 'Дальше ⏭' для новой карточки",
+                    reply_markup=markup
+            )
+            return
+
+        # Проверяем ответ и переносим слово в очереди повторения
+        correct = user_answer == word.english
+        if correct:
+            response = f"{user_answer} ✅"
+        else:
+            response = f"{user_answer} ❌\nПравильно: {word.english}"
+        await db.record_review(user_id, word.id, correct)
+        await db.record_answer(user_id, word.id, correct)
+
+        await bot.send_message(chat_id, response, reply_markup=markup)
+
+        # Показываем следующую карточку с задержкой, не блокируя цикл событий
+        schedule_next_card(message)
@@ -0,0 +1,64 @@
+import logging
+
+from database.async_db import AsyncDatabase
+from bot.keyboards import main_keyboard, ADD_KEYBOARD, NEXT_KEYBOARD
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+
+logger = logging.getLogger(__name__)
+
+
+async def show_next_card(bot: AsyncTeleBot, message: types.Message, db: AsyncDatabase):
+    chat_id = message.chat.id
+    user_id = message.from_user.id
+
+    try:
+        # Выбираем целевое слово и до 3 других случайных слов,
+        # состояние пользователя обновляется в том же запросе
+        card = await db.next_card(user_id, n_distractors=3)
+
+        if not card:
+            # Предлагаем добавить первое слово с клавиатурой
+            markup = ADD_KEYBOARD
+            await bot.send_message(
+                    chat_id,
+                    "У вас пока нет слов для изучения. Добавьте первое слово!",
+                    reply_markup=markup
+            )
+            return None
+
+        target = card.target
+
+        # Создаем клавиатуру
+        markup = main_keyboard([target] + card.distractors)
+
+        # Отправляем сообщение с указанием типа слова
+        word_type = "🆕 Ваше слово" if target.is_custom else "📚 Стандартное слово"
+        message_text = (
+                f"Выбери перевод слова:\n"
+                f"☐ {target.russian}\n"
+                f"<i>{word_type}</i>"
+        )
+
+        await bot.send_message(
+                chat_id,
+                message_text,
+                reply_markup=markup,
+                parse_mode="HTML"
+        )
+
+        logger.debug("Показана карточка: %s -> %s для user_id=%s", target.english, target.russian, user_id)
+        return target
+
+    except Exception as e:
+        logger.error("Ошибка при показе карточки: %s", e)
+
+        # При ошибке показываем клавиатуру для продолжения
+        markup = NEXT_KEYBOARD
+
+        await bot.send_message(
+                chat_id,
+                "Произошла ошибка. Нажмите 'Дальше ⏭' для продолжения",
+                reply_markup=markup
+        )
+        return None
@@ -1,22 +1,31 @@
-import time
+import io
 import logging
+import tempfile
 from telebot import TeleBot, types
 
-from bot.states import AddWordStates
+from bot.outbox import Outbox
+from bot.scheduler import DelayedScheduler
+from bot.states import AddWordStates, ImportStates
+from config import IMPORT_MAX_FILE_SIZE, EXPORT_SPOOL_SIZE
+from database.bulk import WordListParser, ExportWriter
 from database.db import Database
 from bot.utils import show_next_card
-from bot.keyboards import welcome_keyboard
+from bot.keyboards import NEXT_KEYBOARD, WELCOME_KEYBOARD
 
 logger = logging.getLogger(__name__)
 
 
-def register_handlers(bot: TeleBot, db: Database):
+def register_handlers(bot: TeleBot, db: Database, scheduler: DelayedScheduler, outbox: Outbox = None):
+    # Ответы уходят через очередь отправки, если она есть, иначе сразу
+    sender = outbox if outbox is not None else bot
+
     @bot.message_handler(commands=['start', 'help'])
     def send_welcome(message: types.Message):
         chat_id = message.chat.id
         user_id = message.from_user.id
 
         # Очищаем состояние пользователя
+        scheduler.cancel(user_id)
         db.clear_user_state(user_id)
 
         welcome_text = (
@@ -24,42 +33,51 @@ def register_handlers(bot: TeleBot, db: Database):
                 "Тренировки можешь проходить в удобном для себя темпе.\n\n"
                 "У тебя есть возможность использовать тренажёр как конструктор:\n"
                 "- Добавить слово ➕\n"
-                "- Удалить слово 🔙\n\n"
+                "- Удалить слово 🔙\n"
+                "- Загрузить список слов: /import\n"
+                "- Выгрузить свои слова: /export (или /export jsonl)\n"
+                "- Посмотреть статистику ответов: /stats\n\n"
                 "Ну что, начнём ⬇️"
         )
 
-        # Создаем клавиатуру с кнопкой "Начать обучение"
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        markup.add(types.KeyboardButton("Начать обучение ▶️"))
+        # Готовая клавиатура с кнопкой "Начать обучение"
+        markup = WELCOME_KEYBOARD
 
-        bot.send_message(chat_id, welcome_text, reply_markup=markup)
+        sender.send_message(chat_id, welcome_text, reply_markup=markup)
 
     @bot.message_handler(func=lambda m: m.text == "Начать обучение ▶️")
     def start_learning(message: types.Message):
+        scheduler.cancel(message.from_user.id)
         db.clear_user_state(message.from_user.id)
-        show_next_card(bot, message, db)
+        show_next_card(sender, message, db)
 
     @bot.message_handler(func=lambda m: m.text == "Дальше ⏭")
     def next_card_handler(message: types.Message):
-        # Создаем временную клавиатуру
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        markup.add(types.KeyboardButton("Дальше ⏭"))
+        # Пользователь не стал ждать - отложенная карточка больше не нужна
+        scheduler.cancel(message.from_user.id)
+
+        # Пропущенное без ответа слово уходит дальше по очереди
+        db.skip_card(message.from_user.id)
+
+        # Готовая клавиатура с кнопкой "Дальше"
+        markup = NEXT_KEYBOARD
 
         # Отправляем сообщение с клавиатурой
-        bot.send_message(
+        sender.send_message(
                 message.chat.id,
                 "Загружаю следующую карточку...",
                 reply_markup=markup
         )
 
         # Показываем следующую карточку
-        show_next_card(bot, message, db)
+        show_next_card(sender, message, db)
 
     @bot.message_handler(func=lambda m: m.text == "Добавить слово ➕")
     def add_word_start(message: types.Message):
         # Очищаем состояние перед добавлением слова
+        scheduler.cancel(message.from_user.id)
         db.clear_user_state(message.from_user.id)
-        bot.send_message(message.chat.id, "Введите английское слово:")
+        sender.send_message(message.chat.id, "Введите английское слово:")
         bot.set_state(message.from_user.id, AddWordStates.english, message.chat.id)
 
     @bot.message_handler(state=AddWordStates.english)
@@ -68,7 +86,7 @@ def register_handlers(bot: TeleBot, db: Database):
         with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
             data['english'] = message.text
 
-        bot.send_message(message.chat.id, "Теперь введите перевод:")
+        sender.send_message(message.chat.id, "Теперь введите перевод:")
         bot.set_state(message.from_user.id, AddWordStates.russian, message.chat.id)
 
     @bot.message_handler(state=AddWordStates.russian)
@@ -81,52 +99,139 @@ def register_handlers(bot: TeleBot, db: Database):
             russian = message.text.strip()
 
             if not english or not russian:
-                bot.send_message(chat_id, "Ошибка: не указано слово или перевод")
+                sender.send_message(chat_id, "Ошибка: не указано слово или перевод")
                 return
 
             if db.add_word(user_id, english, russian):
-                bot.send_message(chat_id, f"Слово '{english}' добавлено!")
+                sender.send_message(chat_id, f"Слово '{english}' добавлено!")
             else:
-                bot.send_message(chat_id, "Не удалось добавить слово. Попробуйте позже.")
+                sender.send_message(chat_id, "Не удалось добавить слово. Попробуйте позже.")
 
         # Очищаем состояние
         bot.delete_state(user_id, chat_id)
 
         # Показываем следующую карточку
-        show_next_card(bot, message, db)
+        show_next_card(sender, message, db)
 
-    @bot.message_handler(func=lambda m: m.text == "Удалить слово 🔙")
-    def delete_word_handler(message: types.Message):
+    @bot.message_handler(commands=['import'])
+    def import_start(message: types.Message):
+        scheduler.cancel(message.from_user.id)
+        sender.send_message(
+                message.chat.id,
+                "Пришлите файл CSV/TSV или вставьте список слов, по одному на строку:\n"
+                "<code>apple - яблоко</code>\n"
+                "<code>cat;кошка</code>",
+                parse_mode="HTML"
+        )
+        bot.set_state(message.from_user.id, ImportStates.waiting, message.chat.id)
+
+    def import_lines(message: types.Message, lines):
+        user_id = message.from_user.id
+        chat_id = message.chat.id
+
+        parser = WordListParser(lines)
+        imported = db.import_words(user_id, parser)
+        bot.delete_state(user_id, chat_id)
+
+        if imported is None:
+            sender.send_message(chat_id, "Не удалось импортировать слова. Проверьте файл и попробуйте позже.")
+        else:
+            text = f"Импортировано слов: {imported}"
+            if parser.skipped:
+                text += f"\nПропущено строк: {parser.skipped}"
+            sender.send_message(chat_id, text)
+
+        show_next_card(sender, message, db)
+
+    @bot.message_handler(state=ImportStates.waiting, content_types=['document'])
+    def import_document(message: types.Message):
+        if message.document.file_size and message.document.file_size > IMPORT_MAX_FILE_SIZE:
+            sender.send_message(
+                    message.chat.id,
+                    f"Файл слишком большой (максимум {IMPORT_MAX_FILE_SIZE // 1024} КБ)"
+            )
+            return
+
+        file_info = bot.get_file(message.document.file_id)
+        data = bot.download_file(file_info.file_path)
+        # Строки декодируются по мере чтения, весь текст не собирается в памяти
+        lines = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig", errors="replace")
+        import_lines(message, lines)
+
+    @bot.message_handler(state=ImportStates.waiting, content_types=['text'])
+    def import_text(message: types.Message):
+        import_lines(message, io.StringIO(message.text))
+
+    @bot.message_handler(commands=['export'])
+    def export_words(message: types.Message):
         chat_id = message.chat.id
         user_id = message.from_user.id
 
-        state = db.get_user_state(user_id)
-        if not state or state.current_word_id <= 0:
-            bot.send_message(chat_id, "Нет активного слова для удаления")
-            show_next_card(bot, message, db)
+        args = message.text.split()[1:]
+        fmt = args[0].lower() if args else "csv"
+        if fmt not in ExportWriter.FORMATS:
+            sender.send_message(chat_id, "Доступные форматы: " + ", ".join(ExportWriter.FORMATS))
             return
 
-        word = db.get_word_by_id(state.current_word_id)
-        if not word:
-            bot.send_message(chat_id, "Ошибка: слово не найдено")
-            show_next_card(bot, message, db)
+        # Небольшие колоды остаются в памяти, большие уходят во временный файл
+        out = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
+        exported = db.export_words(user_id, out, fmt)
+        if exported is None:
+            out.close()
+            sender.send_message(chat_id, "Не удалось выгрузить слова. Попробуйте позже.")
             return
 
-        if not word.is_custom:
-            bot.send_message(
+        out.seek(0)
+        if outbox is not None:
+            # Файл уходит после ответов, уже стоящих в очереди чата; закроет его outbox
+            outbox.send_document(chat_id, out, visible_file_name=f"words.{fmt}", caption=f"Ваши слова: {exported}")
+            return
+        with out:
+            bot.send_document(
                     chat_id,
-                    "⛔ Стандартные слова нельзя удалить!\n"
-                    "Вы можете удалять только слова, которые добавили сами."
+                    out,
+                    visible_file_name=f"words.{fmt}",
+                    caption=f"Ваши слова: {exported}"
             )
-            show_next_card(bot, message, db)
+
+    @bot.message_handler(commands=['stats'])
+    def stats_handler(message: types.Message):
+        chat_id = message.chat.id
+        stats = db.get_user_stats(message.from_user.id)
+        if stats is None:
+            sender.send_message(chat_id, "Не удалось получить статистику. Попробуйте позже.")
+            return
+        if not stats.answers:
+            sender.send_message(chat_id, "Вы ещё не ответили ни на одну карточку.")
+            return
+
+        sender.send_message(
+                chat_id,
+                f"📊 Ваша статистика\n"
+                f"Ответов: {stats.answers}\n"
+                f"Верных: {stats.correct} ({stats.accuracy:.0%})"
+        )
+
+    @bot.message_handler(func=lambda m: m.text == "Удалить слово 🔙")
+    def delete_word_handler(message: types.Message):
+        chat_id = message.chat.id
+        user_id = message.from_user.id
+        scheduler.cancel(user_id)
+
+        word = db.get_current_word(user_id)
+        if not word:
+            sender.send_message(chat_id, "Нет активного слова для удаления")
+            show_next_card(sender, message, db)
             return
 
-        if db.delete_word(user_id, state.current_word_id):
-            bot.send_message(chat_id, "✅ Слово успешно удалено!")
+        # Стандартное слово скрывается только из колоды этого пользователя
+        if db.delete_word(user_id, word.id):
+            done = "✅ Слово успешно удалено!" if word.is_custom else "✅ Стандартное слово убрано из вашей колоды"
+            sender.send_message(chat_id, done)
         else:
-            bot.send_message(chat_id, "❌ Не удалось удалить слово. Попробуйте позже.")
+            sender.send_message(chat_id, "❌ Не удалось удалить слово. Попробуйте позже.")
 
-        show_next_card(bot, message, db)
+        show_next_card(sender, message, db)
 
     @bot.message_handler(func=lambda message: True, content_types=['text'])
     def handle_answer(message: types.Message):
@@ -138,38 +243,29 @@ def register_handlers(bot: TeleBot, db: Database):
         if user_answer in ["Дальше ⏭", "Добавить слово ➕", "Удалить слово 🔙", "Начать обучение ▶️"]:
             return
 
-        # Создаем временную клавиатуру
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        markup.add(types.KeyboardButton("Дальше ⏭"))
-
-        # Получаем текущее состояние
-        state = db.get_user_state(user_id)
-        if not state or state.current_word_id <= 0:
-            bot.send_message(
-                    chat_id,
-                    "Нажмите 'Дальше ⏭' для новой карточки",
-                    reply_markup=markup
-            )
-            return
+        # Готовая клавиатура с кнопкой "Дальше"
+        markup = NEXT_KEYBOARD
 
-        # Получаем слово из базы данных
-        word = db.get_word_by_id(state.current_word_id)
+        # Получаем слово текущей карточки (обычно из памяти, без запроса к БД)
+        word = db.get_current_word(user_id)
         if not word:
-            bot.send_message(
+            sender.send_message(
                     chat_id,
-                    "Ошибка: слово не найдено. Нажмите 'Дальше ⏭'",
+                    "Нажмите 'Дальше ⏭' для новой карточки",
                     reply_markup=markup
             )
             return
 
-        # Проверяем ответ
-        if user_answer == word.english:
+        # Проверяем ответ и переносим слово в очереди повторения
+        correct = user_answer == word.english
+        if correct:
             response = f"{user_answer} ✅"
         else:
             response = f"{user_answer} ❌\nПравильно: {word.english}"
+        db.record_review(user_id, word.id, correct)
+        db.record_answer(user_id, word.id, correct)
 
-        bot.send_message(chat_id, response, reply_markup=markup)
+        sender.send_message(chat_id, response, reply_markup=markup)
 
-        # Показываем следующую карточку через 1 секунду
-        time.sleep(1)
-        show_next_card(bot, message, db)
\ No newline at end of file
+        # Показываем следующую карточку с задержкой, не занимая поток обработчика
+        scheduler.schedule(user_id, show_next_card, sender, message, db)
\ No newline at end of file
@@ -1,43 +1,74 @@
-from telebot import types
+import json
 import random
 import logging
+from functools import lru_cache
+
+from telebot import types
+
 logger = logging.getLogger(__name__)
-def main_keyboard(words):
-    """Создает клавиатуру с вариантами ответов"""
-    markup = types.ReplyKeyboardMarkup(row_width=2, resize_keyboard=True)
 
-    try:
-        # Создаем кнопки только для английских слов
-        english_words = [word.english for word in words]
+NEXT_BUTTON = "Дальше ⏭"
+ADD_BUTTON = "Добавить слово ➕"
+DELETE_BUTTON = "Удалить слово 🔙"
+START_BUTTON = "Начать обучение ▶️"
 
-        # Перемешиваем кнопки
-        random.shuffle(english_words)
 
-        # Добавляем кнопки вариантов ответов (максимум 4)
-        buttons = [types.KeyboardButton(word) for word in english_words[:4]]
-        for i in range(0, len(buttons), 2):
-            row = buttons[i:i + 2]
-            markup.add(*row)
+class PrebuiltMarkup(types.JsonSerializable):
+    """Клавиатура, сериализованная заранее.
+
+    TeleBot вызывает to_json() у reply_markup перед отправкой, поэтому
+    готовую строку можно передавать вместо ReplyKeyboardMarkup и
+    переиспользовать между сообщениями.
+    """
+
+    __slots__ = ("json",)
+
+    def __init__(self, json_str: str):
+        self.json = json_str
+
+    def to_json(self) -> str:
+        return self.json
+
 
-        # Добавляем управляющие кнопки
-        markup.row(
-                types.KeyboardButton("Дальше ⏭"),
-                types.KeyboardButton("Добавить слово ➕"),
-                types.KeyboardButton("Удалить слово 🔙")
-        )
+@lru_cache(maxsize=4096)
+def _button(text: str) -> str:
+    """JSON кнопки; для повторяющихся слов берётся из кеша"""
+    return json.dumps({"text": text})
+
+
+def _rows(rows) -> str:
+    return ", ".join("[" + ", ".join(_button(text) for text in row) + "]" for row in rows)
+
+
+def _keyboard(rows_json: str) -> str:
+    return '{"keyboard": [' + rows_json + '], "resize_keyboard": true}'
+
+
+_CONTROL_ROW = _rows([[NEXT_BUTTON, ADD_BUTTON, DELETE_BUTTON]])
+
+NEXT_KEYBOARD = PrebuiltMarkup(_keyboard(_rows([[NEXT_BUTTON]])))
+ADD_KEYBOARD = PrebuiltMarkup(_keyboard(_rows([[ADD_BUTTON]])))
+WELCOME_KEYBOARD = PrebuiltMarkup(_keyboard(_rows([[START_BUTTON]])))
+
+
+def main_keyboard(words):
+    """Создает клавиатуру с вариантами ответов"""
+    try:
+        # Создаем кнопки только для английских слов и перемешиваем их
+        english_words = [word.english for word in words][:4]
+        random.shuffle(english_words)
 
-        return markup
+        # Варианты ответов по два в ряд, затем управляющие кнопки
+        answers = [english_words[i:i + 2] for i in range(0, len(english_words), 2)]
+        rows_json = _rows(answers) + ", " + _CONTROL_ROW if answers else _CONTROL_ROW
+        return PrebuiltMarkup(_keyboard(rows_json))
 
     except Exception as e:
-        logger.error(f"Ошибка создания клавиатуры: {str(e)}")
+        logger.error("Ошибка создания клавиатуры: %s", e)
         # Возвращаем простую клавиатуру в случае ошибки
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        markup.add(types.KeyboardButton("Дальше ⏭"))
-        return markup
+        return NEXT_KEYBOARD
 
 
 def welcome_keyboard():
     """Клавиатура для приветственного сообщения"""
-    markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-    markup.add(types.KeyboardButton("Начать обучение ▶️"))
-    return markup
\ No newline at end of file
+    return WELCOME_KEYBOARD
@@ -0,0 +1,259 @@
+import time
+import heapq
+import queue
+import logging
+import itertools
+import threading
+from collections import deque
+
+import requests
+from telebot import apihelper
+
+from metrics import REGISTRY, TELEGRAM_LATENCY, TELEGRAM_ERRORS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_URL = "https://api.telegram.org/bot{0}/{1}"
+
+
+class TokenBucket:
+    """Ведро токенов с резервированием: acquire сразу забирает токен
+    и возвращает, сколько секунд подождать перед его использованием"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(float(self.burst), self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self) -> float:
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    def idle(self) -> bool:
+        """Ведро снова полное - его можно забыть"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self.tokens >= self.burst
+
+
+class _Worker(threading.Thread):
+    """Поток отправки для своей части чатов.
+
+    Сообщения каждого чата уходят строго по очереди; чат, упёршийся в свой
+    лимит или в retry_after, ждёт в куче по времени готовности и не
+    задерживает остальные чаты этого потока.
+    """
+
+    # Как часто забывать лимиты чатов, которым давно ничего не отправляли
+    PRUNE_EVERY = 1000
+
+    def __init__(self, outbox, index: int):
+        super().__init__(name=f"outbox-{index}", daemon=True)
+        self.outbox = outbox
+        self.inbox = queue.Queue()
+        # chat_id -> очередь (метод, параметры, файлы, попытка)
+        self._chats = {}
+        # (время готовности, порядковый номер, chat_id)
+        self._ready = []
+        self._buckets = {}
+        self._counter = itertools.count()
+        self._sent = 0
+        # Своя сессия requests: соединение с API переиспользуется (keep-alive)
+        self.session = requests.Session()
+        if apihelper.proxy:
+            self.session.proxies.update(apihelper.proxy)
+
+    @property
+    def depth(self) -> int:
+        return self.inbox.qsize() + sum(len(items) for items in list(self._chats.values()))
+
+    def _schedule(self, chat_id, at: float):
+        heapq.heappush(self._ready, (at, next(self._counter), chat_id))
+
+    def _schedule_next(self, chat_id):
+        """Резервирует токен чата для первого сообщения его очереди"""
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = TokenBucket(self.outbox.chat_rate, self.outbox.chat_burst)
+        self._schedule(chat_id, time.monotonic() + bucket.acquire())
+
+    def _accept(self, item):
+        chat_id, method, params, files = item
+        items = self._chats.get(chat_id)
+        if items is None:
+            items = self._chats[chat_id] = deque()
+        items.append((method, params, files, 0))
+        if len(items) == 1:
+            self._schedule_next(chat_id)
+
+    def run(self):
+        stopping = False
+        while not (stopping and not self._chats):
+            timeout = max(0.0, self._ready[0][0] - time.monotonic()) if self._ready else None
+            try:
+                item = self.inbox.get(timeout=timeout)
+            except queue.Empty:
+                item = False
+            if item is None:
+                stopping = True
+            elif item:
+                self._accept(item)
+
+            while self._ready and self._ready[0][0] <= time.monotonic():
+                _, _, chat_id = heapq.heappop(self._ready)
+                self._deliver(chat_id)
+        self.session.close()
+
+    def _deliver(self, chat_id):
+        items = self._chats[chat_id]
+        method, params, files, attempt = items[0]
+
+        # Общий лимит бота делят все потоки
+        delay = self.outbox.global_bucket.acquire()
+        if delay:
+            time.sleep(delay)
+
+        retry_after = self.outbox.post(self.session, method, params, files)
+        if retry_after is not None and attempt < self.outbox.max_retries:
+            self.outbox.count("retried")
+            items[0] = (method, params, files, attempt + 1)
+            self._schedule(chat_id, time.monotonic() + retry_after)
+            return
+        if retry_after is not None:
+            self.outbox.count("failed")
+            logger.error("Сообщение в чат %s не отправлено после %s попыток", chat_id, attempt + 1)
+
+        for _, content in (files or {}).values():
+            content.close()
+        items.popleft()
+        if items:
+            self._schedule_next(chat_id)
+        else:
+            del self._chats[chat_id]
+
+        self._sent += 1
+        if self._sent % self.PRUNE_EVERY == 0:
+            for idle in [c for c, b in self._buckets.items() if c not in self._chats and b.idle()]:
+                del self._buckets[idle]
+
+
+class Outbox:
+    """Очередь исходящих сообщений с отдельными потоками отправки.
+
+    Обработчик вызывает send_message или send_document и сразу
+    возвращается, а сообщение отправляет поток, за которым закреплён чат
+    (chat_id по модулю числа потоков), поэтому порядок сообщений в чате
+    сохраняется. Соблюдаются
+    лимиты Telegram: ведро токенов на каждый чат и общее на бота. На 429
+    сообщение повторяется через retry_after из ответа, на сетевые ошибки
+    и 5xx - через пару секунд, всего не больше max_retries повторов.
+
+    Адрес API берётся из apihelper.API_URL, так что для проверки его можно
+    направить на локальную заглушку (см. benchmarks/outbox.py).
+    """
+
+    def __init__(self, token: str, workers: int, chat_rate: float, chat_burst: int,
+                 global_rate: float, max_retries: int, timeout: float = 30):
+        self.token = token
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        # Общий лимит без запаса: сообщения бота идут равномерно
+        self.global_bucket = TokenBucket(global_rate, 1)
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+        self._stats = {"sent": 0, "failed": 0, "retried": 0, "rate_limited": 0}
+        self._stats_lock = threading.Lock()
+        self._workers = [_Worker(self, i) for i in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+        REGISTRY.add_collector(self.metrics_text)
+
+    def count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def metrics_text(self) -> str:
+        """Метрики очереди в текстовом формате Prometheus"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lines = [f'outbox_queue_depth{{worker="{i}"}} {w.depth}' for i, w in enumerate(self._workers)]
+        lines.extend(f"outbox_{name}_total {value}" for name, value in stats.items())
+        return "\n".join(lines) + "\n"
+
+    def send_message(self, chat_id, text: str, reply_markup=None, parse_mode: str = None):
+        """Ставит сообщение в очередь отправки (аргументы как у TeleBot.send_message)"""
+        params = {"chat_id": chat_id, "text": text}
+        if reply_markup is not None:
+            params["reply_markup"] = reply_markup.to_json()
+        if parse_mode:
+            params["parse_mode"] = parse_mode
+        self._put(chat_id, "sendMessage", params)
+
+    def send_document(self, chat_id, document, visible_file_name: str = None, caption: str = None):
+        """Ставит файл в очередь чата после уже поставленных сообщений.
+
+        document - открытый бинарный файл; после отправки (или последней
+        неудачной попытки) его закрывает поток отправки.
+        """
+        params = {"chat_id": chat_id}
+        if caption:
+            params["caption"] = caption
+        name = visible_file_name or getattr(document, "name", None) or "file"
+        self._put(chat_id, "sendDocument", params, {"document": (name, document)})
+
+    def _put(self, chat_id, method: str, params: dict, files: dict = None):
+        self._workers[hash(chat_id) % len(self._workers)].inbox.put((chat_id, method, params, files))
+
+    def post(self, session: requests.Session, method: str, params: dict, files: dict = None):
+        """Выполняет запрос к Bot API; возвращает паузу перед повтором или None"""
+        url = (apihelper.API_URL or DEFAULT_API_URL).format(self.token, method)
+        # Повторная попытка читает файлы с начала
+        for _, content in (files or {}).values():
+            content.seek(0)
+        started = time.perf_counter()
+        try:
+            response = session.post(url, data=params, files=files, timeout=self.timeout)
+            result = response.json()
+        except (requests.RequestException, ValueError) as e:
+            TELEGRAM_ERRORS.inc(method)
+            logger.warning("Ошибка отправки %s: %s", method, e)
+            return 2.0
+        finally:
+            TELEGRAM_LATENCY.observe(time.perf_counter() - started, method)
+
+        if result.get("ok"):
+            self.count("sent")
+            return None
+
+        TELEGRAM_ERRORS.inc(method)
+        if response.status_code == 429:
+            self.count("rate_limited")
+            return float(result.get("parameters", {}).get("retry_after", 1))
+        if response.status_code >= 500:
+            return 2.0
+
+        # Остальные ошибки (бот заблокирован, неверный запрос) повтор не исправит
+        self.count("failed")
+        logger.warning("Telegram отклонил %s для чата %s: %s",
+                       method, params.get('chat_id'), result.get('description'))
+        return None
+
+    def close(self, timeout: float = 10):
+        """Досылает накопленные сообщения и останавливает потоки"""
+        for worker in self._workers:
+            worker.inbox.put(None)
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            worker.join(max(0.0, deadline - time.monotonic()))
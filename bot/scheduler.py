@@ -0,0 +1,93 @@
+import heapq
+import itertools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+
+logger = logging.getLogger(__name__)
+
+
+class DelayedScheduler:
+    """Откладывает действия на заданное время, не занимая потоки обработчиков.
+
+    Задачи хранятся в куче по времени запуска, один поток ждёт ближайшую и
+    передаёт её в небольшой пул исполнителей. У каждой задачи есть ключ
+    (например, user_id): новая задача с тем же ключом заменяет старую, а
+    cancel(key) отменяет ожидающую.
+    """
+
+    def __init__(self, delay: float, workers: int):
+        self.delay = delay
+        self._heap = []
+        # key -> запись в куче; отменённые записи помечаются и пропускаются
+        self._pending = {}
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scheduler")
+        self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def schedule(self, key, func, *args, delay: float = None):
+        """Запускает func(*args) через delay секунд (по умолчанию self.delay)"""
+        run_at = monotonic() + (self.delay if delay is None else delay)
+        entry = [run_at, next(self._counter), key, func, args, True]
+        with self._cond:
+            if self._stopped:
+                return
+            self._cancel_locked(key)
+            self._pending[key] = entry
+            heapq.heappush(self._heap, entry)
+            self._cond.notify()
+
+    def cancel(self, key) -> bool:
+        """Отменяет ожидающую задачу; True, если она была"""
+        with self._cond:
+            return self._cancel_locked(key)
+
+    def _cancel_locked(self, key) -> bool:
+        entry = self._pending.pop(key, None)
+        if entry is None:
+            return False
+        entry[-1] = False
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped:
+                        return
+                    # Выбрасываем отменённые записи с вершины кучи
+                    while self._heap and not self._heap[0][-1]:
+                        heapq.heappop(self._heap)
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    timeout = self._heap[0][0] - monotonic()
+                    if timeout <= 0:
+                        break
+                    self._cond.wait(timeout)
+
+                _, _, key, func, args, _ = heapq.heappop(self._heap)
+                del self._pending[key]
+
+            self._executor.submit(self._execute, func, args)
+
+    @staticmethod
+    def _execute(func, args):
+        try:
+            func(*args)
+        except Exception as e:
+            logger.error("Ошибка в отложенной задаче: %s", e)
+
+    def stop(self):
+        """Останавливает планировщик, ожидающие задачи не выполняются"""
+        with self._cond:
+            self._stopped = True
+            self._pending.clear()
+            self._heap.clear()
+            self._cond.notify()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
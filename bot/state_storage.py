@@ -0,0 +1,201 @@
+import copy
+import logging
+import threading
+from time import monotonic
+
+from telebot.storage import StateStorageBase, StateDataContext
+
+from database.db import Database
+
+logger = logging.getLogger(__name__)
+
+# Отметка об удалении записи в очереди на сохранение
+_DELETED = object()
+
+
+class PostgresStateStorage(StateStorageBase):
+    """Хранилище состояний TeleBot в таблице bot_states.
+
+    Чтения обслуживаются локальной копией, в том числе отсутствие записи;
+    изменения сразу видны в этом процессе и сохраняются в БД фоновым
+    потоком раз в flush_interval, так что несколько set_state / save
+    одного обработчика превращаются в одну запись. Когда каждый диалог
+    обслуживает один процесс (один экземпляр бота или маршрутизация
+    обновлений по user_id), локальная копия всегда актуальна и cache_ttl
+    равен 0: БД читается только при первом обращении. Если пользователей
+    делят несколько экземпляров, cache_ttl > 0 задаёт, сколько секунд
+    доверять копии. Копии, к которым не обращались cache_idle секунд,
+    забываются после очередного сохранения.
+    """
+
+    def __init__(self, db: Database, cache_ttl: float, cache_idle: float, flush_interval: float,
+                 prefix: str = "telebot", separator: str = ":"):
+        super().__init__()
+        self.db = db
+        self.cache_ttl = cache_ttl
+        self.cache_idle = cache_idle
+        self.flush_interval = flush_interval
+        self.prefix = prefix
+        self.separator = separator
+
+        # key -> [state, data, время загрузки, время обращения]; state None - записи нет
+        self._cache = {}
+        # key -> (state, data) или _DELETED
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._writer = threading.Thread(target=self._flush_loop, name="state-writer", daemon=True)
+        self._writer.start()
+
+    def _key(self, chat_id, user_id, business_connection_id=None, message_thread_id=None,
+             bot_id=None) -> str:
+        parts = [self.prefix]
+        if bot_id:
+            parts.append(str(bot_id))
+        if business_connection_id:
+            parts.append(str(business_connection_id))
+        if message_thread_id:
+            parts.append(str(message_thread_id))
+        parts.append(str(chat_id))
+        parts.append(str(user_id))
+        return self.separator.join(parts)
+
+    def _read(self, key: str):
+        """Текущая запись (state, data) или None"""
+        with self._lock:
+            if key in self._pending:
+                record = self._pending[key]
+                return None if record is _DELETED else record
+            cached = self._cache.get(key)
+            now = monotonic()
+            if cached is not None and (not self.cache_ttl or now - cached[2] < self.cache_ttl):
+                cached[3] = now
+                return None if cached[0] is None else (cached[0], cached[1])
+
+        row = self.db.load_bot_state(key)
+        record = (row[0], row[1] or {}) if row else None
+        with self._lock:
+            # Пока мы читали, запись могла измениться локально
+            if key in self._pending:
+                pending = self._pending[key]
+                return None if pending is _DELETED else pending
+            now = monotonic()
+            self._cache[key] = [*(record or (None, None)), now, now]
+        return record
+
+    def _write(self, key: str, record):
+        with self._lock:
+            self._pending[key] = _DELETED if record is None else record
+            now = monotonic()
+            self._cache[key] = [*(record or (None, None)), now, now]
+
+    def set_state(self, chat_id, user_id, state, business_connection_id=None,
+                  message_thread_id=None, bot_id=None) -> bool:
+        if hasattr(state, "name"):
+            state = state.name
+        key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        record = self._read(key)
+        data = record[1] if record else {}
+        self._write(key, (state, data))
+        return True
+
+    def get_state(self, chat_id, user_id, business_connection_id=None,
+                  message_thread_id=None, bot_id=None):
+        key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        record = self._read(key)
+        return record[0] if record else None
+
+    def delete_state(self, chat_id, user_id, business_connection_id=None,
+                     message_thread_id=None, bot_id=None) -> bool:
+        key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        if self._read(key) is None:
+            return False
+        self._write(key, None)
+        return True
+
+    def set_data(self, chat_id, user_id, key, value, business_connection_id=None,
+                 message_thread_id=None, bot_id=None) -> bool:
+        storage_key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        record = self._read(storage_key)
+        if record is None:
+            raise RuntimeError(f"PostgresStateStorage: key {storage_key} does not exist.")
+        data = dict(record[1])
+        data[key] = value
+        self._write(storage_key, (record[0], data))
+        return True
+
+    def get_data(self, chat_id, user_id, business_connection_id=None,
+                 message_thread_id=None, bot_id=None) -> dict:
+        key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        record = self._read(key)
+        return copy.deepcopy(record[1]) if record else {}
+
+    def reset_data(self, chat_id, user_id, business_connection_id=None,
+                   message_thread_id=None, bot_id=None) -> bool:
+        key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        record = self._read(key)
+        if record is None:
+            return False
+        self._write(key, (record[0], {}))
+        return True
+
+    def get_interactive_data(self, chat_id, user_id, business_connection_id=None,
+                             message_thread_id=None, bot_id=None):
+        return StateDataContext(
+                self, chat_id=chat_id, user_id=user_id,
+                business_connection_id=business_connection_id,
+                message_thread_id=message_thread_id, bot_id=bot_id
+        )
+
+    def save(self, chat_id, user_id, data, business_connection_id=None,
+             message_thread_id=None, bot_id=None) -> bool:
+        key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        record = self._read(key)
+        if record is None:
+            return False
+        self._write(key, (record[0], copy.deepcopy(data)))
+        return True
+
+    def _flush_loop(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+            # Забываем только после сохранения: иначе чтение из БД вернуло бы старую запись
+            evicted = self.evict_idle()
+            if evicted:
+                logger.debug("Забыто %s неактивных состояний диалогов", evicted)
+
+    def evict_idle(self) -> int:
+        """Удаляет локальные копии, к которым не обращались дольше cache_idle секунд"""
+        deadline = monotonic() - self.cache_idle
+        with self._lock:
+            idle = [
+                key for key, cached in self._cache.items()
+                if cached[3] < deadline and key not in self._pending
+            ]
+            for key in idle:
+                del self._cache[key]
+            return len(idle)
+
+    def flush(self):
+        """Сохраняет накопленные изменения одной транзакцией"""
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+
+        upserts = [(key, *record) for key, record in pending.items() if record is not _DELETED]
+        deleted = [key for key, record in pending.items() if record is _DELETED]
+        try:
+            self.db.save_bot_states(upserts, deleted)
+        except Exception:
+            logger.warning("Состояния диалогов (%s) будут сохранены повторно", len(pending))
+            # Возвращаем в очередь то, что не успели перезаписать
+            with self._lock:
+                for key, record in pending.items():
+                    self._pending.setdefault(key, record)
+
+    def close(self):
+        """Останавливает фоновое сохранение и сбрасывает остаток"""
+        self._stopped.set()
+        self._writer.join()
+        self.flush()
@@ -2,4 +2,8 @@ from telebot.handler_backends import State, StatesGroup
 
 class AddWordStates(StatesGroup):
     english = State()
-    russian = State()
\ No newline at end of file
+    russian = State()
+
+
+class ImportStates(StatesGroup):
+    waiting = State()
@@ -0,0 +1,189 @@
+import time
+import queue
+import logging
+import threading
+import multiprocessing
+
+from telebot import apihelper
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Виды обновлений, в которых Telegram указывает автора
+_UPDATE_KINDS = (
+    "message", "edited_message", "callback_query", "inline_query", "chosen_inline_result",
+    "shipping_query", "pre_checkout_query", "poll_answer", "my_chat_member", "chat_member",
+    "chat_join_request", "message_reaction",
+)
+
+
+def update_user_id(update: dict):
+    """id пользователя, от которого пришло обновление; None, если автора нет"""
+    for kind in _UPDATE_KINDS:
+        payload = update.get(kind)
+        if payload:
+            sender = payload.get("from") or payload.get("user") or payload.get("chat")
+            return sender.get("id") if sender else None
+    return None
+
+
+class Supervisor:
+    """Распределяет обновления между процессами-обработчиками.
+
+    Каждый процесс получает свою ограниченную очередь и сам создаёт
+    Database и TeleBot: target(index, updates) вызывается уже в новом
+    процессе, поэтому должен быть функцией уровня модуля. Обновления
+    одного пользователя всегда попадают в один процесс (id пользователя
+    по модулю числа процессов), так что их порядок сохраняется.
+
+    Упавший процесс перезапускается с той же очередью: обновления, ещё
+    ждущие в ней, обработает новый процесс, а пачка, которую упавший уже
+    забрал (до batch_size обновлений), теряется - подтверждений нет, а
+    Telegram их повторно не пришлёт. Если процесс убит сигналом, очередь
+    могла остаться заблокированной им, поэтому она заменяется новой и
+    всё её содержимое теряется (число пишется в журнал).
+    """
+
+    def __init__(self, target, workers: int, queue_size: int, enqueue_timeout: float,
+                 check_interval: float = 1.0):
+        self.target = target
+        self.workers = workers
+        self.queue_size = queue_size
+        self.enqueue_timeout = enqueue_timeout
+        self.check_interval = check_interval
+
+        # spawn: обработчики не наследуют потоки и соединения этого процесса
+        self._context = multiprocessing.get_context("spawn")
+        self.queues = [self._context.Queue(maxsize=queue_size) for _ in range(workers)]
+        self.processes = [None] * workers
+        self.restarts = [0] * workers
+        self.rejected = [0] * workers
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._watcher = None
+
+        REGISTRY.add_collector(self.metrics_text)
+
+    def shard(self, update: dict) -> int:
+        """Номер процесса для обновления"""
+        key = update_user_id(update)
+        if key is None:
+            key = update.get("update_id", 0)
+        return key % self.workers
+
+    def queue_depth(self, index: int) -> int:
+        try:
+            return self.queues[index].qsize()
+        except NotImplementedError:
+            # macOS не поддерживает qsize для multiprocessing.Queue
+            return -1
+
+    def metrics_text(self) -> str:
+        """Метрики процессов в текстовом формате Prometheus"""
+        lines = [f"supervisor_queue_capacity {self.queue_size}"]
+        with self._lock:
+            processes = list(self.processes)
+            restarts, rejected = list(self.restarts), list(self.rejected)
+        for index in range(self.workers):
+            label = f'{{worker="{index}"}}'
+            alive = int(processes[index] is not None and processes[index].is_alive())
+            lines.append(f"supervisor_queue_depth{label} {self.queue_depth(index)}")
+            lines.append(f"supervisor_worker_up{label} {alive}")
+            lines.append(f"supervisor_worker_restarts_total{label} {restarts[index]}")
+            lines.append(f"supervisor_updates_rejected_total{label} {rejected[index]}")
+        return "\n".join(lines) + "\n"
+
+    def _spawn(self, index: int):
+        process = self._context.Process(
+                target=self.target, args=(index, self.queues[index]),
+                name=f"bot-worker-{index}", daemon=False,
+        )
+        process.start()
+        self.processes[index] = process
+        logger.info("Запущен обработчик %s (pid %s)", index, process.pid)
+
+    def start(self):
+        for index in range(self.workers):
+            self._spawn(index)
+        self._watcher = threading.Thread(target=self._watch, name="supervisor-watch", daemon=True)
+        self._watcher.start()
+
+    def _watch(self):
+        while not self._stopped.wait(self.check_interval):
+            for index in range(self.workers):
+                with self._lock:
+                    if self._stopped.is_set():
+                        return
+                    process = self.processes[index]
+                    if process.is_alive():
+                        continue
+                    logger.error("Обработчик %s завершился с кодом %s, перезапуск", index, process.exitcode)
+                    if process.exitcode is not None and process.exitcode < 0:
+                        self._replace_queue(index)
+                    self.restarts[index] += 1
+                    self._spawn(index)
+
+    def _replace_queue(self, index: int):
+        old = self.queues[index]
+        lost = self.queue_depth(index)
+        self.queues[index] = self._context.Queue(maxsize=self.queue_size)
+        # Не ждём при выходе поток, который пишет в брошенную очередь
+        old.cancel_join_thread()
+        old.close()
+        logger.warning("Очередь обработчика %s заменена, потеряно обновлений: %s", index, lost)
+
+    def dispatch(self, update: dict, timeout: float = None) -> bool:
+        """Передаёт обновление своему процессу; False, если его очередь переполнена"""
+        index = self.shard(update)
+        try:
+            self.queues[index].put(update, timeout=self.enqueue_timeout if timeout is None else timeout)
+        except queue.Full:
+            with self._lock:
+                self.rejected[index] += 1
+            logger.warning("Очередь обработчика %s переполнена (%s)", index, self.queue_size)
+            return False
+        return True
+
+    def poll(self, token: str, long_polling_timeout: int = 20):
+        """Получает обновления через getUpdates и раздаёт их процессам (блокирующий вызов).
+
+        Смещение сдвигается только после того, как обновление принято
+        очередью, поэтому при переполнении приём просто притормаживает.
+        """
+        offset = None
+        while not self._stopped.is_set():
+            try:
+                updates = apihelper.get_updates(
+                        token, offset=offset, timeout=long_polling_timeout,
+                        long_polling_timeout=long_polling_timeout,
+                )
+            except Exception as e:
+                logger.error("Ошибка получения обновлений: %s", e)
+                time.sleep(3)
+                continue
+            for update in updates:
+                while not self.dispatch(update):
+                    if self._stopped.is_set():
+                        return
+                offset = update["update_id"] + 1
+
+    def stop(self, timeout: float = 30):
+        """Просит процессы доработать свои очереди и дожидается их завершения"""
+        with self._lock:
+            self._stopped.set()
+        for index, process in enumerate(self.processes):
+            if process is not None and process.is_alive():
+                try:
+                    self.queues[index].put(None, timeout=timeout)
+                except queue.Full:
+                    pass
+        deadline = time.monotonic() + timeout
+        for index, process in enumerate(self.processes):
+            if process is None:
+                continue
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning("Обработчик %s не завершился вовремя, принудительная остановка", index)
+                process.terminate()
+                process.join()
@@ -0,0 +1,160 @@
+import time
+import threading
+
+from telebot import handler_backends, asyncio_handler_backends
+
+from metrics import UPDATES_THROTTLED
+
+
+class UserThrottle:
+    """Ограничение частоты обновлений и схлопывание повторных нажатий.
+
+    У каждого пользователя своё ведро токенов: в среднем rate обновлений
+    в секунду, не больше burst подряд (rate <= 0 - без ограничения).
+    Навигационное действие (показ следующей карточки) у пользователя
+    выполняется только одно: повторное нажатие, пришедшее, пока карточка
+    ещё показывается или в течение debounce секунд после этого,
+    отбрасывается. Повтор проверяется раньше лимита и токен не тратит.
+    """
+
+    # Как часто удалять записи пользователей, которые вернулись в исходное состояние
+    PRUNE_EVERY = 1000
+
+    def __init__(self, rate: float, burst: int, debounce: float):
+        self.rate = rate
+        self.burst = burst
+        self.debounce = debounce
+        # user_id -> [токены, время пересчёта, идёт показ карточки, время окончания показа]
+        self._users = {}
+        self._calls = 0
+        self._lock = threading.Lock()
+
+    def _state(self, user_id: int, now: float) -> list:
+        self._calls += 1
+        if self._calls % self.PRUNE_EVERY == 0:
+            self._prune(now)
+        state = self._users.get(user_id)
+        if state is None:
+            state = self._users[user_id] = [float(self.burst), now, False, None]
+        return state
+
+    def allow(self, user_id: int) -> bool:
+        """Забирает токен; False, если пользователь превысил лимит"""
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            state = self._state(user_id, now)
+            state[0] = min(float(self.burst), state[0] + (now - state[1]) * self.rate)
+            state[1] = now
+            if state[0] < 1:
+                return False
+            state[0] -= 1
+            return True
+
+    def begin(self, user_id: int) -> bool:
+        """Начинает навигационное действие; False, если это повтор"""
+        now = time.monotonic()
+        with self._lock:
+            state = self._state(user_id, now)
+            if state[2] or (state[3] is not None and now - state[3] < self.debounce):
+                return False
+            state[2] = True
+            return True
+
+    def end(self, user_id: int):
+        """Завершает навигационное действие и открывает окно debounce"""
+        with self._lock:
+            state = self._users.get(user_id)
+            if state is not None:
+                state[2] = False
+                state[3] = time.monotonic()
+
+    def cancel(self, user_id: int):
+        """Отменяет навигационное действие, которое так и не выполнялось"""
+        with self._lock:
+            state = self._users.get(user_id)
+            if state is not None:
+                state[2] = False
+
+    def _prune(self, now: float):
+        refill = self.burst / self.rate if self.rate > 0 else 0.0
+        idle = [
+            user_id for user_id, (tokens, updated_at, inflight, served_at) in self._users.items()
+            if not inflight
+            and now - updated_at >= refill
+            and (served_at is None or now - served_at >= self.debounce)
+        ]
+        for user_id in idle:
+            del self._users[user_id]
+
+
+def _check(throttle: UserThrottle, navigation, message, data: dict, in_dialog: bool) -> bool:
+    """Общая часть middleware: True, если обновление нужно отбросить"""
+    if message.from_user is None:
+        return False
+    user_id = message.from_user.id
+    is_navigation = message.text in navigation
+    if is_navigation:
+        if not throttle.begin(user_id):
+            UPDATES_THROTTLED.inc("duplicate")
+            return True
+        data["throttle_navigation"] = True
+
+    # Команды и ответы внутри диалога (добавление слова, импорт) не ограничиваются:
+    # молча потерянный ответ оставил бы пользователя в недоступном диалоге
+    if in_dialog or (message.text or "").startswith("/"):
+        return False
+    if not throttle.allow(user_id):
+        if is_navigation:
+            throttle.cancel(user_id)
+            del data["throttle_navigation"]
+        UPDATES_THROTTLED.inc("rate")
+        return True
+    return False
+
+
+class ThrottleMiddleware(handler_backends.BaseMiddleware):
+    """Применяет UserThrottle к сообщениям до обработчиков TeleBot.
+
+    Требует TeleBot(use_class_middlewares=True). navigation - тексты
+    кнопок, повторные нажатия которых схлопываются.
+    """
+
+    def __init__(self, bot, throttle: UserThrottle, navigation):
+        super().__init__()
+        self.update_types = ['message']
+        self.bot = bot
+        self.throttle = throttle
+        self.navigation = frozenset(navigation)
+
+    def pre_process(self, message, data):
+        in_dialog = message.from_user is not None \
+            and self.bot.get_state(message.from_user.id, message.chat.id) is not None
+        if _check(self.throttle, self.navigation, message, data, in_dialog):
+            return handler_backends.CancelUpdate()
+
+    def post_process(self, message, data, exception):
+        if data.get("throttle_navigation"):
+            self.throttle.end(message.from_user.id)
+
+
+class AsyncThrottleMiddleware(asyncio_handler_backends.BaseMiddleware):
+    """То же для AsyncTeleBot"""
+
+    def __init__(self, bot, throttle: UserThrottle, navigation):
+        super().__init__()
+        self.update_types = ['message']
+        self.bot = bot
+        self.throttle = throttle
+        self.navigation = frozenset(navigation)
+
+    async def pre_process(self, message, data):
+        in_dialog = message.from_user is not None \
+            and await self.bot.get_state(message.from_user.id, message.chat.id) is not None
+        if _check(self.throttle, self.navigation, message, data, in_dialog):
+            return asyncio_handler_backends.CancelUpdate()
+
+    async def post_process(self, message, data, exception):
+        if data.get("throttle_navigation"):
+            self.throttle.end(message.from_user.id)
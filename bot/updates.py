@@ -0,0 +1,40 @@
+import queue
+import logging
+
+from telebot import types
+
+logger = logging.getLogger(__name__)
+
+
+def process_updates(bot, updates, batch_size: int):
+    """Разбирает очередь обновлений пачками, пока не придёт None.
+
+    updates - queue.Queue потоков webhook-сервера или multiprocessing.Queue
+    процесса-обработчика. За раз забирается всё, что уже накопилось, но не
+    больше batch_size обновлений, и передаётся в bot.process_new_updates.
+    """
+    while True:
+        update = updates.get()
+        if update is None:
+            return
+
+        # Забираем всё, что уже накопилось, но не больше batch_size
+        batch = [update]
+        stop = False
+        while len(batch) < batch_size:
+            try:
+                update = updates.get_nowait()
+            except queue.Empty:
+                break
+            if update is None:
+                stop = True
+                break
+            batch.append(update)
+
+        try:
+            bot.process_new_updates([types.Update.de_json(u) for u in batch])
+        except Exception as e:
+            logger.error("Ошибка при обработке обновлений: %s", e)
+
+        if stop:
+            return
@@ -1,9 +1,7 @@
-import random
 import logging
 
 from database.db import Database
-from database.models import Word
-from bot.keyboards import main_keyboard
+from bot.keyboards import main_keyboard, ADD_KEYBOARD, NEXT_KEYBOARD
 from telebot import TeleBot, types
 
 logger = logging.getLogger(__name__)
@@ -14,16 +12,13 @@ def show_next_card(bot: TeleBot, message: types.Message, db: Database):
     user_id = message.from_user.id
 
     try:
-        # Гарантируем существование пользователя и стандартных слов
-        db.ensure_user_exists(user_id)
+        # Выбираем целевое слово и до 3 других случайных слов,
+        # состояние пользователя обновляется в том же запросе
+        card = db.next_card(user_id, n_distractors=3)
 
-        # Получаем слова пользователя
-        words = db.get_user_words(user_id)
-
-        if not words:
+        if not card:
             # Предлагаем добавить первое слово с клавиатурой
-            markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-            markup.add(types.KeyboardButton("Добавить слово ➕"))
+            markup = ADD_KEYBOARD
             bot.send_message(
                     chat_id,
                     "У вас пока нет слов для изучения. Добавьте первое слово!",
@@ -31,19 +26,10 @@ def show_next_card(bot: TeleBot, message: types.Message, db: Database):
             )
             return None
 
-        # Выбираем случайное целевое слово
-        target = random.choice(words)
-
-        # Выбираем 3 других случайных слова
-        other_words = [word for word in words if word.id != target.id]
-        others = random.sample(other_words, min(3, len(other_words)))
+        target = card.target
 
         # Создаем клавиатуру
-        markup = main_keyboard([target] + others)
-
-        # Обновляем состояние пользователя
-        if not db.update_user_state(user_id, target.id):
-            logger.warning(f"Не удалось обновить состояние для user_id={user_id}")
+        markup = main_keyboard([target] + card.distractors)
 
         # Отправляем сообщение с указанием типа слова
         word_type = "🆕 Ваше слово" if target.is_custom else "📚 Стандартное слово"
@@ -60,15 +46,14 @@ def show_next_card(bot: TeleBot, message: types.Message, db: Database):
                 parse_mode="HTML"
         )
 
-        logger.info(f"Показана карточка: {target.english} -> {target.russian} для user_id={user_id}")
+        logger.debug("Показана карточка: %s -> %s для user_id=%s", target.english, target.russian, user_id)
         return target
 
     except Exception as e:
-        logger.error(f"Ошибка при показе карточки: {str(e)}")
+        logger.error("Ошибка при показе карточки: %s", e)
 
         # При ошибке показываем клавиатуру для продолжения
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        markup.add(types.KeyboardButton("Дальше ⏭"))
+        markup = NEXT_KEYBOARD
 
         bot.send_message(
                 chat_id,
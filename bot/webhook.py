@@ -0,0 +1,160 @@
+import json
+import queue
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telebot import TeleBot
+
+from bot.updates import process_updates
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookServer:
+    """Локальный HTTP-сервер для приёма обновлений Telegram через webhook.
+
+    Обновления складываются в ограниченную очередь, а рабочие потоки
+    забирают их пачками и передают в bot.process_new_updates. Если очередь
+    заполнена, сервер отвечает 503 и Telegram повторит доставку позже.
+    TLS предполагается на стороне обратного прокси.
+
+    Если передан dispatch(update) -> bool, собственная очередь не
+    используется: обновление сразу отдаётся дальше (например, Supervisor),
+    и 503 возвращается, когда dispatch его не принял.
+
+    Для локальной проверки достаточно отправить сохранённый JSON обновления:
+        curl -X POST -H 'Content-Type: application/json' \\
+             -d @update.json http://127.0.0.1:8080/webhook
+    """
+
+    def __init__(self, bot: TeleBot, host: str, port: int, path: str, secret: str,
+                 queue_size: int, workers: int, batch_size: int, enqueue_timeout: float,
+                 dispatch=None):
+        self.bot = bot
+        self.dispatch = dispatch
+        self.path = path
+        self.secret = secret
+        self.workers = workers
+        self.batch_size = batch_size
+        self.enqueue_timeout = enqueue_timeout
+
+        self.updates = queue.Queue(maxsize=queue_size)
+        self.received = 0
+        self.rejected = 0
+        self._stats_lock = threading.Lock()
+        self._threads = []
+
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+
+        # Глубина очереди попадает в общий набор метрик процесса
+        REGISTRY.add_collector(self.metrics_text)
+
+    @property
+    def queue_depth(self) -> int:
+        return self.updates.qsize()
+
+    def metrics_text(self) -> str:
+        """Метрики сервера в текстовом формате Prometheus"""
+        with self._stats_lock:
+            received, rejected = self.received, self.rejected
+        return (
+                f"webhook_queue_depth {self.queue_depth}\n"
+                f"webhook_queue_capacity {self.updates.maxsize}\n"
+                f"webhook_updates_received_total {received}\n"
+                f"webhook_updates_rejected_total {rejected}\n"
+        )
+
+    def enqueue(self, update: dict) -> bool:
+        """Ставит обновление в очередь; False, если очередь переполнена"""
+        if self.dispatch is not None:
+            accepted = self.dispatch(update)
+            with self._stats_lock:
+                if accepted:
+                    self.received += 1
+                else:
+                    self.rejected += 1
+            return accepted
+        try:
+            self.updates.put(update, timeout=self.enqueue_timeout)
+        except queue.Full:
+            with self._stats_lock:
+                self.rejected += 1
+            logger.warning("Очередь обновлений переполнена (%s)", self.updates.maxsize)
+            return False
+        with self._stats_lock:
+            self.received += 1
+        return True
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != server.path:
+                    self._reply(404)
+                    return
+                token = self.headers.get("X-Telegram-Bot-Api-Secret-Token")
+                if server.secret and token != server.secret:
+                    self._reply(403)
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    update = json.loads(self.rfile.read(length))
+                except (ValueError, json.JSONDecodeError):
+                    self._reply(400)
+                    return
+                if server.enqueue(update):
+                    self._reply(200)
+                else:
+                    self._reply(503, headers={"Retry-After": "1"})
+
+            def do_GET(self):
+                if self.path == "/metrics":
+                    self._reply(200, REGISTRY.render(), "text/plain; version=0.0.4")
+                elif self.path == "/health":
+                    self._reply(200, "ok\n", "text/plain")
+                else:
+                    self._reply(404)
+
+            def _reply(self, status: int, body: str = "", content_type: str = "text/plain",
+                       headers: dict = None):
+                payload = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                if payload:
+                    self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                logger.debug("webhook: " + format % args)
+
+        return Handler
+
+    def _worker(self):
+        process_updates(self.bot, self.updates, self.batch_size)
+
+    def serve_forever(self):
+        """Запускает рабочие потоки и HTTP-сервер (блокирующий вызов)"""
+        for i in range(0 if self.dispatch is not None else self.workers):
+            thread = threading.Thread(target=self._worker, name=f"webhook-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        host, port = self.httpd.server_address[:2]
+        logger.info("Webhook-сервер слушает http://%s:%s%s", host, port, self.path)
+        self.httpd.serve_forever()
+
+    def shutdown(self):
+        """Останавливает приём и дожидается обработки очереди"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        for _ in self._threads:
+            self.updates.put(None)
+        for thread in self._threads:
+            thread.join()
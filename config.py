@@ -4,6 +4,102 @@ load_dotenv()
 import os
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
+# Количество рабочих потоков TeleBot для обработки сообщений
+BOT_NUM_THREADS = int(os.getenv("BOT_NUM_THREADS", "4"))
+# Способ получения обновлений: "polling" или "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Число процессов-обработчиков; 0 - всё в одном процессе. Иначе текущий процесс
+# только принимает обновления и раздаёт их процессам по id пользователя
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "0"))
+# Очередь каждого процесса-обработчика и размер пачки, которую он забирает за раз
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "1000"))
+WORKER_BATCH_SIZE = int(os.getenv("WORKER_BATCH_SIZE", "20"))
+
+# Ограничение частоты на пользователя: сообщений в секунду (0 - без ограничения) и запас подряд
+THROTTLE_RATE = float(os.getenv("THROTTLE_RATE", "2"))
+THROTTLE_BURST = int(os.getenv("THROTTLE_BURST", "5"))
+# Повторные «Дальше»/«Начать обучение» в течение этого времени после показа карточки отбрасываются
+THROTTLE_DEBOUNCE = float(os.getenv("THROTTLE_DEBOUNCE", "1.0"))
+
+# Исходящие сообщения: потоки отправки (0 - отправлять прямо из обработчика),
+# лимиты Telegram на чат (сообщений в секунду и запас подряд) и на весь бот,
+# число повторов после 429 и сетевых ошибок
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "4"))
+OUTBOX_CHAT_RATE = float(os.getenv("OUTBOX_CHAT_RATE", "1"))
+OUTBOX_CHAT_BURST = int(os.getenv("OUTBOX_CHAT_BURST", "3"))
+OUTBOX_GLOBAL_RATE = float(os.getenv("OUTBOX_GLOBAL_RATE", "30"))
+OUTBOX_MAX_RETRIES = int(os.getenv("OUTBOX_MAX_RETRIES", "5"))
+
+# Webhook: локальный HTTP-сервер (TLS - на обратном прокси)
+WEBHOOK_LISTEN_HOST = os.getenv("WEBHOOK_LISTEN_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+# Публичный адрес для setWebhook; пустой - webhook не регистрируется (локальная проверка)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# Ограниченная очередь обновлений и обработчики, разбирающие её пачками
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "20"))
+# Сколько секунд ждать места в очереди, прежде чем ответить 503
+WEBHOOK_ENQUEUE_TIMEOUT = float(os.getenv("WEBHOOK_ENQUEUE_TIMEOUT", "0.5"))
+
+# Журнал: уровень, файл с ротацией по размеру и очередь к потоку записи
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FILE = os.getenv("LOG_FILE", "bot_debug.log")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Доля записей DEBUG, попадающих в журнал: "логгер=N" - каждая N-я (INFO и выше пишутся всегда)
+LOG_SAMPLE_RATES = os.getenv(
+        "LOG_SAMPLE_RATES",
+        "database.db=10,database.async_db=10,bot.utils=10,bot.async_utils=10"
+)
+
+# Метрики: HTTP-эндпоинт /metrics (порт 0 - выключен) и/или периодический снимок в JSON.
+# В режиме webhook метрики также отдаются сервером webhook на /metrics.
+# При BOT_WORKERS > 0 процесс-обработчик i слушает METRICS_PORT + 1 + i,
+# а его снимок пишется в файл с суффиксом .i
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_SNAPSHOT_FILE = os.getenv("METRICS_SNAPSHOT_FILE", "")
+METRICS_SNAPSHOT_INTERVAL = float(os.getenv("METRICS_SNAPSHOT_INTERVAL", "60"))
+
+# Максимальный размер файла для массового импорта слов (в байтах)
+IMPORT_MAX_FILE_SIZE = int(os.getenv("IMPORT_MAX_FILE_SIZE", str(1024 * 1024)))
+
+# Экспорт колоды: строк за одно чтение курсора и объём файла в памяти до сброса на диск
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+EXPORT_SPOOL_SIZE = int(os.getenv("EXPORT_SPOOL_SIZE", str(1024 * 1024)))
+
+# Сессии с текущей карточкой: как часто сбрасывать их в user_states
+# и через сколько секунд простоя забывать
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", "2"))
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", "1800"))
+
+# Хранилище состояний диалогов: "memory" или "postgres"
+STATE_STORAGE = os.getenv("STATE_STORAGE", "postgres")
+# Сколько секунд доверять локальной копии состояния: 0 - всегда (один процесс
+# или BOT_WORKERS с маршрутизацией по пользователю), больше 0 - если одних и тех же
+# пользователей обслуживают несколько экземпляров бота
+STATE_CACHE_TTL = float(os.getenv("STATE_CACHE_TTL", "0"))
+# Через сколько секунд простоя забывать локальную копию и как часто сохранять изменения
+STATE_CACHE_IDLE = float(os.getenv("STATE_CACHE_IDLE", "1800"))
+STATE_FLUSH_INTERVAL = float(os.getenv("STATE_FLUSH_INTERVAL", "0.5"))
+
+# Журнал ответов: размер буфера в памяти, пачка для записи и интервал сброса (в секундах).
+# При сбое теряется не больше ответов, чем накопилось за интервал
+ANSWER_LOG_CAPACITY = int(os.getenv("ANSWER_LOG_CAPACITY", "10000"))
+ANSWER_FLUSH_SIZE = int(os.getenv("ANSWER_FLUSH_SIZE", "500"))
+ANSWER_FLUSH_INTERVAL = float(os.getenv("ANSWER_FLUSH_INTERVAL", "5"))
+
+# Через сколько минут показать снова слово, на которое ответили неверно
+SRS_RELEARN_MINUTES = int(os.getenv("SRS_RELEARN_MINUTES", "10"))
+
+# Пауза перед следующей карточкой после ответа (в секундах)
+NEXT_CARD_DELAY = float(os.getenv("NEXT_CARD_DELAY", "1"))
+# Потоки, отправляющие отложенные карточки
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "2"))
 
 DB_CONFIG = {
         "host":     os.getenv("DB_HOST"),
@@ -11,6 +107,26 @@ DB_CONFIG = {
         "user":     os.getenv("DB_USER"),
         "password": os.getenv("DB_PASSWORD"),
 }
+
+# Быстрый старт: пропускать DDL и заполнение слов, если схема не менялась
+DB_FAST_STARTUP = os.getenv("DB_FAST_STARTUP", "true").lower() in ("1", "true", "yes")
+# Горячие запросы выполнять подготовленными (PREPARE/EXECUTE) на каждом соединении
+DB_PREPARED_STATEMENTS = os.getenv("DB_PREPARED_STATEMENTS", "true").lower() in ("1", "true", "yes")
+
+# Пул соединений с БД
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+# Сколько секунд ждать свободное соединение
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+# Соединения, простоявшие дольше этого (в секундах), проверяются запросом
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "30"))
+
+# Сколько пользователей помнить как уже существующих в БД
+KNOWN_USERS_CACHE_SIZE = int(os.getenv("KNOWN_USERS_CACHE_SIZE", "10000"))
+# Кэш колод пользователей: число колод и время жизни в секундах
+DECK_CACHE_SIZE = int(os.getenv("DECK_CACHE_SIZE", "1000"))
+DECK_CACHE_TTL = float(os.getenv("DECK_CACHE_TTL", "300"))
+
 DEFAULT_WORDS = [
         ("Peace", "Мир"),
         ("Green", "Зеленый"),
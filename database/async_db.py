@@ -0,0 +1,626 @@
+# database/async_db.py
+import time
+import random
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+import asyncpg
+
+from config import (
+    ANSWER_LOG_CAPACITY,
+    ANSWER_FLUSH_SIZE,
+    ANSWER_FLUSH_INTERVAL,
+    DB_CONFIG,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_POOL_HEALTH_CHECK_INTERVAL,
+    KNOWN_USERS_CACHE_SIZE,
+    DECK_CACHE_SIZE,
+    DECK_CACHE_TTL,
+    EXPORT_BATCH_SIZE,
+    SRS_RELEARN_MINUTES,
+    SESSION_FLUSH_INTERVAL,
+    SESSION_IDLE_TIMEOUT,
+    DEFAULT_WORDS,
+)
+from database.bulk import ExportWriter
+from database.cache import KnownUserCache, DeckCache
+from database.events import AnswerLog
+from database.models import Word, UserState, UserStats, Card, quality_from_answer
+from database.migrations import (
+    FINGERPRINT_SQL,
+    MIGRATIONS_LOCK_SQL,
+    MIGRATIONS_TABLE_SQL,
+    SAVE_FINGERPRINT_SQL_ASYNC,
+    SCHEMA_META_EXISTS_SQL,
+    SEED_WORDS_SQL_ASYNC,
+    pending_migrations,
+    schema_fingerprint,
+)
+from database.schema import FUNCTIONS_SQL
+from database.session import SessionStore
+from metrics import DB_POOL_WAIT, instrument_db, record_db_error
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDatabase:
+    """Асинхронный аналог Database на пуле соединений asyncpg"""
+
+    def __init__(self):
+        self.pool = None
+        self.known_users = KnownUserCache(KNOWN_USERS_CACHE_SIZE)
+        self.decks = DeckCache(DECK_CACHE_SIZE, DECK_CACHE_TTL)
+        self.sessions = SessionStore()
+        self._flush_lock = None
+        self._writer = None
+        self.answers = AnswerLog(ANSWER_LOG_CAPACITY, ANSWER_FLUSH_SIZE)
+        self._answers_lock = None
+        self._answers_writer = None
+        # Внеочередные сохранения журнала: держим ссылки, пока задачи не завершатся
+        self._flush_tasks = set()
+
+    async def connect(self):
+        """Создаёт пул соединений"""
+        self.pool = await asyncpg.create_pool(
+                min_size=DB_POOL_MIN_SIZE,
+                max_size=DB_POOL_MAX_SIZE,
+                max_inactive_connection_lifetime=DB_POOL_HEALTH_CHECK_INTERVAL,
+                **DB_CONFIG
+        )
+        self._flush_lock = asyncio.Lock()
+        self._writer = asyncio.create_task(self._write_behind_loop())
+        self._answers_lock = asyncio.Lock()
+        self._answers_writer = asyncio.create_task(self._answer_log_loop())
+        logger.info("Соединение с базой данных установлено")
+
+    @asynccontextmanager
+    async def _connection(self):
+        """Выдаёт соединение из пула на время одной операции"""
+        started = time.monotonic()
+        try:
+            async with self.pool.acquire(timeout=DB_POOL_TIMEOUT) as conn:
+                DB_POOL_WAIT.observe(time.monotonic() - started)
+                yield conn
+        except Exception:
+            record_db_error()
+            raise
+
+    async def _write_behind_loop(self):
+        """Периодически сохраняет сессии и забывает простаивающие"""
+        while True:
+            await asyncio.sleep(SESSION_FLUSH_INTERVAL)
+            await self.flush_sessions()
+            evicted = self.sessions.evict_idle(SESSION_IDLE_TIMEOUT)
+            if evicted:
+                logger.debug("Забыто %s неактивных сессий", evicted)
+
+    async def _answer_log_loop(self):
+        """Сохраняет ответы по интервалу; по размеру пачки - см. record_answer"""
+        while True:
+            await asyncio.sleep(ANSWER_FLUSH_INTERVAL)
+            await self.flush_answers()
+
+    @instrument_db
+    async def flush_answers(self) -> int:
+        """Записывает накопленные ответы через COPY и обновляет user_stats одной транзакцией"""
+        async with self._answers_lock:
+            events = self.answers.drain()
+            if not events:
+                return 0
+            try:
+                async with self._connection() as conn, conn.transaction():
+                    await conn.copy_records_to_table(
+                            "answer_events",
+                            records=events,
+                            columns=["user_id", "word_id", "correct", "answered_at"]
+                    )
+                    await conn.execute("""
+                        INSERT INTO user_stats (user_id, answers, correct, last_answer_at)
+                        SELECT * FROM unnest($1::BIGINT[], $2::BIGINT[], $3::BIGINT[], $4::TIMESTAMPTZ[])
+                        ON CONFLICT (user_id) DO UPDATE
+                        SET answers = user_stats.answers + EXCLUDED.answers,
+                            correct = user_stats.correct + EXCLUDED.correct,
+                            last_answer_at = GREATEST(user_stats.last_answer_at, EXCLUDED.last_answer_at)
+                    """, *AnswerLog.summarize(events))
+                self.answers.committed(events)
+                logger.debug("Сохранено %s ответов", len(events))
+                return len(events)
+            except Exception as e:
+                logger.error("Ошибка при сохранении журнала ответов: %s", e)
+                self.answers.restore(events)
+                return 0
+
+    @instrument_db
+    async def flush_sessions(self) -> int:
+        """Сохраняет изменённые сессии в user_states одним запросом"""
+        async with self._flush_lock:
+            changes = self.sessions.drain_dirty()
+            if not changes:
+                return 0
+            try:
+                user_ids, word_ids = zip(*changes)
+                async with self._connection() as conn:
+                    await conn.execute("""
+                        INSERT INTO user_states (user_id, current_word_id)
+                        SELECT * FROM unnest($1::BIGINT[], $2::INTEGER[])
+                        ON CONFLICT (user_id) DO UPDATE
+                        SET current_word_id = EXCLUDED.current_word_id,
+                            last_interaction = NOW()
+                    """, list(user_ids), list(word_ids))
+                logger.debug("Сохранено %s сессий в user_states", len(changes))
+                return len(changes)
+            except Exception as e:
+                logger.error("Ошибка при сохранении сессий: %s", e)
+                self.sessions.restore_dirty(changes)
+                return 0
+
+    @instrument_db
+    async def initialize(self, force: bool = False) -> bool:
+        """Применяет новые миграции, обновляет функции и стандартные слова.
+
+        Если сохранённый отпечаток схемы совпадает с текущим, DDL и
+        заполнение пропускаются (кроме force=True). Возвращает True, если
+        инициализация выполнялась.
+        """
+        fingerprint = schema_fingerprint(DEFAULT_WORDS)
+        if not force and await self._stored_fingerprint() == fingerprint:
+            logger.info("Схема БД актуальна, инициализация пропущена")
+            return False
+
+        try:
+            async with self._connection() as conn, conn.transaction():
+                await conn.execute(MIGRATIONS_LOCK_SQL)
+                await conn.execute(MIGRATIONS_TABLE_SQL)
+                rows = await conn.fetch("SELECT version FROM schema_migrations")
+                applied = {row["version"] for row in rows}
+
+                for version, name, sql in pending_migrations(applied):
+                    await conn.execute(sql)
+                    await conn.execute(
+                            "INSERT INTO schema_migrations (version, name) VALUES ($1, $2)",
+                            version, name
+                    )
+                    logger.info("Применена миграция %s: %s", version, name)
+
+                # Серверные функции
+                await conn.execute(FUNCTIONS_SQL)
+
+                # Стандартные слова одним запросом
+                english, russian = zip(*DEFAULT_WORDS)
+                await conn.execute(SEED_WORDS_SQL_ASYNC, list(english), list(russian))
+
+                await conn.execute(SAVE_FINGERPRINT_SQL_ASYNC, fingerprint)
+
+            self.decks.clear()
+            logger.info("Добавлено %s стандартных слов", len(DEFAULT_WORDS))
+            return True
+        except Exception as e:
+            logger.error("Ошибка при инициализации БД: %s", e)
+            raise
+
+    async def _stored_fingerprint(self) -> str:
+        """Отпечаток схемы, сохранённый последней инициализацией"""
+        try:
+            async with self._connection() as conn:
+                if not await conn.fetchval(SCHEMA_META_EXISTS_SQL):
+                    return None
+                return await conn.fetchval(FINGERPRINT_SQL)
+        except Exception as e:
+            logger.warning("Не удалось прочитать версию схемы: %s", e)
+            return None
+
+    @instrument_db
+    async def ping(self) -> bool:
+        """Проверка доступности БД лёгким запросом без записи"""
+        try:
+            async with self._connection() as conn:
+                await conn.fetchval("SELECT 1")
+                return True
+        except Exception as e:
+            logger.error("БД недоступна: %s", e)
+            return False
+
+    @instrument_db
+    async def delete_word(self, user_id: int, word_id: int):
+        """Удаляет слово для пользователя"""
+        try:
+            async with self._connection() as conn:
+                # Стандартное слово может не иметь строки - она станет отметкой о скрытии
+                await conn.execute("""
+                    INSERT INTO user_words (user_id, word_id, is_deleted)
+                    VALUES ($1, $2, TRUE)
+                    ON CONFLICT (user_id, word_id)
+                    DO UPDATE SET is_deleted = TRUE
+                """, user_id, word_id)
+            self.decks.remove_word(user_id, word_id)
+            logger.info("Удалено слово word_id=%s для user_id=%s", word_id, user_id)
+            return True
+        except Exception as e:
+            logger.error("Ошибка при удалении слова: %s", e)
+            return False
+
+    @instrument_db
+    async def get_user_state(self, user_id: int) -> UserState:
+        """Получает состояние пользователя"""
+        try:
+            async with self._connection() as conn:
+                row = await conn.fetchrow("""
+                    SELECT user_id, current_word_id, last_interaction
+                    FROM user_states
+                    WHERE user_id = $1
+                """, user_id)
+            if row:
+                state = UserState(*row)
+                logger.debug("Получено состояние для user_id=%s: %s", user_id, state)
+                return state
+            return None
+        except Exception as e:
+            logger.error("Ошибка при получении состояния пользователя: %s", e)
+            return None
+
+    @instrument_db
+    async def clear_user_state(self, user_id: int):
+        """Очищает состояние пользователя"""
+        try:
+            # Блокировка не даёт фоновому сохранению вернуть удалённое состояние
+            async with self._flush_lock, self._connection() as conn:
+                self.sessions.discard(user_id)
+                await conn.execute("DELETE FROM user_states WHERE user_id = $1", user_id)
+            logger.info("Очищено состояние для user_id=%s", user_id)
+            return True
+        except Exception as e:
+            logger.error("Ошибка при очистке состояния пользователя: %s", e)
+            return False
+
+    @instrument_db
+    async def get_current_word(self, user_id: int) -> Word:
+        """Возвращает слово текущей карточки, обычно из сессии в памяти"""
+        word = self.sessions.get(user_id)
+        if word is not None:
+            return word
+
+        state = await self.get_user_state(user_id)
+        if not state or not state.current_word_id or state.current_word_id <= 0:
+            return None
+        word = await self.get_word_by_id(state.current_word_id)
+        if word is not None:
+            self.sessions.set(user_id, word, dirty=False)
+        return word
+
+    @instrument_db
+    async def get_word_by_id(self, word_id: int) -> Word:
+        """Получает слово по ID"""
+        try:
+            async with self._connection() as conn:
+                row = await conn.fetchrow("""
+                    SELECT id, english, russian, is_custom
+                    FROM words
+                    WHERE id = $1
+                """, word_id)
+            if row:
+                word = Word(*row)
+                logger.debug("Найдено слово по ID %s: %s", word_id, word.english)
+                return word
+            return None
+        except Exception as e:
+            logger.error("Ошибка при получении слова по ID: %s", e)
+            return None
+
+    @instrument_db
+    async def ensure_user_exists(self, user_id: int):
+        """Гарантирует, что пользователь существует в базе.
+
+        Стандартные слова входят в колоду неявно, поэтому новому
+        пользователю ничего не копируется.
+        """
+        if user_id in self.known_users:
+            return True
+        try:
+            async with self._connection() as conn:
+                created = await conn.fetchval("""
+                    INSERT INTO users (user_id)
+                    VALUES ($1)
+                    ON CONFLICT (user_id) DO NOTHING
+                    RETURNING TRUE
+                """, user_id)
+            if created:
+                logger.info("Добавлен новый пользователь %s", user_id)
+            self.known_users.add(user_id)
+            return True
+        except Exception as e:
+            logger.error("Ошибка при создании пользователя: %s", e)
+            return False
+
+    @instrument_db
+    async def get_user_words(self, user_id: int) -> list[Word]:
+        """Возвращает слова для пользователя"""
+        words = self.decks.get(user_id)
+        if words is not None:
+            return words
+
+        await self.ensure_user_exists(user_id)
+        try:
+            async with self._connection() as conn:
+                rows = await conn.fetch("""
+                    SELECT w.id, w.english, w.russian, w.is_custom
+                    FROM user_deck($1) d
+                    JOIN words w ON w.id = d.word_id
+                """, user_id)
+            words = [Word(*row) for row in rows]
+            self.decks.put(user_id, words)
+            logger.debug("Найдено %s слов для user_id=%s", len(words), user_id)
+            return words
+        except Exception as e:
+            logger.error("Ошибка при получении слов пользователя: %s", e)
+            return []
+
+    @instrument_db
+    async def sample_card(self, user_id: int, n_distractors: int = 3) -> Card:
+        """Выбирает случайное слово и варианты-отвлекатели без загрузки всей колоды"""
+        words = self.decks.get(user_id)
+        if words is not None:
+            if not words:
+                return None
+            picked = random.sample(words, min(n_distractors + 1, len(words)))
+            return Card(target=picked[0], distractors=picked[1:])
+
+        await self.ensure_user_exists(user_id)
+        try:
+            async with self._connection() as conn:
+                rows = await conn.fetch("""
+                    SELECT w.id, w.english, w.russian, w.is_custom
+                    FROM sample_deck($1, $2) WITH ORDINALITY AS s(word_id, pos)
+                    JOIN words w ON w.id = s.word_id
+                    ORDER BY s.pos
+                """, user_id, n_distractors + 1)
+            words = [Word(*row) for row in rows]
+            if not words:
+                return None
+            return Card(target=words[0], distractors=words[1:])
+        except Exception as e:
+            logger.error("Ошибка при выборе карточки: %s", e)
+            return None
+
+    @instrument_db
+    async def next_card(self, user_id: int, n_distractors: int = 3) -> Card:
+        """Берёт карточку из очереди повторения за один запрос и запоминает её в сессии"""
+        current = self.sessions.get(user_id)
+        try:
+            async with self._connection() as conn:
+                rows = await conn.fetch(
+                        "SELECT id, english, russian, is_custom, is_target FROM next_card($1, $2, $3)",
+                        user_id, n_distractors, current.id if current else None
+                )
+            self.known_users.add(user_id)
+            if not rows:
+                return None
+
+            target = None
+            distractors = []
+            for *fields, is_target in rows:
+                if is_target:
+                    target = Word(*fields)
+                else:
+                    distractors.append(Word(*fields))
+            random.shuffle(distractors)
+            self.sessions.set(user_id, target)
+            logger.debug("Выдана карточка word_id=%s для user_id=%s", target.id, user_id)
+            return Card(target=target, distractors=distractors)
+        except Exception as e:
+            logger.error("Ошибка при выдаче карточки: %s", e)
+            return None
+
+    @instrument_db
+    async def record_review(self, user_id: int, word_id: int, correct: bool):
+        """Обновляет интервал повторения слова по результату ответа"""
+        try:
+            async with self._connection() as conn:
+                await conn.execute(
+                        "SELECT review_word($1, $2, $3, make_interval(mins => $4))",
+                        user_id, word_id, quality_from_answer(correct), SRS_RELEARN_MINUTES
+                )
+            logger.debug("Учтён ответ для user_id=%s, word_id=%s: %s", user_id, word_id, correct)
+            return True
+        except Exception as e:
+            logger.error("Ошибка при обновлении интервала повторения: %s", e)
+            return False
+
+    @instrument_db
+    async def skip_card(self, user_id: int):
+        """Откладывает текущую карточку, которую пропустили без ответа (см. Database.skip_card)"""
+        word = await self.get_current_word(user_id)
+        if word is None:
+            return False
+        try:
+            async with self._connection() as conn:
+                await conn.execute("""
+                    SELECT review_word($1, $2, $3, make_interval(mins => $4))
+                    WHERE NOT EXISTS (
+                        SELECT 1
+                        FROM user_words uw
+                        WHERE uw.user_id = $1 AND uw.word_id = $2 AND uw.due_at > NOW()
+                    )
+                """, user_id, word.id, quality_from_answer(False), SRS_RELEARN_MINUTES)
+            logger.debug("Пропущено слово word_id=%s для user_id=%s", word.id, user_id)
+            return True
+        except Exception as e:
+            logger.error("Ошибка при пропуске карточки: %s", e)
+            return False
+
+    @instrument_db
+    async def record_answer(self, user_id: int, word_id: int, correct: bool):
+        """Добавляет ответ в журнал; в БД он попадёт со следующей пачкой"""
+        self.answers.append(user_id, word_id, correct)
+        # Пачка набралась - сохраняем, не дожидаясь интервала
+        if self.answers.ready.is_set() and not self._answers_lock.locked():
+            task = asyncio.create_task(self.flush_answers())
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+
+    @instrument_db
+    async def get_user_stats(self, user_id: int) -> UserStats:
+        """Итоги ответов пользователя, включая ещё не сохранённые"""
+        pending_answers, pending_correct = self.answers.pending(user_id)
+        try:
+            async with self._connection() as conn:
+                row = await conn.fetchrow("""
+                    SELECT answers, correct, last_answer_at
+                    FROM user_stats
+                    WHERE user_id = $1
+                """, user_id)
+        except Exception as e:
+            logger.error("Ошибка при получении статистики: %s", e)
+            return None
+
+        stats = UserStats(*row) if row else UserStats(0, 0, None)
+        stats.answers += pending_answers
+        stats.correct += pending_correct
+        return stats
+
+    @instrument_db
+    async def add_word(self, user_id: int, english: str, russian: str, is_custom=True):
+        """Добавляет слово для пользователя"""
+        await self.ensure_user_exists(user_id)
+        try:
+            async with self._connection() as conn, conn.transaction():
+                row = await conn.fetchrow("""
+                    INSERT INTO words (english, russian, is_custom)
+                    VALUES ($1, $2, $3)
+                    ON CONFLICT (english) DO UPDATE
+                    SET russian = EXCLUDED.russian
+                    RETURNING id, english, russian, is_custom
+                """, english, russian, is_custom)
+                word = Word(*row)
+
+                # Связываем слово с пользователем
+                await conn.execute("""
+                    INSERT INTO user_words (user_id, word_id)
+                    VALUES ($1, $2)
+                    ON CONFLICT (user_id, word_id)
+                    DO UPDATE SET is_deleted = FALSE
+                """, user_id, word.id)
+
+            # Перевод мог измениться у всех, у кого это слово уже есть
+            self.decks.patch_word(word)
+            self.decks.add_word(user_id, word)
+            logger.info("Добавлено слово: %s -> %s для user_id=%s", english, russian, user_id)
+            return True
+        except Exception as e:
+            logger.error("Ошибка при добавлении слова: %s", e)
+            return False
+
+    @instrument_db
+    async def import_words(self, user_id: int, pairs) -> int:
+        """Массово добавляет слова пользователю через COPY во временную таблицу"""
+        await self.ensure_user_exists(user_id)
+        try:
+            async with self._connection() as conn, conn.transaction():
+                await conn.execute("""
+                    CREATE TEMP TABLE import_staging (
+                        pos BIGSERIAL,
+                        english VARCHAR(50) NOT NULL,
+                        russian VARCHAR(50) NOT NULL
+                    ) ON COMMIT DROP
+                """)
+                await conn.copy_records_to_table(
+                        "import_staging",
+                        records=pairs,
+                        columns=["english", "russian"]
+                )
+
+                await conn.execute("""
+                    INSERT INTO words (english, russian, is_custom)
+                    SELECT DISTINCT ON (english) english, russian, TRUE
+                    FROM import_staging
+                    ORDER BY english, pos DESC
+                    ON CONFLICT (english) DO UPDATE
+                    SET russian = EXCLUDED.russian
+                """)
+
+                status = await conn.execute("""
+                    INSERT INTO user_words (user_id, word_id)
+                    SELECT $1, w.id
+                    FROM words w
+                    JOIN (SELECT DISTINCT english FROM import_staging) s
+                      ON s.english = w.english
+                    ON CONFLICT (user_id, word_id)
+                    DO UPDATE SET is_deleted = FALSE
+                """, user_id)
+                # Статус вида "INSERT 0 <число строк>"
+                imported = int(status.split()[-1])
+
+            # Переводы могли измениться и в чужих колодах
+            self.decks.clear()
+            logger.info("Импортировано %s слов для user_id=%s", imported, user_id)
+            return imported
+        except Exception as e:
+            logger.error("Ошибка при импорте слов: %s", e)
+            return None
+
+    @instrument_db
+    async def export_words(self, user_id: int, out, fmt: str = "csv") -> int:
+        """Выгружает колоду пользователя серверным курсором пачками"""
+        try:
+            writer = ExportWriter(out, fmt)
+            async with self._connection() as conn, conn.transaction():
+                cursor = await conn.cursor("""
+                    SELECT w.english, w.russian, w.is_custom
+                    FROM user_deck($1) d
+                    JOIN words w ON w.id = d.word_id
+                    ORDER BY d.word_id
+                """, user_id)
+                while True:
+                    rows = await cursor.fetch(EXPORT_BATCH_SIZE)
+                    if not rows:
+                        break
+                    writer.write_rows([tuple(row) for row in rows])
+
+            logger.info("Выгружено %s слов для user_id=%s", writer.written, user_id)
+            return writer.written
+        except Exception as e:
+            logger.error("Ошибка при экспорте слов: %s", e)
+            return None
+
+    @instrument_db
+    async def update_user_state(self, user_id: int, word_id: int):
+        """Обновляет состояние пользователя"""
+        await self.ensure_user_exists(user_id)
+        try:
+            async with self._connection() as conn:
+                await conn.execute("""
+                    INSERT INTO user_states (user_id, current_word_id)
+                    VALUES ($1, $2)
+                    ON CONFLICT (user_id) DO UPDATE
+                    SET current_word_id = EXCLUDED.current_word_id,
+                        last_interaction = NOW()
+                """, user_id, word_id)
+            # Сессия устарела - следующее чтение возьмёт состояние из БД
+            self.sessions.discard(user_id)
+            logger.debug("Обновлено состояние для user_id=%s: word_id=%s", user_id, word_id)
+            return True
+        except Exception as e:
+            logger.error("Ошибка при обновлении состояния пользователя: %s", e)
+            return False
+
+    async def close(self):
+        """Сохраняет сессии и закрывает все соединения с БД"""
+        if self._writer is not None:
+            self._writer.cancel()
+            await self.flush_sessions()
+        if self._answers_writer is not None:
+            self._answers_writer.cancel()
+            if self._flush_tasks:
+                await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+            await self.flush_answers()
+
+        logger.info("Кэш известных пользователей: %s", self.known_users.stats())
+        logger.info("Кэш колод: %s", self.decks.stats())
+        try:
+            if self.pool is not None:
+                await self.pool.close()
+            logger.info("Соединения с БД закрыты")
+        except Exception as e:
+            logger.error("Ошибка при закрытии соединения с БД: %s", e)
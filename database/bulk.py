@@ -0,0 +1,159 @@
+# database/bulk.py
+import io
+import csv
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Ограничение столбцов words.english / words.russian
+MAX_WORD_LENGTH = 50
+
+# Разделители «слово - перевод» для вставленного текста
+_TEXT_SEPARATORS = (" - ", " — ", " – ", "=")
+
+
+class WordListParser:
+    """Потоково разбирает список слов: CSV, TSV или строки «word - перевод».
+
+    Итерация по объекту даёт пары (english, russian); строки, которые не
+    удалось разобрать или которые длиннее столбцов БД, пропускаются и
+    учитываются в skipped.
+    """
+
+    def __init__(self, lines):
+        self._lines = lines
+        self.parsed = 0
+        self.skipped = 0
+
+    def __iter__(self):
+        delimiter = None
+        first = True
+        for line in self._lines:
+            line = line.strip()
+            if not line:
+                continue
+
+            # Разделитель определяется один раз по первой непустой строке
+            if delimiter is None:
+                delimiter = self._detect(line)
+            pair = self._split(line, delimiter)
+            is_first, first = first, False
+            if pair is None:
+                self.skipped += 1
+                continue
+
+            english, russian = (part.strip() for part in pair)
+            # Заголовок таблицы, если он есть
+            if is_first and english.lower() in ("english", "word", "слово"):
+                continue
+            if not english or not russian or len(english) > MAX_WORD_LENGTH \
+                    or len(russian) > MAX_WORD_LENGTH:
+                self.skipped += 1
+                continue
+
+            self.parsed += 1
+            yield english, russian
+
+    @staticmethod
+    def _detect(line: str):
+        """Разделитель строки: табуляция, затем «word - перевод», затем CSV.
+
+        Текстовые разделители проверяются раньше запятой, иначе
+        «run - бежать, бегать» разбилось бы по запятой.
+        """
+        if "\t" in line:
+            return "\t"
+        for separator in _TEXT_SEPARATORS:
+            if separator in line:
+                return separator
+        if ";" in line:
+            return ";"
+        if "," in line:
+            return ","
+        return None
+
+    @classmethod
+    def _split(cls, line: str, delimiter: str = None):
+        # Строка без разделителя документа разбирается сама по себе
+        if delimiter is None or delimiter not in line:
+            delimiter = cls._detect(line)
+        if delimiter is None:
+            return None
+        if delimiter == "\t":
+            parts = line.split("\t")
+        elif delimiter in (";", ","):
+            parts = next(csv.reader([line], delimiter=delimiter))
+        else:
+            parts = line.split(delimiter, 1)
+        if len(parts) < 2:
+            return None
+        return parts[0], parts[1]
+
+
+def _copy_escape(value: str) -> str:
+    """Экранирует значение для текстового формата COPY"""
+    return (
+            value.replace("\\", "\\\\")
+            .replace("\t", "\\t")
+            .replace("\n", "\\n")
+            .replace("\r", "\\r")
+    )
+
+
+class CopyStream:
+    """Файлоподобный объект для cursor.copy_expert, читающий строки по мере надобности.
+
+    rows - кортежи значений в порядке столбцов COPY; None записывается как NULL.
+    """
+
+    def __init__(self, rows):
+        self._rows = (
+                "\t".join("\\N" if value is None else _copy_escape(str(value)) for value in row) + "\n"
+                for row in rows
+        )
+        self._buffer = ""
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._buffer) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._buffer += row
+
+        if size < 0:
+            chunk, self._buffer = self._buffer, ""
+        else:
+            chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+
+class ExportWriter:
+    """Пишет слова пачками в бинарный файл в формате CSV или JSON Lines"""
+
+    FORMATS = ("csv", "jsonl")
+
+    def __init__(self, out, fmt: str = "csv"):
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Неизвестный формат экспорта: {fmt}")
+        self.out = out
+        self.fmt = fmt
+        self.written = 0
+        if fmt == "csv":
+            self.write_rows([("english", "russian", "is_custom")], header=True)
+
+    def write_rows(self, rows, header: bool = False):
+        """Записывает пачку строк (english, russian, is_custom)"""
+        buffer = io.StringIO()
+        if self.fmt == "csv":
+            csv.writer(buffer).writerows(rows)
+        else:
+            for english, russian, is_custom in rows:
+                buffer.write(json.dumps(
+                        {"english": english, "russian": russian, "is_custom": is_custom},
+                        ensure_ascii=False
+                ))
+                buffer.write("\n")
+        self.out.write(buffer.getvalue().encode("utf-8"))
+        if not header:
+            self.written += len(rows)
@@ -0,0 +1,119 @@
+# database/cache.py
+import time
+import threading
+from collections import OrderedDict
+
+
+class KnownUserCache:
+    """Ограниченное LRU-множество пользователей, уже подтверждённых в БД"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, user_id: int) -> bool:
+        with self._lock:
+            if user_id in self._users:
+                self._users.move_to_end(user_id)
+                self.hits += 1
+                return True
+            self.misses += 1
+            return False
+
+    def add(self, user_id: int):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._users[user_id] = None
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_size:
+                self._users.popitem(last=False)
+
+    def discard(self, user_id: int):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+    def stats(self) -> dict:
+        """Счётчики попаданий и промахов"""
+        with self._lock:
+            return {"size": len(self._users), "hits": self.hits, "misses": self.misses}
+
+
+class DeckCache:
+    """LRU-кэш колод пользователей с ограничением по времени жизни"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # user_id -> (время загрузки, кортеж слов)
+        self._decks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int):
+        """Возвращает копию колоды или None, если её нет или она устарела"""
+        with self._lock:
+            entry = self._decks.get(user_id)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self._decks.pop(user_id, None)
+                self.misses += 1
+                return None
+            self._decks.move_to_end(user_id)
+            self.hits += 1
+            return list(entry[1])
+
+    def put(self, user_id: int, words):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._decks[user_id] = (time.monotonic(), tuple(words))
+            self._decks.move_to_end(user_id)
+            while len(self._decks) > self.max_size:
+                self._decks.popitem(last=False)
+
+    def add_word(self, user_id: int, word):
+        """Добавляет слово в закэшированную колоду пользователя"""
+        with self._lock:
+            entry = self._decks.get(user_id)
+            if entry is None:
+                return
+            words = tuple(w for w in entry[1] if w.id != word.id) + (word,)
+            self._decks[user_id] = (entry[0], words)
+
+    def remove_word(self, user_id: int, word_id: int):
+        """Убирает слово из закэшированной колоды пользователя"""
+        with self._lock:
+            entry = self._decks.get(user_id)
+            if entry is None:
+                return
+            words = tuple(w for w in entry[1] if w.id != word_id)
+            self._decks[user_id] = (entry[0], words)
+
+    def patch_word(self, word):
+        """Обновляет слово во всех колодах, где оно закэшировано"""
+        with self._lock:
+            for user_id, (loaded_at, words) in list(self._decks.items()):
+                if any(w.id == word.id for w in words):
+                    words = tuple(word if w.id == word.id else w for w in words)
+                    self._decks[user_id] = (loaded_at, words)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._decks.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._decks.clear()
+
+    def stats(self) -> dict:
+        """Счётчики попаданий и промахов"""
+        with self._lock:
+            return {"size": len(self._decks), "hits": self.hits, "misses": self.misses}
@@ -1,89 +1,266 @@
 # database/db.py
-import psycopg2
+import json
+import random
 import logging
-from config import DB_CONFIG, DEFAULT_WORDS
-from database.models import Word, UserState
+import threading
+from contextlib import contextmanager
+from config import (
+    ANSWER_LOG_CAPACITY,
+    ANSWER_FLUSH_SIZE,
+    ANSWER_FLUSH_INTERVAL,
+    DB_CONFIG,
+    DB_PREPARED_STATEMENTS,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_POOL_HEALTH_CHECK_INTERVAL,
+    KNOWN_USERS_CACHE_SIZE,
+    DECK_CACHE_SIZE,
+    DECK_CACHE_TTL,
+    EXPORT_BATCH_SIZE,
+    SRS_RELEARN_MINUTES,
+    SESSION_FLUSH_INTERVAL,
+    SESSION_IDLE_TIMEOUT,
+    DEFAULT_WORDS,
+)
+from database.bulk import CopyStream, ExportWriter
+from database.cache import KnownUserCache, DeckCache
+from database.events import AnswerLog
+from database.models import Word, UserState, UserStats, Card, quality_from_answer
+from database.pool import ConnectionPool
+from database.prepared import PreparedStatements
+from database.migrations import (
+    FINGERPRINT_SQL,
+    MIGRATIONS_LOCK_SQL,
+    MIGRATIONS_TABLE_SQL,
+    SAVE_FINGERPRINT_SQL,
+    SCHEMA_META_EXISTS_SQL,
+    SEED_WORDS_SQL,
+    pending_migrations,
+    schema_fingerprint,
+)
+from database.schema import FUNCTIONS_SQL
+from database.session import SessionStore
+from metrics import instrument_db, record_db_error
 
 logger = logging.getLogger(__name__)
 
 
 class Database:
 
-    def __init__(self):
-        self.conn = psycopg2.connect(**DB_CONFIG)
-        self.conn.autocommit = False
+    def __init__(self, prepared_statements: bool = DB_PREPARED_STATEMENTS, **connect_kwargs):
+        # connect_kwargs дополняют DB_CONFIG (например, cursor_factory)
+        self.pool = ConnectionPool(
+                minconn=DB_POOL_MIN_SIZE,
+                maxconn=DB_POOL_MAX_SIZE,
+                timeout=DB_POOL_TIMEOUT,
+                health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL,
+                **{**DB_CONFIG, **connect_kwargs}
+        )
+        self.known_users = KnownUserCache(KNOWN_USERS_CACHE_SIZE)
+        self.decks = DeckCache(DECK_CACHE_SIZE, DECK_CACHE_TTL)
+        # Горячие запросы не разбираются и не планируются заново на каждый вызов
+        self.statements = PreparedStatements(prepared_statements)
+
+        # Текущие карточки в памяти, сохраняемые в user_states фоновым потоком
+        self.sessions = SessionStore()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._writer = threading.Thread(
+                target=self._write_behind_loop,
+                name="db-write-behind",
+                daemon=True
+        )
+        self._writer.start()
+
+        # Журнал ответов, сохраняемый пачками по размеру или по времени
+        self.answers = AnswerLog(ANSWER_LOG_CAPACITY, ANSWER_FLUSH_SIZE)
+        self._answers_lock = threading.Lock()
+        self._answers_writer = threading.Thread(
+                target=self._answer_log_loop,
+                name="db-answer-log",
+                daemon=True
+        )
+        self._answers_writer.start()
         logger.info("Соединение с базой данных установлено")
 
-    def initialize(self):
-        """Создает таблицы и добавляет стандартные слова"""
+    @contextmanager
+    def _connection(self, autocommit: bool = False):
+        """Выдаёт соединение из пула на время одной операции"""
         try:
-            with self.conn.cursor() as cur:
-                # Создание таблиц
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS words (
-                        id SERIAL PRIMARY KEY,
-                        english VARCHAR(50) NOT NULL UNIQUE,
-                        russian VARCHAR(50) NOT NULL,
-                        is_custom BOOLEAN DEFAULT FALSE
-                    );
-
-                    CREATE TABLE IF NOT EXISTS users (
-                        user_id BIGINT PRIMARY KEY,
-                        first_seen TIMESTAMP DEFAULT NOW()
-                    );
-
-                    CREATE TABLE IF NOT EXISTS user_words (
-                        user_id BIGINT REFERENCES users(user_id),
-                        word_id INTEGER REFERENCES words(id),
-                        is_deleted BOOLEAN DEFAULT FALSE,
-                        PRIMARY KEY (user_id, word_id)
-                    );
-
-                    CREATE TABLE IF NOT EXISTS user_states (
-                        user_id BIGINT PRIMARY KEY REFERENCES users(user_id),
-                        current_word_id INTEGER REFERENCES words(id),
-                        last_interaction TIMESTAMP DEFAULT NOW()
-                    );
-                """)
+            with self.pool.connection(autocommit=autocommit) as conn:
+                yield conn
+        except Exception:
+            record_db_error()
+            raise
 
-                # Добавление стандартных слов
-                for en, ru in DEFAULT_WORDS:
+    def _write_behind_loop(self):
+        """Периодически сохраняет сессии и забывает простаивающие"""
+        while not self._stopped.wait(SESSION_FLUSH_INTERVAL):
+            self.flush_sessions()
+            evicted = self.sessions.evict_idle(SESSION_IDLE_TIMEOUT)
+            if evicted:
+                logger.debug("Забыто %s неактивных сессий", evicted)
+
+    @instrument_db
+    def flush_sessions(self) -> int:
+        """Сохраняет изменённые сессии в user_states одним запросом"""
+        with self._flush_lock:
+            changes = self.sessions.drain_dirty()
+            if not changes:
+                return 0
+            try:
+                user_ids, word_ids = zip(*changes)
+                with self._connection(autocommit=True) as conn, conn.cursor() as cur:
                     cur.execute("""
-                                        INSERT INTO words (english, russian, is_custom)
-                                        VALUES (%s, %s, FALSE)
-                                        ON CONFLICT (english) DO UPDATE 
-                                        SET russian = EXCLUDED.russian
-                                    """, (en, ru))
-
-                self.conn.commit()
-                logger.info(f"Добавлено {len(DEFAULT_WORDS)} стандартных слов")
+                        INSERT INTO user_states (user_id, current_word_id)
+                        SELECT * FROM unnest(%s::BIGINT[], %s::INTEGER[])
+                        ON CONFLICT (user_id) DO UPDATE
+                        SET current_word_id = EXCLUDED.current_word_id,
+                            last_interaction = NOW()
+                    """, (list(user_ids), list(word_ids)))
+                logger.debug("Сохранено %s сессий в user_states", len(changes))
+                return len(changes)
+            except Exception as e:
+                logger.error("Ошибка при сохранении сессий: %s", e)
+                self.sessions.restore_dirty(changes)
+                return 0
+
+    def _answer_log_loop(self):
+        """Сохраняет ответы, как только набралась пачка или прошёл интервал"""
+        while not self._stopped.is_set():
+            self.answers.ready.wait(ANSWER_FLUSH_INTERVAL)
+            if self._stopped.is_set():
+                return
+            self.flush_answers()
+
+    @instrument_db
+    def flush_answers(self) -> int:
+        """Записывает накопленные ответы через COPY и обновляет user_stats одной транзакцией"""
+        with self._answers_lock:
+            events = self.answers.drain()
+            if not events:
+                return 0
+
+            try:
+                with self._connection() as conn, conn.cursor() as cur:
+                    cur.copy_expert(
+                            "COPY answer_events (user_id, word_id, correct, answered_at) FROM STDIN",
+                            CopyStream(events)
+                    )
+                    cur.execute("""
+                        INSERT INTO user_stats (user_id, answers, correct, last_answer_at)
+                        SELECT * FROM unnest(%s::BIGINT[], %s::BIGINT[], %s::BIGINT[], %s::TIMESTAMPTZ[])
+                        ON CONFLICT (user_id) DO UPDATE
+                        SET answers = user_stats.answers + EXCLUDED.answers,
+                            correct = user_stats.correct + EXCLUDED.correct,
+                            last_answer_at = GREATEST(user_stats.last_answer_at, EXCLUDED.last_answer_at)
+                    """, AnswerLog.summarize(events))
+                    conn.commit()
+                self.answers.committed(events)
+                logger.debug("Сохранено %s ответов", len(events))
+                return len(events)
+            except Exception as e:
+                logger.error("Ошибка при сохранении журнала ответов: %s", e)
+                self.answers.restore(events)
+                return 0
+
+    @instrument_db
+    def initialize(self, force: bool = False) -> bool:
+        """Применяет новые миграции, обновляет функции и стандартные слова.
+
+        Если сохранённый отпечаток схемы совпадает с текущим, DDL и
+        заполнение пропускаются (кроме force=True). Возвращает True, если
+        инициализация выполнялась.
+        """
+        fingerprint = schema_fingerprint(DEFAULT_WORDS)
+        if not force and self._stored_fingerprint() == fingerprint:
+            logger.info("Схема БД актуальна, инициализация пропущена")
+            return False
+
+        try:
+            with self._connection() as conn, conn.cursor() as cur:
+                cur.execute(MIGRATIONS_LOCK_SQL)
+                cur.execute(MIGRATIONS_TABLE_SQL)
+                cur.execute("SELECT version FROM schema_migrations")
+                applied = {row[0] for row in cur.fetchall()}
+
+                for version, name, sql in pending_migrations(applied):
+                    cur.execute(sql)
+                    cur.execute(
+                            "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                            (version, name)
+                    )
+                    logger.info("Применена миграция %s: %s", version, name)
+
+                # Серверные функции
+                cur.execute(FUNCTIONS_SQL)
+
+                # Стандартные слова одним запросом
+                english, russian = zip(*DEFAULT_WORDS)
+                cur.execute(SEED_WORDS_SQL, (list(english), list(russian)))
+
+                cur.execute(SAVE_FINGERPRINT_SQL, (fingerprint,))
+                conn.commit()
+                self.decks.clear()
+                logger.info("Добавлено %s стандартных слов", len(DEFAULT_WORDS))
+                return True
         except Exception as e:
-            logger.error(f"Ошибка при инициализации БД: {str(e)}")
-            self.conn.rollback()
+            logger.error("Ошибка при инициализации БД: %s", e)
             raise
 
+    def _stored_fingerprint(self) -> str:
+        """Отпечаток схемы, сохранённый последней инициализацией"""
+        try:
+            with self._connection(autocommit=True) as conn, conn.cursor() as cur:
+                cur.execute(SCHEMA_META_EXISTS_SQL)
+                if not cur.fetchone()[0]:
+                    return None
+                cur.execute(FINGERPRINT_SQL)
+                row = cur.fetchone()
+                return row[0] if row else None
+        except Exception as e:
+            logger.warning("Не удалось прочитать версию схемы: %s", e)
+            return None
+
+    @instrument_db
+    def ping(self) -> bool:
+        """Проверка доступности БД лёгким запросом без записи"""
+        try:
+            with self._connection(autocommit=True) as conn, conn.cursor() as cur:
+                cur.execute("SELECT 1")
+                cur.fetchone()
+                return True
+        except Exception as e:
+            logger.error("БД недоступна: %s", e)
+            return False
+
+    @instrument_db
     def delete_word(self, user_id: int, word_id: int):
         """Удаляет слово для пользователя"""
         try:
-            with self.conn.cursor() as cur:
+            with self._connection() as conn, conn.cursor() as cur:
+                # Стандартное слово может не иметь строки - она станет отметкой о скрытии
                 cur.execute("""
-                    UPDATE user_words 
-                    SET is_deleted = TRUE 
-                    WHERE user_id = %s AND word_id = %s
+                    INSERT INTO user_words (user_id, word_id, is_deleted)
+                    VALUES (%s, %s, TRUE)
+                    ON CONFLICT (user_id, word_id)
+                    DO UPDATE SET is_deleted = TRUE
                 """, (user_id, word_id))
-                self.conn.commit()
-                logger.info(f"Удалено слово word_id={word_id} для user_id={user_id}")
+                conn.commit()
+                self.decks.remove_word(user_id, word_id)
+                logger.info("Удалено слово word_id=%s для user_id=%s", word_id, user_id)
                 return True
         except Exception as e:
-            logger.error(f"Ошибка при удалении слова: {str(e)}")
-            self.conn.rollback()
+            logger.error("Ошибка при удалении слова: %s", e)
             return False
 
+    @instrument_db
     def get_user_state(self, user_id: int) -> UserState:
         """Получает состояние пользователя"""
         try:
-            with self.conn.cursor() as cur:
-                cur.execute("""
+            with self._connection(autocommit=True) as conn, conn.cursor() as cur:
+                self.statements.execute(cur, "get_user_state", """
                     SELECT user_id, current_word_id, last_interaction
                     FROM user_states
                     WHERE user_id = %s
@@ -91,36 +268,58 @@ class Database:
                 row = cur.fetchone()
                 if row:
                     state = UserState(*row)
-                    logger.debug(f"Получено состояние для user_id={user_id}: {state}")
+                    logger.debug("Получено состояние для user_id=%s: %s", user_id, state)
                     return state
                 return None
         except Exception as e:
-            logger.error(f"Ошибка при получении состояния пользователя: {str(e)}")
+            logger.error("Ошибка при получении состояния пользователя: %s", e)
             return None
 
 
 
+    @instrument_db
     def clear_user_state(self, user_id: int):
         """Очищает состояние пользователя"""
         try:
-            with self.conn.cursor() as cur:
+            # Блокировка не даёт фоновому сохранению вернуть удалённое состояние
+            with self._flush_lock, self._connection() as conn, conn.cursor() as cur:
+                self.sessions.discard(user_id)
                 cur.execute("""
                     DELETE FROM user_states
                     WHERE user_id = %s
                 """, (user_id,))
-                self.conn.commit()
-                logger.info(f"Очищено состояние для user_id={user_id}")
+                conn.commit()
+                logger.info("Очищено состояние для user_id=%s", user_id)
                 return True
         except Exception as e:
-            logger.error(f"Ошибка при очистке состояния пользователя: {str(e)}")
-            self.conn.rollback()
+            logger.error("Ошибка при очистке состояния пользователя: %s", e)
             return False
 
+    @instrument_db
+    def get_current_word(self, user_id: int) -> Word:
+        """Возвращает слово текущей карточки пользователя.
+
+        Обычно слово берётся из сессии в памяти; из БД оно читается только
+        после перезапуска или вытеснения неактивной сессии.
+        """
+        word = self.sessions.get(user_id)
+        if word is not None:
+            return word
+
+        state = self.get_user_state(user_id)
+        if not state or not state.current_word_id or state.current_word_id <= 0:
+            return None
+        word = self.get_word_by_id(state.current_word_id)
+        if word is not None:
+            self.sessions.set(user_id, word, dirty=False)
+        return word
+
+    @instrument_db
     def get_word_by_id(self, word_id: int) -> Word:
         """Получает слово по ID"""
         try:
-            with self.conn.cursor() as cur:
-                cur.execute("""
+            with self._connection(autocommit=True) as conn, conn.cursor() as cur:
+                self.statements.execute(cur, "get_word_by_id", """
                     SELECT id, english, russian, is_custom
                     FROM words
                     WHERE id = %s
@@ -128,135 +327,413 @@ class Database:
                 row = cur.fetchone()
                 if row:
                     word = Word(*row)
-                    logger.debug(f"Найдено слово по ID {word_id}: {word.english}")
+                    logger.debug("Найдено слово по ID %s: %s", word_id, word.english)
                     return word
                 return None
         except Exception as e:
-            logger.error(f"Ошибка при получении слова по ID: {str(e)}")
+            logger.error("Ошибка при получении слова по ID: %s", e)
             return None
 
+    @instrument_db
     def ensure_user_exists(self, user_id: int):
-        """Гарантирует, что пользователь существует в базе и добавлены стандартные слова"""
-        try:
-            with self.conn.cursor() as cur:
-                # Проверяем, существует ли пользователь
-                cur.execute("SELECT 1 FROM users WHERE user_id = %s", (user_id,))
-                user_exists = cur.fetchone()
+        """Гарантирует, что пользователь существует в базе.
 
-                if not user_exists:
-                    # Создаем пользователя
-                    cur.execute("""
-                        INSERT INTO users (user_id) 
-                        VALUES (%s)
-                        ON CONFLICT (user_id) DO NOTHING
-                    """, (user_id,))
-
-                    # Добавляем стандартные слова пользователю
-                    cur.execute("""
-                        INSERT INTO user_words (user_id, word_id)
-                        SELECT %s, id 
-                        FROM words 
-                        WHERE is_custom = FALSE
-                        ON CONFLICT (user_id, word_id) DO NOTHING
-                    """, (user_id,))
-
-                    self.conn.commit()
-                    logger.info(f"Добавлен новый пользователь {user_id} со стандартными словами")
+        Стандартные слова входят в колоду неявно, поэтому новому
+        пользователю ничего не копируется.
+        """
+        # Пользователь уже подтверждён в этом процессе - запрос не нужен
+        if user_id in self.known_users:
+            return True
+        try:
+            with self._connection(autocommit=True) as conn, conn.cursor() as cur:
+                self.statements.execute(cur, "ensure_user_exists", """
+                    INSERT INTO users (user_id)
+                    VALUES (%s)
+                    ON CONFLICT (user_id) DO NOTHING
+                """, (user_id,))
+                if cur.rowcount:
+                    logger.info("Добавлен новый пользователь %s", user_id)
+                self.known_users.add(user_id)
                 return True
         except Exception as e:
-            logger.error(f"Ошибка при создании пользователя: {str(e)}")
-            self.conn.rollback()
+            logger.error("Ошибка при создании пользователя: %s", e)
             return False
 
+    @instrument_db
     def get_user_words(self, user_id: int) -> list[Word]:
         """Возвращает слова для пользователя"""
+        words = self.decks.get(user_id)
+        if words is not None:
+            return words
+
         self.ensure_user_exists(user_id)
         try:
-            with self.conn.cursor() as cur:
-                cur.execute("""
-                    SELECT w.id, w.english, w.russian, w.is_custom 
-                    FROM words w
-                    JOIN user_words uw ON w.id = uw.word_id
-                    WHERE uw.user_id = %s AND uw.is_deleted = FALSE
+            with self._connection(autocommit=True) as conn, conn.cursor() as cur:
+                self.statements.execute(cur, "get_user_words", """
+                    SELECT w.id, w.english, w.russian, w.is_custom
+                    FROM user_deck(%s) d
+                    JOIN words w ON w.id = d.word_id
                 """, (user_id,))
                 words = [Word(*row) for row in cur.fetchall()]
-                logger.debug(f"Найдено {len(words)} слов для user_id={user_id}")
+                self.decks.put(user_id, words)
+                logger.debug("Найдено %s слов для user_id=%s", len(words), user_id)
                 return words
         except Exception as e:
-            logger.error(f"Ошибка при получении слов пользователя: {str(e)}")
+            logger.error("Ошибка при получении слов пользователя: %s", e)
             return []
 
+    @instrument_db
+    def sample_card(self, user_id: int, n_distractors: int = 3) -> Card:
+        """Выбирает случайное слово и варианты-отвлекатели без загрузки всей колоды.
+
+        Если колода уже в кэше, выбор делается в памяти. Иначе работает
+        серверная функция sample_deck: небольшую колоду она перемешивает
+        целиком, в большой для каждого слова берёт случайную точку между
+        минимальным и максимальным word_id и по индексам находит ближайшее
+        ещё не выбранное слово справа - стоимость не зависит от размера
+        колоды. Вариантов всегда min(n_distractors, размер колоды - 1).
+        id слов общие для всех пользователей, поэтому в большой колоде
+        слова после длинных «дыр» в нумерации выпадают заметно чаще.
+        """
+        words = self.decks.get(user_id)
+        if words is not None:
+            if not words:
+                return None
+            picked = random.sample(words, min(n_distractors + 1, len(words)))
+            return Card(target=picked[0], distractors=picked[1:])
+
+        self.ensure_user_exists(user_id)
+        try:
+            with self._connection(autocommit=True) as conn, conn.cursor() as cur:
+                cur.execute("""
+                    SELECT w.id, w.english, w.russian, w.is_custom
+                    FROM sample_deck(%s, %s) WITH ORDINALITY AS s(word_id, pos)
+                    JOIN words w ON w.id = s.word_id
+                    ORDER BY s.pos
+                """, (user_id, n_distractors + 1))
+                words = [Word(*row) for row in cur.fetchall()]
+                if not words:
+                    return None
+                logger.debug("Выбрано %s слов для карточки user_id=%s", len(words), user_id)
+                return Card(target=words[0], distractors=words[1:])
+        except Exception as e:
+            logger.error("Ошибка при выборе карточки: %s", e)
+            return None
+
+    @instrument_db
+    def next_card(self, user_id: int, n_distractors: int = 3) -> Card:
+        """Берёт карточку из очереди повторения за один запрос.
+
+        Серверная функция next_card создаёт пользователя, выбирает слово с
+        самым ранним due_at по индексу (user_id, due_at) и случайные
+        варианты ответа. Выбранное слово запоминается в сессии и попадает в
+        user_states при следующем фоновом сохранении.
+        """
+        current = self.sessions.get(user_id)
+        try:
+            with self._connection(autocommit=True) as conn, conn.cursor() as cur:
+                self.statements.execute(
+                        cur, "next_card",
+                        "SELECT id, english, russian, is_custom, is_target FROM next_card(%s, %s, %s)",
+                        (user_id, n_distractors, current.id if current else None)
+                )
+                rows = cur.fetchall()
+                self.known_users.add(user_id)
+                if not rows:
+                    return None
+
+                target = None
+                distractors = []
+                for *fields, is_target in rows:
+                    if is_target:
+                        target = Word(*fields)
+                    else:
+                        distractors.append(Word(*fields))
+                random.shuffle(distractors)
+                self.sessions.set(user_id, target)
+                logger.debug("Выдана карточка word_id=%s для user_id=%s", target.id, user_id)
+                return Card(target=target, distractors=distractors)
+        except Exception as e:
+            logger.error("Ошибка при выдаче карточки: %s", e)
+            return None
+
+    @instrument_db
+    def record_review(self, user_id: int, word_id: int, correct: bool):
+        """Обновляет интервал повторения слова по результату ответа"""
+        try:
+            with self._connection(autocommit=True) as conn, conn.cursor() as cur:
+                self.statements.execute(
+                        cur, "record_review",
+                        "SELECT review_word(%s, %s, %s, make_interval(mins => %s))",
+                        (user_id, word_id, quality_from_answer(correct), SRS_RELEARN_MINUTES)
+                )
+                logger.debug("Учтён ответ для user_id=%s, word_id=%s: %s", user_id, word_id, correct)
+                return True
+        except Exception as e:
+            logger.error("Ошибка при обновлении интервала повторения: %s", e)
+            return False
+
+    @instrument_db
+    def skip_card(self, user_id: int):
+        """Откладывает текущую карточку, которую пропустили без ответа.
+
+        Пропуск учитывается как неверный ответ, иначе слово осталось бы в
+        начале очереди и показывалось бы снова. Уже отвеченная карточка
+        не просрочена, поэтому второй раз не учитывается.
+        """
+        word = self.get_current_word(user_id)
+        if word is None:
+            return False
+        try:
+            with self._connection(autocommit=True) as conn, conn.cursor() as cur:
+                cur.execute("""
+                    SELECT review_word(%(user_id)s, %(word_id)s, %(quality)s, make_interval(mins => %(relearn)s))
+                    WHERE NOT EXISTS (
+                        SELECT 1
+                        FROM user_words uw
+                        WHERE uw.user_id = %(user_id)s AND uw.word_id = %(word_id)s AND uw.due_at > NOW()
+                    )
+                """, {"user_id": user_id, "word_id": word.id,
+                      "quality": quality_from_answer(False), "relearn": SRS_RELEARN_MINUTES})
+                logger.debug("Пропущено слово word_id=%s для user_id=%s", word.id, user_id)
+                return True
+        except Exception as e:
+            logger.error("Ошибка при пропуске карточки: %s", e)
+            return False
+
+    @instrument_db
+    def record_answer(self, user_id: int, word_id: int, correct: bool):
+        """Добавляет ответ в журнал; в БД он попадёт со следующей пачкой"""
+        self.answers.append(user_id, word_id, correct)
+
+    @instrument_db
+    def get_user_stats(self, user_id: int) -> UserStats:
+        """Итоги ответов пользователя, включая ещё не сохранённые"""
+        pending_answers, pending_correct = self.answers.pending(user_id)
+        try:
+            with self._connection(autocommit=True) as conn, conn.cursor() as cur:
+                cur.execute("""
+                    SELECT answers, correct, last_answer_at
+                    FROM user_stats
+                    WHERE user_id = %s
+                """, (user_id,))
+                row = cur.fetchone()
+        except Exception as e:
+            logger.error("Ошибка при получении статистики: %s", e)
+            return None
+
+        stats = UserStats(*row) if row else UserStats(0, 0, None)
+        stats.answers += pending_answers
+        stats.correct += pending_correct
+        return stats
+
+    @instrument_db
     def add_word(self, user_id: int, english: str, russian: str, is_custom=True):
         """Добавляет слово для пользователя"""
         self.ensure_user_exists(user_id)  # Гарантируем существование пользователя
         try:
-            with self.conn.cursor() as cur:
+            with self._connection() as conn, conn.cursor() as cur:
                 # Добавляем слово
                 cur.execute("""
                     INSERT INTO words (english, russian, is_custom)
                     VALUES (%s, %s, %s)
-                    ON CONFLICT (english) DO UPDATE 
+                    ON CONFLICT (english) DO UPDATE
                     SET russian = EXCLUDED.russian
-                    RETURNING id
+                    RETURNING id, english, russian, is_custom
                 """, (english, russian, is_custom))
 
                 result = cur.fetchone()
                 if not result:
-                    # Если слово не было добавлено (уже существует), получаем его ID
-                    cur.execute("SELECT id FROM words WHERE english = %s", (english,))
+                    # Если слово не было добавлено (уже существует), получаем его
+                    cur.execute("""
+                        SELECT id, english, russian, is_custom
+                        FROM words
+                        WHERE english = %s
+                    """, (english,))
                     result = cur.fetchone()
 
-                word_id = result[0] if result else None
-                if not word_id:
+                if not result:
                     raise ValueError("Не удалось получить ID слова")
+                word = Word(*result)
+                word_id = word.id
 
                 # Связываем слово с пользователем
                 cur.execute("""
                     INSERT INTO user_words (user_id, word_id)
                     VALUES (%s, %s)
-                    ON CONFLICT (user_id, word_id) 
+                    ON CONFLICT (user_id, word_id)
                     DO UPDATE SET is_deleted = FALSE
                 """, (user_id, word_id))
 
-                self.conn.commit()
-                logger.info(f"Добавлено слово: {english} -> {russian} для user_id={user_id}")
+                conn.commit()
+
+                # Перевод мог измениться у всех, у кого это слово уже есть
+                self.decks.patch_word(word)
+                self.decks.add_word(user_id, word)
+                logger.info("Добавлено слово: %s -> %s для user_id=%s", english, russian, user_id)
                 return True
         except Exception as e:
-            logger.error(f"Ошибка при добавлении слова: {str(e)}")
-            self.conn.rollback()
+            logger.error("Ошибка при добавлении слова: %s", e)
             return False
 
+    @instrument_db
+    def import_words(self, user_id: int, pairs) -> int:
+        """Массово добавляет слова пользователю.
+
+        Пары (english, russian) потоком загружаются через COPY во временную
+        таблицу, откуда слова и связи с пользователем переносятся двумя
+        запросами. Повторы внутри списка схлопываются, побеждает последний.
+        Возвращает число слов, добавленных в колоду, или None при ошибке.
+        """
+        self.ensure_user_exists(user_id)
+        try:
+            with self._connection() as conn, conn.cursor() as cur:
+                cur.execute("""
+                    CREATE TEMP TABLE import_staging (
+                        pos BIGSERIAL,
+                        english VARCHAR(50) NOT NULL,
+                        russian VARCHAR(50) NOT NULL
+                    ) ON COMMIT DROP
+                """)
+                cur.copy_expert(
+                        "COPY import_staging (english, russian) FROM STDIN",
+                        CopyStream(pairs)
+                )
+
+                cur.execute("""
+                    INSERT INTO words (english, russian, is_custom)
+                    SELECT DISTINCT ON (english) english, russian, TRUE
+                    FROM import_staging
+                    ORDER BY english, pos DESC
+                    ON CONFLICT (english) DO UPDATE
+                    SET russian = EXCLUDED.russian
+                """)
+
+                cur.execute("""
+                    INSERT INTO user_words (user_id, word_id)
+                    SELECT %s, w.id
+                    FROM words w
+                    JOIN (SELECT DISTINCT english FROM import_staging) s
+                      ON s.english = w.english
+                    ON CONFLICT (user_id, word_id)
+                    DO UPDATE SET is_deleted = FALSE
+                """, (user_id,))
+                imported = cur.rowcount
+
+                conn.commit()
+
+                # Переводы могли измениться и в чужих колодах
+                self.decks.clear()
+                logger.info("Импортировано %s слов для user_id=%s", imported, user_id)
+                return imported
+        except Exception as e:
+            logger.error("Ошибка при импорте слов: %s", e)
+            return None
+
+    @instrument_db
+    def export_words(self, user_id: int, out, fmt: str = "csv") -> int:
+        """Выгружает колоду пользователя в бинарный файл out.
+
+        Слова читаются именованным (серверным) курсором пачками по
+        EXPORT_BATCH_SIZE, поэтому память не зависит от размера колоды.
+        Возвращает число выгруженных слов или None при ошибке.
+        """
+        try:
+            writer = ExportWriter(out, fmt)
+            with self._connection() as conn, \
+                    conn.cursor(name=f"export_{user_id}") as cur:
+                cur.itersize = EXPORT_BATCH_SIZE
+                cur.execute("""
+                    SELECT w.english, w.russian, w.is_custom
+                    FROM user_deck(%s) d
+                    JOIN words w ON w.id = d.word_id
+                    ORDER BY d.word_id
+                """, (user_id,))
+                while True:
+                    rows = cur.fetchmany(EXPORT_BATCH_SIZE)
+                    if not rows:
+                        break
+                    writer.write_rows(rows)
+
+            logger.info("Выгружено %s слов для user_id=%s", writer.written, user_id)
+            return writer.written
+        except Exception as e:
+            logger.error("Ошибка при экспорте слов: %s", e)
+            return None
+
+    @instrument_db
     def update_user_state(self, user_id: int, word_id: int):
         """Обновляет состояние пользователя"""
         self.ensure_user_exists(user_id)  # Гарантируем существование пользователя
         try:
-            with self.conn.cursor() as cur:
-                # Проверяем существование слова
-                cur.execute("SELECT 1 FROM words WHERE id = %s", (word_id,))
-                if not cur.fetchone():
-                    logger.warning(f"Слово с ID {word_id} не найдено")
-                    return False
-
-                cur.execute("""
+            # Существование слова проверяет внешний ключ, COMMIT не нужен
+            with self._connection(autocommit=True) as conn, conn.cursor() as cur:
+                self.statements.execute(cur, "update_user_state", """
                     INSERT INTO user_states (user_id, current_word_id)
                     VALUES (%s, %s)
                     ON CONFLICT (user_id) DO UPDATE
                     SET current_word_id = EXCLUDED.current_word_id,
                         last_interaction = NOW()
                 """, (user_id, word_id))
-                self.conn.commit()
-                logger.debug(f"Обновлено состояние для user_id={user_id}: word_id={word_id}")
+                # Сессия устарела - следующее чтение возьмёт состояние из БД
+                self.sessions.discard(user_id)
+                logger.debug("Обновлено состояние для user_id=%s: word_id=%s", user_id, word_id)
                 return True
         except Exception as e:
-            logger.error(f"Ошибка при обновлении состояния пользователя: {str(e)}")
-            self.conn.rollback()
+            logger.error("Ошибка при обновлении состояния пользователя: %s", e)
             return False
 
+    @instrument_db
+    def load_bot_state(self, key: str):
+        """Читает состояние диалога: (state, data) или None"""
+        try:
+            with self._connection(autocommit=True) as conn, conn.cursor() as cur:
+                cur.execute("SELECT state, data FROM bot_states WHERE key = %s", (key,))
+                return cur.fetchone()
+        except Exception as e:
+            logger.error("Ошибка при чтении состояния диалога: %s", e)
+            raise
+
+    @instrument_db
+    def save_bot_states(self, upserts: list, deleted: list):
+        """Сохраняет пачку состояний диалогов одной транзакцией.
+
+        upserts - список (key, state, data), deleted - список ключей.
+        """
+        try:
+            with self._connection() as conn, conn.cursor() as cur:
+                if upserts:
+                    keys, states, data = zip(*upserts)
+                    cur.execute("""
+                        INSERT INTO bot_states (key, state, data, updated_at)
+                        SELECT t.key, t.state, t.data::JSONB, NOW()
+                        FROM unnest(%s::TEXT[], %s::TEXT[], %s::TEXT[]) AS t(key, state, data)
+                        ON CONFLICT (key) DO UPDATE
+                        SET state = EXCLUDED.state,
+                            data = EXCLUDED.data,
+                            updated_at = NOW()
+                    """, (list(keys), list(states), [json.dumps(d, ensure_ascii=False) for d in data]))
+                if deleted:
+                    cur.execute("DELETE FROM bot_states WHERE key = ANY(%s)", (list(deleted),))
+                conn.commit()
+                logger.debug("Сохранено состояний диалогов: %s, удалено: %s", len(upserts), len(deleted))
+        except Exception as e:
+            logger.error("Ошибка при сохранении состояний диалогов: %s", e)
+            raise
+
     def close(self):
-        """Закрывает соединение с БД"""
+        """Сохраняет сессии и ответы и закрывает все соединения с БД"""
+        self._stopped.set()
+        self.answers.ready.set()
+        self._writer.join()
+        self._answers_writer.join()
+        self.flush_sessions()
+        self.flush_answers()
+
+        logger.info("Кэш известных пользователей: %s", self.known_users.stats())
+        logger.info("Кэш колод: %s", self.decks.stats())
         try:
-            if self.conn and not self.conn.closed:
-                self.conn.close()
-                logger.info("Соединение с БД закрыто")
+            self.pool.closeall()
+            logger.info("Соединения с БД закрыты")
         except Exception as e:
-            logger.error(f"Ошибка при закрытии соединения с БД: {str(e)}")
\ No newline at end of file
+            logger.error("Ошибка при закрытии соединения с БД: %s", e)
@@ -0,0 +1,94 @@
+# database/events.py
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+
+class AnswerLog:
+    """Кольцевой буфер ответов, ожидающих записи в answer_events.
+
+    Ответы копятся в памяти и сохраняются пачками (см. Database), поэтому
+    обработчик ответа не ждёт отдельного коммита. Буфер ограничен: если
+    запись в БД долго не удаётся, вытесняются самые старые ответы, так что
+    при сбое теряется не больше capacity ответов за интервал сброса.
+    Для каждого пользователя хранятся ещё не сохранённые счётчики, чтобы
+    статистика учитывала последние ответы без чтения буфера.
+    """
+
+    def __init__(self, capacity: int, flush_size: int):
+        self.capacity = capacity
+        self.flush_size = flush_size
+        self.dropped = 0
+        self._events = deque()
+        # user_id -> [ответов, верных]
+        self._pending = {}
+        self._lock = threading.Lock()
+        # Взводится, когда набралась пачка для записи
+        self.ready = threading.Event()
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def _count(self, event, sign: int):
+        user_id, _, correct, _ = event
+        counts = self._pending.setdefault(user_id, [0, 0])
+        counts[0] += sign
+        counts[1] += sign * correct
+        if counts[0] <= 0:
+            del self._pending[user_id]
+
+    def append(self, user_id: int, word_id: int, correct: bool):
+        event = (user_id, word_id, correct, datetime.now(timezone.utc))
+        with self._lock:
+            if len(self._events) >= self.capacity:
+                self._count(self._events.popleft(), -1)
+                self.dropped += 1
+            self._events.append(event)
+            self._count(event, 1)
+            if len(self._events) >= self.flush_size:
+                self.ready.set()
+
+    def drain(self) -> list:
+        """Забирает все накопленные ответы: список (user_id, word_id, correct, answered_at)"""
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+            self.ready.clear()
+            return events
+
+    def restore(self, events: list):
+        """Возвращает ответы после неудачной записи, пока есть место"""
+        with self._lock:
+            room = max(0, self.capacity - len(self._events))
+            lost = events[:len(events) - room] if room < len(events) else []
+            for event in lost:
+                self._count(event, -1)
+            self.dropped += len(lost)
+            self._events.extendleft(reversed(events[len(lost):]))
+
+    def committed(self, events: list):
+        """Снимает сохранённые ответы со счётчиков пользователей"""
+        with self._lock:
+            for event in events:
+                self._count(event, -1)
+
+    @staticmethod
+    def summarize(events: list) -> tuple:
+        """Итоги пачки по пользователям для user_stats.
+
+        Возвращает столбцы (user_ids, ответов, верных, время последнего ответа).
+        """
+        totals = {}
+        for user_id, _, correct, answered_at in events:
+            total = totals.setdefault(user_id, [0, 0, answered_at])
+            total[0] += 1
+            total[1] += correct
+            total[2] = max(total[2], answered_at)
+        answers, correct, last_answer_at = (list(column) for column in zip(*totals.values()))
+        return list(totals), answers, correct, last_answer_at
+
+    def pending(self, user_id: int) -> tuple:
+        """Ещё не сохранённые (ответов, верных) пользователя"""
+        with self._lock:
+            counts = self._pending.get(user_id)
+            return tuple(counts) if counts else (0, 0)
@@ -0,0 +1,112 @@
+# database/migrations.py
+# Версионированные изменения схемы: каждая миграция применяется один раз
+# и записывается в schema_migrations
+import json
+import hashlib
+
+from database.schema import TABLES_SQL, FUNCTIONS_SQL
+
+MIGRATIONS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT NOW()
+    );
+"""
+
+# Не даёт двум процессам применять миграции одновременно;
+# снимается в конце транзакции
+MIGRATIONS_LOCK_SQL = "SELECT pg_advisory_xact_lock(hashtext('schema_migrations'))"
+
+# (версия, название, SQL) в порядке применения
+MIGRATIONS = [
+    (1, "base tables", TABLES_SQL),
+    (2, "deck indexes", """
+        -- Живая колода пользователя в порядке word_id: выборка колоды
+        -- и поиск ближайшего слова в sample_deck
+        CREATE INDEX IF NOT EXISTS user_words_live_idx
+            ON user_words (user_id, word_id)
+            WHERE is_deleted = FALSE;
+
+        -- Стандартные слова для новых пользователей
+        CREATE INDEX IF NOT EXISTS words_is_custom_idx
+            ON words (is_custom, id);
+    """),
+    (3, "schema fingerprint", """
+        -- Отпечаток схемы, функций и стандартных слов для быстрого старта
+        CREATE TABLE IF NOT EXISTS schema_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT NOW()
+        );
+    """),
+    (4, "virtual default deck", """
+        -- Стандартные слова входят в колоду неявно: копии, которые
+        -- пользователь не скрывал и ни разу не повторял, больше не нужны
+        DELETE FROM user_words uw
+        USING words w
+        WHERE w.id = uw.word_id
+          AND w.is_custom = FALSE
+          AND uw.is_deleted = FALSE
+          AND uw.repetitions = 0
+          AND uw.interval_days = 0
+          AND uw.ease = 2.5;
+    """),
+    (5, "answer history", """
+        -- Журнал ответов; пишется пачками через COPY
+        CREATE TABLE IF NOT EXISTS answer_events (
+            user_id BIGINT NOT NULL,
+            word_id INTEGER NOT NULL,
+            correct BOOLEAN NOT NULL,
+            answered_at TIMESTAMPTZ NOT NULL
+        );
+
+        -- Итоги по пользователю, обновляемые вместе с каждой пачкой журнала
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id BIGINT PRIMARY KEY,
+            answers BIGINT NOT NULL DEFAULT 0,
+            correct BIGINT NOT NULL DEFAULT 0,
+            last_answer_at TIMESTAMPTZ
+        );
+    """),
+]
+
+# Быстрая проверка при старте; до миграции 3 таблицы schema_meta нет
+SCHEMA_META_EXISTS_SQL = "SELECT to_regclass('schema_meta') IS NOT NULL"
+FINGERPRINT_SQL = "SELECT value FROM schema_meta WHERE key = 'fingerprint'"
+
+# Стандартные слова одним запросом; строки без изменений не перезаписываются.
+# {0} и {1} - параметры массивов английских слов и переводов
+_SEED_WORDS_SQL = """
+    INSERT INTO words (english, russian, is_custom)
+    SELECT t.english, t.russian, FALSE
+    FROM unnest({0}::VARCHAR[], {1}::VARCHAR[]) AS t(english, russian)
+    ON CONFLICT (english) DO UPDATE
+    SET russian = EXCLUDED.russian
+    WHERE words.russian IS DISTINCT FROM EXCLUDED.russian
+"""
+SEED_WORDS_SQL = _SEED_WORDS_SQL.format("%s", "%s")
+SEED_WORDS_SQL_ASYNC = _SEED_WORDS_SQL.format("$1", "$2")
+
+_SAVE_FINGERPRINT_SQL = """
+    INSERT INTO schema_meta (key, value)
+    VALUES ('fingerprint', {0})
+    ON CONFLICT (key) DO UPDATE
+    SET value = EXCLUDED.value, updated_at = NOW()
+"""
+SAVE_FINGERPRINT_SQL = _SAVE_FINGERPRINT_SQL.format("%s")
+SAVE_FINGERPRINT_SQL_ASYNC = _SAVE_FINGERPRINT_SQL.format("$1")
+
+
+def pending_migrations(applied: set) -> list:
+    """Миграции, которых ещё нет в schema_migrations"""
+    return [m for m in MIGRATIONS if m[0] not in applied]
+
+
+def schema_fingerprint(default_words) -> str:
+    """Отпечаток того, что устанавливает initialize: миграций, функций и стандартных слов"""
+    digest = hashlib.sha256()
+    digest.update(str(MIGRATIONS[-1][0]).encode())
+    digest.update(FUNCTIONS_SQL.encode())
+    digest.update(json.dumps(default_words, ensure_ascii=False).encode())
+    return digest.hexdigest()
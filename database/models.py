@@ -14,4 +14,26 @@ class Word:
 class UserState:
     user_id: int
     current_word_id: int
-    last_interaction: datetime
\ No newline at end of file
+    last_interaction: datetime
+
+
+@dataclass
+class UserStats:
+    answers: int
+    correct: int
+    last_answer_at: datetime
+
+    @property
+    def accuracy(self) -> float:
+        return self.correct / self.answers if self.answers else 0.0
+
+
+@dataclass
+class Card:
+    target: Word
+    distractors: list[Word]
+
+
+def quality_from_answer(correct: bool) -> int:
+    """Оценка ответа по шкале SM-2 (0-5) для теста с вариантами"""
+    return 4 if correct else 1
@@ -0,0 +1,168 @@
+# database/plan_check.py
+"""Проверка, что горячие запросы могут использовать свои индексы.
+
+Для каждого запроса выполняется EXPLAIN (FORMAT JSON) и в плане ищется
+один из ожидаемых индексов. На маленькой базе планировщик справедливо
+предпочитает последовательное чтение, поэтому по умолчанию оно
+запрещается на время проверки: так проверяется, что индекс подходит к
+форме запроса, а не то, что он выгоден на текущем объёме данных.
+
+Заодно проверяется, что карточка получает все варианты ответа, когда
+id колоды разрежены чужими импортами (см. check_sampling). Все данные
+проверки остаются в откатываемой транзакции.
+
+Запуск из корня проекта:
+    python -m database.plan_check [--user-id 1] [--allow-seqscan]
+"""
+import sys
+import json
+import argparse
+
+from database.schema import SAMPLE_OWN_SEEK_SQL, SAMPLE_STANDARD_SEEK_SQL
+
+# Параметры, которые подставляются в тексты поиска из sample_deck
+_SEEK_PARAMS = {"user_id": "%(user_id)s", "pivot": "%(pivot)s", "picked": "%(picked)s::INTEGER[]"}
+
+# (название, запрос, индексы - любой из них ожидается в плане)
+HOT_QUERIES = [
+    (
+        "колода пользователя",
+        """
+        SELECT w.id, w.english, w.russian, w.is_custom
+        FROM user_deck(%(user_id)s) d
+        JOIN words w ON w.id = d.word_id
+        """,
+        {"user_words_live_idx", "words_is_custom_idx"},
+    ),
+    (
+        "ближайшее слово в sample_deck",
+        SAMPLE_OWN_SEEK_SQL.format(**_SEEK_PARAMS),
+        {"user_words_live_idx"},
+    ),
+    (
+        "очередь повторения",
+        """
+        SELECT uw.word_id, uw.due_at
+        FROM user_words uw
+        WHERE uw.user_id = %(user_id)s AND uw.is_deleted = FALSE
+        ORDER BY uw.due_at
+        LIMIT 2
+        """,
+        {"user_words_due_idx"},
+    ),
+    (
+        "ближайшее стандартное слово в sample_deck",
+        SAMPLE_STANDARD_SEEK_SQL.format(**_SEEK_PARAMS),
+        {"words_is_custom_idx"},
+    ),
+]
+
+
+def plan_indexes(plan) -> set:
+    """Имена индексов во всех узлах плана"""
+    found = set()
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if "Index Name" in node:
+            found.add(node["Index Name"])
+        stack.extend(node.get("Plans", []))
+    return found
+
+
+def check_plans(cur, user_id: int, allow_seqscan: bool = False) -> list:
+    """Возвращает список (название, ок, найденные индексы, ожидаемые индексы)"""
+    results = []
+    if not allow_seqscan:
+        cur.execute("SET LOCAL enable_seqscan = off")
+    for name, sql, expected in HOT_QUERIES:
+        cur.execute("EXPLAIN (FORMAT JSON) " + sql, {"user_id": user_id, "pivot": 1, "picked": []})
+        plan = cur.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        found = plan_indexes(plan[0]["Plan"])
+        results.append((name, bool(found & expected), found, expected))
+    return results
+
+
+def _add_words(cur, user_id: int, prefix: str, count: int):
+    """Добавляет пользователю count своих слов подряд идущими id"""
+    cur.execute("""
+        WITH added AS (
+            INSERT INTO words (english, russian, is_custom)
+            SELECT %(prefix)s || g, 'проверка', TRUE
+            FROM generate_series(1, %(count)s) g
+            RETURNING id
+        )
+        INSERT INTO user_words (user_id, word_id)
+        SELECT %(user_id)s, id FROM added
+    """, {"user_id": user_id, "prefix": prefix, "count": count})
+
+
+def check_sampling(cur, n_distractors: int = 3, trials: int = 100) -> list:
+    """Проверяет число вариантов в карточках при разреженных id.
+
+    Другой пользователь импортирует тысячи слов между словами проверяемых
+    пользователей: у маленькой колоды (стандартные слова и одно своё) и
+    у большой (сотни своих слов по обе стороны «дыры»). В каждой из trials
+    карточек next_card и sample_card ожидается min(n_distractors,
+    размер колоды - 1) вариантов. Возвращает список (название, ок,
+    число неполных карточек, trials).
+    """
+    other, small, large = -1, -2, -3
+    cur.execute("INSERT INTO users (user_id) VALUES (%s), (%s), (%s) ON CONFLICT DO NOTHING",
+                (other, small, large))
+    _add_words(cur, large, "plan-check-large-a-", 250)
+    _add_words(cur, other, "plan-check-other-", 3000)
+    _add_words(cur, small, "plan-check-small-", 1)
+    _add_words(cur, large, "plan-check-large-b-", 1)
+
+    results = []
+    for label, user_id in (("маленькая колода", small), ("большая колода", large)):
+        cur.execute("SELECT COUNT(*) FROM user_deck(%s)", (user_id,))
+        expected = min(n_distractors, cur.fetchone()[0] - 1)
+        for name, sql in (
+                ("next_card", "SELECT COUNT(*) FILTER (WHERE NOT is_target) FROM next_card(%s, %s, NULL)"),
+                ("sample_card", "SELECT COUNT(DISTINCT s) - 1 FROM sample_deck(%s, %s + 1) s"),
+        ):
+            short = 0
+            for _ in range(trials):
+                cur.execute(sql, (user_id, n_distractors))
+                short += cur.fetchone()[0] < expected
+            results.append((f"{name}, {label}", short == 0, short, trials))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user-id", type=int, default=1)
+    parser.add_argument("--allow-seqscan", action="store_true",
+                        help="не запрещать последовательное чтение (проверка на реальном объёме)")
+    args = parser.parse_args()
+
+    from database.db import Database
+
+    db = Database()
+    try:
+        db.initialize()
+        with db._connection() as conn, conn.cursor() as cur:
+            sampling = check_sampling(cur)
+            results = check_plans(cur, args.user_id, args.allow_seqscan)
+            conn.rollback()
+    finally:
+        db.close()
+
+    failed = 0
+    for name, ok, found, expected in results:
+        status = "OK  " if ok else "FAIL"
+        print(f"{status} {name}: найдено {sorted(found) or '-'}, ожидается одно из {sorted(expected)}")
+        failed += not ok
+    for name, ok, short, trials in sampling:
+        status = "OK  " if ok else "FAIL"
+        print(f"{status} варианты ответа, {name}: неполных карточек {short} из {trials}")
+        failed += not ok
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
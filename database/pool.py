@@ -0,0 +1,176 @@
+# database/pool.py
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+
+from metrics import DB_POOL_WAIT
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """Не удалось получить соединение из пула за отведённое время"""
+
+
+class ConnectionPool:
+    """Ограниченный потокобезопасный пул соединений psycopg2"""
+
+    def __init__(self, minconn: int, maxconn: int, timeout: float,
+                 health_check_interval: float, **connect_kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"Некорректные размеры пула: min={minconn}, max={maxconn}")
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._connect_kwargs = connect_kwargs
+
+        # Свободные соединения: (соединение, время возврата в пул)
+        self._idle = deque()
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+
+        logger.info("Пул соединений создан: min=%s, max=%s", minconn, maxconn)
+
+    def _connect(self):
+        conn = psycopg2.connect(**self._connect_kwargs)
+        conn.autocommit = False
+        return conn
+
+    def _is_healthy(self, conn, idle_since: float) -> bool:
+        """Проверяет соединение перед выдачей"""
+        if conn.closed:
+            return False
+
+        # Долго простаивавшие соединения проверяем реальным запросом
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error as e:
+            logger.warning("Соединение не прошло проверку: %s", e)
+            return False
+
+    def _discard(self, conn):
+        try:
+            if not conn.closed:
+                conn.close()
+        except Exception as e:
+            logger.error("Ошибка при закрытии соединения: %s", e)
+
+    def getconn(self):
+        """Выдаёт соединение, ожидая не дольше timeout секунд"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeoutError("Пул соединений закрыт")
+                    if self._idle:
+                        conn, idle_since = self._idle.pop()
+                        break
+                    if self._size < self.maxconn:
+                        # Резервируем место под новое соединение
+                        self._size += 1
+                        conn, idle_since = None, None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeoutError(
+                                f"Нет свободных соединений за {self.timeout} с "
+                                f"(max={self.maxconn})"
+                        )
+                    self._cond.wait(remaining)
+
+            # Подключение и проверку выполняем вне блокировки
+            if conn is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    self._release_slot()
+                    raise
+
+            if self._is_healthy(conn, idle_since):
+                return conn
+
+            self._discard(conn)
+            self._release_slot()
+
+    def putconn(self, conn, broken: bool = False):
+        """Возвращает соединение в пул"""
+        if not broken and not conn.closed:
+            try:
+                # Не оставляем в пуле открытых транзакций
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                broken = True
+
+        if broken or conn.closed or self._closed:
+            self._discard(conn)
+            self._release_slot()
+            return
+
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _release_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, autocommit: bool = False):
+        """Выдаёт соединение на время операции.
+
+        При исключении транзакция откатывается, а разорванное соединение
+        не возвращается в пул. С autocommit=True каждый запрос фиксируется
+        сам, без отдельного COMMIT.
+        """
+        started = time.monotonic()
+        conn = self.getconn()
+        DB_POOL_WAIT.observe(time.monotonic() - started)
+        broken = False
+        try:
+            if autocommit:
+                conn.autocommit = True
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+            if conn.closed:
+                broken = True
+            raise
+        finally:
+            if autocommit and not conn.closed:
+                try:
+                    conn.autocommit = False
+                except psycopg2.Error:
+                    broken = True
+            self.putconn(conn, broken=broken)
+
+    def closeall(self):
+        """Закрывает все свободные соединения и запрещает выдачу новых"""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._discard(conn)
+                self._size -= 1
+            self._cond.notify_all()
@@ -0,0 +1,79 @@
+# database/prepared.py
+import re
+import logging
+import itertools
+import threading
+import weakref
+
+logger = logging.getLogger(__name__)
+
+_PLACEHOLDER = re.compile(r"%s")
+
+# Ошибки, после которых подготовленным запросам соединения нельзя доверять:
+# запроса нет (26000), он уже есть (42P05), план устарел после смены схемы (0A000)
+_STALE_PGCODES = {"26000", "42P05", "0A000"}
+
+
+class PreparedStatements:
+    """Подготовленные на сервере запросы, отдельно для каждого соединения.
+
+    Запрос готовится командой PREPARE при первом выполнении на соединении,
+    а дальше вызывается через EXECUTE по имени: Postgres не разбирает и не
+    планирует его заново. Соединения учитываются по слабым ссылкам, так
+    что новое соединение пула или переподключение просто готовит запросы
+    заново. Если ошибка указывает на устаревший подготовленный запрос,
+    перед следующим вызовом на этом соединении выполняется DEALLOCATE ALL.
+
+    С enabled=False запросы выполняются обычным cur.execute.
+    """
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        # имя -> (текст PREPARE, текст EXECUTE)
+        self._statements = {}
+        # соединение -> имена подготовленных на нём запросов
+        self._prepared = weakref.WeakKeyDictionary()
+        self._stale = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def _texts(self, name: str, sql: str) -> tuple:
+        texts = self._statements.get(name)
+        if texts is None:
+            numbers = itertools.count(1)
+            body = _PLACEHOLDER.sub(lambda _: f"${next(numbers)}", sql)
+            args = ", ".join(["%s"] * (next(numbers) - 1))
+            texts = (f"PREPARE {name} AS {body}", f"EXECUTE {name}({args})" if args else f"EXECUTE {name}")
+            self._statements[name] = texts
+        return texts
+
+    def execute(self, cur, name: str, sql: str, params=()):
+        """Выполняет sql (с параметрами %s) как подготовленный запрос name"""
+        if not self.enabled:
+            cur.execute(sql, params)
+            return
+
+        prepare_sql, execute_sql = self._texts(name, sql)
+        conn = cur.connection
+        with self._lock:
+            prepared = self._prepared.get(conn)
+            if prepared is None:
+                prepared = self._prepared[conn] = set()
+            stale = conn in self._stale
+            self._stale.discard(conn)
+
+        # Соединение в каждый момент принадлежит одному потоку,
+        # поэтому его набор имён меняется без блокировки
+        try:
+            if stale:
+                cur.execute("DEALLOCATE ALL")
+                prepared.clear()
+            if name not in prepared:
+                cur.execute(prepare_sql)
+                prepared.add(name)
+            cur.execute(execute_sql, params)
+        except Exception as e:
+            if getattr(e, "pgcode", None) in _STALE_PGCODES:
+                logger.warning("Подготовленные запросы соединения будут сброшены: %s", e)
+                with self._lock:
+                    self._stale.add(conn)
+            raise
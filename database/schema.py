@@ -0,0 +1,324 @@
+# database/schema.py
+# Общая схема БД для синхронного и асинхронного слоёв.
+# TABLES_SQL - исходная схема (миграция 1); дальнейшие изменения таблиц
+# добавляются новыми миграциями в database/migrations.py
+
+TABLES_SQL = """
+    CREATE TABLE IF NOT EXISTS words (
+        id SERIAL PRIMARY KEY,
+        english VARCHAR(50) NOT NULL UNIQUE,
+        russian VARCHAR(50) NOT NULL,
+        is_custom BOOLEAN DEFAULT FALSE
+    );
+
+    CREATE TABLE IF NOT EXISTS users (
+        user_id BIGINT PRIMARY KEY,
+        first_seen TIMESTAMP DEFAULT NOW()
+    );
+
+    CREATE TABLE IF NOT EXISTS user_words (
+        user_id BIGINT REFERENCES users(user_id),
+        word_id INTEGER REFERENCES words(id),
+        is_deleted BOOLEAN DEFAULT FALSE,
+        PRIMARY KEY (user_id, word_id)
+    );
+
+    -- Интервальное повторение (SM-2): прогресс по каждому слову пользователя
+    ALTER TABLE user_words
+        ADD COLUMN IF NOT EXISTS ease REAL NOT NULL DEFAULT 2.5,
+        ADD COLUMN IF NOT EXISTS interval_days INTEGER NOT NULL DEFAULT 0,
+        ADD COLUMN IF NOT EXISTS repetitions INTEGER NOT NULL DEFAULT 0,
+        ADD COLUMN IF NOT EXISTS due_at TIMESTAMP NOT NULL DEFAULT NOW();
+
+    -- Очередь повторения: ближайшее слово к показу - одно чтение индекса
+    CREATE INDEX IF NOT EXISTS user_words_due_idx
+        ON user_words (user_id, due_at)
+        WHERE is_deleted = FALSE;
+
+    -- Состояния диалогов TeleBot (добавление слова, импорт)
+    CREATE TABLE IF NOT EXISTS bot_states (
+        key TEXT PRIMARY KEY,
+        state TEXT,
+        data JSONB NOT NULL DEFAULT '{}',
+        updated_at TIMESTAMP DEFAULT NOW()
+    );
+
+    CREATE TABLE IF NOT EXISTS user_states (
+        user_id BIGINT PRIMARY KEY REFERENCES users(user_id),
+        current_word_id INTEGER REFERENCES words(id),
+        last_interaction TIMESTAMP DEFAULT NOW()
+    );
+"""
+
+# Поиск в sample_deck ближайшего невыбранного слова колоды, начиная с {pivot}:
+# среди стандартных слов, которые пользователь не скрыл, и среди его живых
+# строк user_words. Те же тексты проверяет database/plan_check.py
+SAMPLE_STANDARD_SEEK_SQL = """
+                    SELECT w.id
+                    FROM words w
+                    WHERE w.is_custom = FALSE
+                      AND w.id >= {pivot}
+                      AND w.id <> ALL({picked})
+                      AND NOT EXISTS (
+                          SELECT 1
+                          FROM user_words uw
+                          WHERE uw.user_id = {user_id} AND uw.word_id = w.id AND uw.is_deleted = TRUE
+                      )
+                    ORDER BY w.id
+                    LIMIT 1
+"""
+
+SAMPLE_OWN_SEEK_SQL = """
+                    SELECT uw.word_id
+                    FROM user_words uw
+                    WHERE uw.user_id = {user_id}
+                      AND uw.is_deleted = FALSE
+                      AND uw.word_id >= {pivot}
+                      AND uw.word_id <> ALL({picked})
+                    ORDER BY uw.word_id
+                    LIMIT 1
+"""
+
+_SEEK_ARGS = {"user_id": "p_user_id", "pivot": "v_start", "picked": "v_ids"}
+
+FUNCTIONS_SQL = """
+    -- Колода пользователя: стандартные слова, которые он не скрыл, и
+    -- живые строки user_words. В user_words хранятся только свои слова,
+    -- скрытые стандартные и прогресс повторения, поэтому новый
+    -- пользователь ничего не копирует, а новое стандартное слово сразу
+    -- попадает во все колоды
+    CREATE OR REPLACE FUNCTION user_deck(p_user_id BIGINT)
+    RETURNS TABLE (word_id INTEGER)
+    LANGUAGE sql STABLE AS $$
+        SELECT w.id
+        FROM words w
+        WHERE w.is_custom = FALSE
+          AND NOT EXISTS (
+              SELECT 1
+              FROM user_words uw
+              WHERE uw.user_id = p_user_id AND uw.word_id = w.id AND uw.is_deleted = TRUE
+          )
+        UNION
+        SELECT uw.word_id
+        FROM user_words uw
+        WHERE uw.user_id = p_user_id AND uw.is_deleted = FALSE
+    $$;
+
+    -- Случайные слова колоды, всегда min(p_limit, размер колоды) разных.
+    -- Небольшая колода перемешивается целиком. В большой для каждого слова
+    -- берётся случайная точка между минимальным и максимальным word_id и
+    -- ближайшее ещё не выбранное слово справа (или с начала диапазона) -
+    -- отдельно среди стандартных слов (индекс words (is_custom, id)) и
+    -- живых строк user_words (индекс (user_id, word_id)), берётся меньшее.
+    -- id общие для всех пользователей, поэтому слова после длинных «дыр»
+    -- (чужих импортов) в большой колоде выпадают заметно чаще остальных
+    CREATE OR REPLACE FUNCTION sample_deck(p_user_id BIGINT, p_limit INTEGER)
+    RETURNS SETOF INTEGER
+    LANGUAGE plpgsql VOLATILE AS $$
+    DECLARE
+        v_small CONSTANT INTEGER := 200;
+        v_size INTEGER;
+        v_lo INTEGER;
+        v_hi INTEGER;
+        v_start INTEGER;
+        v_next INTEGER;
+        v_ids INTEGER[] := ARRAY[]::INTEGER[];
+    BEGIN
+        IF p_limit <= 0 THEN
+            RETURN;
+        END IF;
+
+        -- Оценка размера сверху: строки прогресса стандартных слов считаются дважды
+        SELECT (
+            SELECT COUNT(*) FROM (
+                SELECT 1 FROM words w WHERE w.is_custom = FALSE LIMIT v_small
+            ) d
+        ) + (
+            SELECT COUNT(*) FROM (
+                SELECT 1 FROM user_words uw
+                WHERE uw.user_id = p_user_id AND uw.is_deleted = FALSE
+                LIMIT v_small
+            ) c
+        ) INTO v_size;
+
+        IF v_size < v_small THEN
+            RETURN QUERY
+            SELECT d.word_id
+            FROM user_deck(p_user_id) d
+            ORDER BY RANDOM()
+            LIMIT p_limit;
+            RETURN;
+        END IF;
+
+        SELECT LEAST(d.lo, c.lo), GREATEST(d.hi, c.hi) INTO v_lo, v_hi
+        FROM (
+            SELECT MIN(w.id) AS lo, MAX(w.id) AS hi
+            FROM words w
+            WHERE w.is_custom = FALSE
+        ) d, (
+            SELECT MIN(uw.word_id) AS lo, MAX(uw.word_id) AS hi
+            FROM user_words uw
+            WHERE uw.user_id = p_user_id AND uw.is_deleted = FALSE
+        ) c;
+
+        WHILE COALESCE(array_length(v_ids, 1), 0) < p_limit LOOP
+            v_next := NULL;
+            FOREACH v_start IN ARRAY ARRAY[v_lo + FLOOR(RANDOM() * (v_hi - v_lo + 1))::INTEGER, v_lo] LOOP
+                v_next := LEAST(({std_seek}
+                ), ({own_seek}
+                ));
+                EXIT WHEN v_next IS NOT NULL;
+            END LOOP;
+            -- Невыбранных слов не осталось
+            EXIT WHEN v_next IS NULL;
+            v_ids := v_ids || v_next;
+            RETURN NEXT v_next;
+        END LOOP;
+    END;
+    $$;
+
+    -- Следующая карточка: создаёт пользователя, берёт слово из очереди
+    -- повторения (кроме текущего p_current) и добавляет случайные варианты -
+    -- min(p_n_distractors, размер колоды - 1), без повторов и без самого слова.
+    -- Стандартные слова без строки в user_words ещё не повторялись и
+    -- стоят в очереди со временем регистрации пользователя.
+    -- user_states не трогает - текущую карточку сохраняет сессия в приложении
+    DROP FUNCTION IF EXISTS next_card(BIGINT, INTEGER);
+    CREATE OR REPLACE FUNCTION next_card(
+        p_user_id BIGINT,
+        p_n_distractors INTEGER,
+        p_current INTEGER
+    )
+    RETURNS TABLE (
+        id INTEGER,
+        english VARCHAR,
+        russian VARCHAR,
+        is_custom BOOLEAN,
+        is_target BOOLEAN
+    )
+    LANGUAGE plpgsql VOLATILE AS $$
+    DECLARE
+        v_current INTEGER;
+        v_first_seen TIMESTAMP;
+        v_target INTEGER;
+        v_ids INTEGER[];
+    BEGIN
+        INSERT INTO users (user_id)
+        VALUES (p_user_id)
+        ON CONFLICT (user_id) DO NOTHING;
+
+        SELECT u.first_seen INTO v_first_seen
+        FROM users u
+        WHERE u.user_id = p_user_id;
+
+        v_current := p_current;
+        IF v_current IS NULL THEN
+            SELECT us.current_word_id INTO v_current
+            FROM user_states us
+            WHERE us.user_id = p_user_id;
+        END IF;
+
+        -- Самое «просроченное» слово, но не то, что показано сейчас
+        SELECT q.word_id INTO v_target
+        FROM (
+            (
+                SELECT uw.word_id, uw.due_at
+                FROM user_words uw
+                WHERE uw.user_id = p_user_id AND uw.is_deleted = FALSE
+                ORDER BY uw.due_at
+                LIMIT 2
+            )
+            UNION ALL
+            (
+                SELECT w.id, v_first_seen
+                FROM words w
+                WHERE w.is_custom = FALSE
+                  AND NOT EXISTS (
+                      SELECT 1
+                      FROM user_words uw
+                      WHERE uw.user_id = p_user_id AND uw.word_id = w.id
+                  )
+                ORDER BY w.id
+                LIMIT 2
+            )
+        ) q
+        ORDER BY q.word_id IS NOT DISTINCT FROM v_current, q.due_at
+        LIMIT 1;
+
+        IF v_target IS NULL THEN
+            RETURN;
+        END IF;
+
+        v_ids := v_target || ARRAY(
+            SELECT s.word_id
+            FROM sample_deck(p_user_id, p_n_distractors + 1) AS s(word_id)
+            WHERE s.word_id <> v_target
+            LIMIT p_n_distractors
+        );
+
+        -- Вариантов меньше, чем нужно, только если так мала сама колода;
+        -- тогда добираем из неё целиком
+        IF array_length(v_ids, 1) <= p_n_distractors THEN
+            v_ids := v_ids || ARRAY(
+                SELECT d.word_id
+                FROM user_deck(p_user_id) d
+                WHERE d.word_id <> ALL(v_ids)
+                ORDER BY RANDOM()
+                LIMIT p_n_distractors + 1 - array_length(v_ids, 1)
+            );
+        END IF;
+
+        RETURN QUERY
+        SELECT w.id, w.english, w.russian, w.is_custom, w.id = v_ids[1]
+        FROM words w
+        WHERE w.id = ANY(v_ids);
+    END;
+    $$;
+
+    -- Оценка ответа по SM-2: quality от 0 до 5, при оценке ниже 3
+    -- слово возвращается в очередь через p_relearn. Для стандартного
+    -- слова строка прогресса создаётся при первом ответе
+    CREATE OR REPLACE FUNCTION review_word(
+        p_user_id BIGINT,
+        p_word_id INTEGER,
+        p_quality INTEGER,
+        p_relearn INTERVAL
+    )
+    RETURNS VOID
+    LANGUAGE sql VOLATILE AS $$
+        INSERT INTO user_words AS uw (user_id, word_id, ease, repetitions, interval_days, due_at)
+        SELECT p_user_id, p_word_id, n.ease, n.repetitions, n.interval_days,
+            CASE
+                WHEN n.repetitions = 0 THEN NOW() + p_relearn
+                ELSE NOW() + n.interval_days * INTERVAL '1 day'
+            END
+        FROM (
+            SELECT
+                GREATEST(1.3, cur.ease + 0.1 - (5 - p_quality) * (0.08 + (5 - p_quality) * 0.02)) AS ease,
+                CASE WHEN p_quality < 3 THEN 0 ELSE cur.repetitions + 1 END AS repetitions,
+                CASE
+                    WHEN p_quality < 3 THEN 0
+                    WHEN cur.repetitions = 0 THEN 1
+                    WHEN cur.repetitions = 1 THEN 6
+                    ELSE CEIL(cur.interval_days * cur.ease)::INTEGER
+                END AS interval_days
+            FROM (
+                SELECT
+                    COALESCE(prev.ease, 2.5) AS ease,
+                    COALESCE(prev.repetitions, 0) AS repetitions,
+                    COALESCE(prev.interval_days, 0) AS interval_days
+                FROM (SELECT 1) AS one
+                LEFT JOIN user_words prev
+                  ON prev.user_id = p_user_id AND prev.word_id = p_word_id
+            ) cur
+        ) n
+        ON CONFLICT (user_id, word_id) DO UPDATE
+        SET ease = EXCLUDED.ease,
+            repetitions = EXCLUDED.repetitions,
+            interval_days = EXCLUDED.interval_days,
+            due_at = EXCLUDED.due_at
+    $$;
+""".format(
+        std_seek=SAMPLE_STANDARD_SEEK_SQL.format(**_SEEK_ARGS).rstrip(),
+        own_seek=SAMPLE_OWN_SEEK_SQL.format(**_SEEK_ARGS).rstrip(),
+)
@@ -0,0 +1,71 @@
+# database/session.py
+import threading
+from time import monotonic
+
+from database.models import Word
+
+
+class SessionStore:
+    """Текущие карточки активных пользователей в памяти процесса.
+
+    Изменения помечаются «грязными» и периодически сбрасываются в
+    user_states одной пачкой (см. Database), поэтому проверка ответа
+    обходится без чтения из БД.
+    """
+
+    def __init__(self):
+        # user_id -> [слово, время последнего обращения, нужно ли сохранить]
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, user_id: int) -> Word:
+        with self._lock:
+            session = self._sessions.get(user_id)
+            if session is None:
+                return None
+            session[1] = monotonic()
+            return session[0]
+
+    def set(self, user_id: int, word: Word, dirty: bool = True):
+        with self._lock:
+            session = self._sessions.get(user_id)
+            # Не теряем ещё не сохранённое изменение
+            dirty = dirty or (session is not None and session[2])
+            self._sessions[user_id] = [word, monotonic(), dirty]
+
+    def discard(self, user_id: int):
+        with self._lock:
+            self._sessions.pop(user_id, None)
+
+    def drain_dirty(self) -> list:
+        """Забирает несохранённые изменения: список (user_id, word_id)"""
+        with self._lock:
+            changes = []
+            for user_id, session in self._sessions.items():
+                if session[2]:
+                    session[2] = False
+                    changes.append((user_id, session[0].id))
+            return changes
+
+    def restore_dirty(self, changes):
+        """Возвращает изменения после неудачной записи, если их не перезаписали"""
+        with self._lock:
+            for user_id, word_id in changes:
+                session = self._sessions.get(user_id)
+                if session is not None and session[0].id == word_id:
+                    session[2] = True
+
+    def evict_idle(self, max_idle: float) -> int:
+        """Удаляет сохранённые сессии, простаивающие дольше max_idle секунд"""
+        deadline = monotonic() - max_idle
+        with self._lock:
+            idle = [
+                user_id for user_id, (_, last_seen, dirty) in self._sessions.items()
+                if not dirty and last_seen < deadline
+            ]
+            for user_id in idle:
+                del self._sessions[user_id]
+            return len(idle)
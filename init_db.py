@@ -7,5 +7,6 @@ if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO)
 
     db = Database()
-    db.initialize()
-    print("База данных успешно инициализирована")
\ No newline at end of file
+    db.initialize(force=True)
+    print("База данных успешно инициализирована")
+    db.close()
\ No newline at end of file
@@ -0,0 +1,101 @@
+# logging_setup.py
+# Журналирование через очередь: обработчики только кладут запись в очередь,
+# форматирование и запись на диск выполняет отдельный поток
+import queue
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler, который не форматирует запись в вызывающем потоке.
+
+    Стандартный prepare() подставляет аргументы в сообщение ещё до
+    постановки в очередь; здесь это делает форматтер в потоке записи.
+    Если очередь заполнена, запись отбрасывается, а не блокирует обработчик.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает каждую N-ю запись DEBUG от заданных логгеров.
+
+    rates - {имя логгера: N}; дочерние логгеры наследуют частоту родителя.
+    INFO и выше (запуск, миграции, ошибки) проходят всегда.
+    """
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def _rate(self, name: str) -> int:
+        while name:
+            rate = self.rates.get(name)
+            if rate is not None:
+                return rate
+            name = name.rpartition(".")[0]
+        return 1
+
+    def filter(self, record) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        rate = self._rate(record.name)
+        if rate <= 1:
+            return True
+        with self._lock:
+            seen = self._seen.get(record.name, 0)
+            self._seen[record.name] = seen + 1
+        return seen % rate == 0
+
+
+def parse_sample_rates(value: str) -> dict:
+    """Разбирает строку вида "database.db=10,bot.utils=5" """
+    rates = {}
+    for item in value.split(","):
+        name, _, rate = item.strip().partition("=")
+        if name and rate:
+            rates[name.strip()] = max(1, int(rate))
+    return rates
+
+
+def setup_logging(level: str, filename: str, max_bytes: int, backup_count: int,
+                  queue_size: int, sample_rates: dict) -> QueueListener:
+    """Настраивает корневой логгер; возвращённый listener нужно остановить при выходе"""
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = RotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+    )
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    queue_handler = DeferredQueueHandler(log_queue)
+    if sample_rates:
+        queue_handler.addFilter(SamplingFilter(sample_rates))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -1,68 +1,252 @@
 # main.py
+import os
+import signal
 import logging
 from telebot import TeleBot, custom_filters
-from config import BOT_TOKEN
+from telebot.storage import StateMemoryStorage
+import config
+import metrics
+from logging_setup import setup_logging, parse_sample_rates
+from config import BOT_TOKEN, BOT_NUM_THREADS, BOT_MODE, NEXT_CARD_DELAY, SCHEDULER_WORKERS
 from database.db import Database
-from bot.handlers import register_handlers
-
-# Настройка логирования
-logging.basicConfig(
-        level=logging.DEBUG,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-                logging.FileHandler("bot_debug.log"),
-                logging.StreamHandler()
-        ]
-)
 
 logger = logging.getLogger(__name__)
 
 
+def configure_logging(filename: str = config.LOG_FILE):
+    """Настройка логирования: запись на диск в отдельном потоке"""
+    return setup_logging(
+            level=config.LOG_LEVEL,
+            filename=filename,
+            max_bytes=config.LOG_MAX_BYTES,
+            backup_count=config.LOG_BACKUP_COUNT,
+            queue_size=config.LOG_QUEUE_SIZE,
+            sample_rates=parse_sample_rates(config.LOG_SAMPLE_RATES),
+    )
+
+
+def worker_path(path: str, index: int) -> str:
+    """Отдельный файл процесса-обработчика: bot_debug.log -> bot_debug.1.log"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{index}{ext}"
+
+
+def run_webhook(bot: TeleBot, dispatch=None):
+    """Принимает обновления через локальный webhook-сервер"""
+    from bot.webhook import WebhookServer
+
+    server = WebhookServer(
+            bot,
+            host=config.WEBHOOK_LISTEN_HOST,
+            port=config.WEBHOOK_PORT,
+            path=config.WEBHOOK_PATH,
+            secret=config.WEBHOOK_SECRET,
+            queue_size=config.WEBHOOK_QUEUE_SIZE,
+            workers=config.WEBHOOK_WORKERS,
+            batch_size=config.WEBHOOK_BATCH_SIZE,
+            enqueue_timeout=config.WEBHOOK_ENQUEUE_TIMEOUT,
+            dispatch=dispatch,
+    )
+
+    if config.WEBHOOK_URL:
+        logger.info("Регистрация webhook: %s", config.WEBHOOK_URL)
+        bot.remove_webhook()
+        bot.set_webhook(
+                url=config.WEBHOOK_URL,
+                secret_token=config.WEBHOOK_SECRET or None,
+                max_connections=config.WEBHOOK_WORKERS,
+        )
+    else:
+        logger.info("WEBHOOK_URL не задан - webhook в Telegram не регистрируется")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Остановка webhook-сервера...")
+    finally:
+        server.shutdown()
+
+
+def build_bot(db: Database, threaded: bool):
+    """Создаёт бота с обработчиками и фильтрами; возвращает (bot, scheduler, state_storage, outbox)"""
+    # Обработчики и их зависимости нужны только процессу, который обрабатывает обновления:
+    # супервизор их не загружает, а обработчик - лишь после проверки БД
+    from bot.handlers import register_handlers
+    from bot.scheduler import DelayedScheduler
+    from bot.keyboards import NEXT_BUTTON, START_BUTTON
+    from bot.throttle import UserThrottle, ThrottleMiddleware
+    from bot.outbox import Outbox
+
+    logger.info("Создание бота с токеном: %s...", BOT_TOKEN[:10])
+    # Состояния диалогов храним в БД, чтобы они переживали перезапуск
+    if config.STATE_STORAGE == "postgres":
+        from bot.state_storage import PostgresStateStorage
+        state_storage = PostgresStateStorage(db, config.STATE_CACHE_TTL, config.STATE_CACHE_IDLE,
+                                             config.STATE_FLUSH_INTERVAL)
+    else:
+        state_storage = StateMemoryStorage()
+    bot = TeleBot(BOT_TOKEN, threaded=threaded, num_threads=BOT_NUM_THREADS, state_storage=state_storage,
+                  use_class_middlewares=True)
+
+    # Повторные нажатия «Дальше» и слишком частые сообщения отбрасываются до обработчиков
+    throttle = UserThrottle(config.THROTTLE_RATE, config.THROTTLE_BURST, config.THROTTLE_DEBOUNCE)
+    bot.setup_middleware(ThrottleMiddleware(bot, throttle, (NEXT_BUTTON, START_BUTTON)))
+
+    # Планировщик отложенных карточек
+    scheduler = DelayedScheduler(NEXT_CARD_DELAY, SCHEDULER_WORKERS)
+
+    # Ответы отправляют отдельные потоки с учётом лимитов Telegram
+    outbox = None
+    if config.OUTBOX_WORKERS > 0:
+        outbox = Outbox(
+                BOT_TOKEN,
+                workers=config.OUTBOX_WORKERS,
+                chat_rate=config.OUTBOX_CHAT_RATE,
+                chat_burst=config.OUTBOX_CHAT_BURST,
+                global_rate=config.OUTBOX_GLOBAL_RATE,
+                max_retries=config.OUTBOX_MAX_RETRIES,
+        )
+
+    # Регистрация обработчиков
+    logger.info("Регистрация обработчиков сообщений...")
+    register_handlers(bot, db, scheduler, outbox)
+
+    # Замер обработчиков и запросов к Bot API
+    metrics.instrument_handlers(bot)
+    metrics.instrument_telegram_api()
+
+    # Регистрация кастомных фильтров
+    logger.info("Добавление кастомных фильтров...")
+    bot.add_custom_filter(custom_filters.StateFilter(bot))
+    return bot, scheduler, state_storage, outbox
+
+
+def shutdown(scheduler=None, state_storage=None, db=None, outbox=None):
+    """Останавливает планировщик, досылает ответы, сбрасывает состояния и закрывает БД"""
+    try:
+        if scheduler is not None:
+            scheduler.stop()
+        if outbox is not None:
+            outbox.close()
+        if hasattr(state_storage, 'close'):
+            state_storage.close()
+        if db is not None:
+            logger.info("Закрытие соединений с базой данных...")
+            db.close()
+    except Exception as e:
+        logger.error("Ошибка при закрытии соединения с БД: %s", e)
+
+
+def run_worker(index: int, updates):
+    """Процесс-обработчик: своя БД и свой бот, обновления - из очереди супервизора"""
+    from bot.updates import process_updates
+
+    # Ctrl+C получает вся группа процессов; останавливает обработчики супервизор
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    listener = configure_logging(worker_path(config.LOG_FILE, index))
+    scheduler = state_storage = db = outbox = None
+    try:
+        db = Database()
+        if not db.ping():
+            raise RuntimeError("База данных не отвечает")
+
+        # Обновления обрабатываются по одному, чтобы сохранить их порядок
+        bot, scheduler, state_storage, outbox = build_bot(db, threaded=False)
+        metrics.start_exporters(
+                config.METRICS_HOST, config.METRICS_PORT + 1 + index if config.METRICS_PORT else 0,
+                worker_path(config.METRICS_SNAPSHOT_FILE, index) if config.METRICS_SNAPSHOT_FILE else "",
+                config.METRICS_SNAPSHOT_INTERVAL
+        )
+
+        logger.info("Обработчик %s готов к работе", index)
+        process_updates(bot, updates, config.WORKER_BATCH_SIZE)
+    except Exception as e:
+        logger.exception("Критическая ошибка в обработчике %s: %s", index, e)
+        raise
+    finally:
+        shutdown(scheduler, state_storage, db, outbox)
+        logger.info("Обработчик %s завершён", index)
+        listener.stop()
+
+
+def run_supervisor():
+    """Принимает обновления и раздаёт их BOT_WORKERS процессам-обработчикам"""
+    from bot.supervisor import Supervisor
+
+    # Схему готовим один раз здесь, чтобы обработчики стартовали сразу
+    db = Database()
+    try:
+        db.initialize(force=not config.DB_FAST_STARTUP)
+    finally:
+        db.close()
+    logger.info("База данных успешно инициализирована")
+
+    supervisor = Supervisor(run_worker, config.BOT_WORKERS, config.WORKER_QUEUE_SIZE,
+                            config.WEBHOOK_ENQUEUE_TIMEOUT)
+    metrics.start_exporters(
+            config.METRICS_HOST, config.METRICS_PORT,
+            config.METRICS_SNAPSHOT_FILE, config.METRICS_SNAPSHOT_INTERVAL
+    )
+    supervisor.start()
+    logger.info("Запущено обработчиков: %s", config.BOT_WORKERS)
+    try:
+        if BOT_MODE == "webhook":
+            run_webhook(TeleBot(BOT_TOKEN, threaded=False), dispatch=supervisor.dispatch)
+        else:
+            supervisor.poll(BOT_TOKEN)
+    except KeyboardInterrupt:
+        logger.info("Остановка приёма обновлений...")
+    finally:
+        supervisor.stop()
+
+
 def main():
     logger.info("Запуск бота...")
 
+    scheduler = state_storage = db = outbox = None
     try:
+        if config.BOT_WORKERS > 0:
+            run_supervisor()
+            return
+
         # Инициализация базы данных
         logger.info("Создание подключения к базе данных...")
         db = Database()
 
         logger.info("Инициализация базы данных...")
-        db.initialize()
+        db.initialize(force=not config.DB_FAST_STARTUP)
         logger.info("База данных успешно инициализирована")
 
-        # Проверка наличия стандартных слов
-        logger.info("Проверка наличия слов в базе данных...")
-        test_words = db.get_user_words(1)  # Тестовый запрос
-        logger.info(f"Найдено {len(test_words)} слов в базе данных")
-
-        # Создание бота
-        logger.info(f"Создание бота с токеном: {BOT_TOKEN[:10]}...")
-        bot = TeleBot(BOT_TOKEN)
-
-        # Регистрация обработчиков
-        logger.info("Регистрация обработчиков сообщений...")
-        register_handlers(bot, db)
+        # Проверка доступности БД без записи
+        if not db.ping():
+            raise RuntimeError("База данных не отвечает")
 
-        # Регистрация кастомных фильтров
-        logger.info("Добавление кастомных фильтров...")
-        bot.add_custom_filter(custom_filters.StateFilter(bot))
+        # В режиме webhook обработку выполняют потоки сервера, чтобы
+        # ограниченная очередь действительно сдерживала нагрузку
+        bot, scheduler, state_storage, outbox = build_bot(db, threaded=BOT_MODE != "webhook")
+        metrics.start_exporters(
+                config.METRICS_HOST, config.METRICS_PORT,
+                config.METRICS_SNAPSHOT_FILE, config.METRICS_SNAPSHOT_INTERVAL
+        )
 
         # Запуск бота
         logger.info("Бот запущен и готов к работе...")
-        bot.infinity_polling()
+        if BOT_MODE == "webhook":
+            run_webhook(bot)
+        else:
+            bot.infinity_polling()
 
     except Exception as e:
-        logger.exception(f"Критическая ошибка в работе бота: {str(e)}")
+        logger.exception("Критическая ошибка в работе бота: %s", e)
     finally:
-        try:
-            if 'db' in locals():
-                logger.info("Закрытие соединения с базой данных...")
-                db.close()
-        except Exception as e:
-            logger.error(f"Ошибка при закрытии соединения с БД: {str(e)}")
-        finally:
-            logger.info("Работа бота завершена")
+        shutdown(scheduler, state_storage, db, outbox)
+        logger.info("Работа бота завершена")
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    log_listener = configure_logging()
+    try:
+        main()
+    finally:
+        # Дописываем в журнал всё, что осталось в очереди
+        log_listener.stop()
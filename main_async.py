@@ -0,0 +1,88 @@
+# main_async.py
+import asyncio
+import logging
+from telebot.async_telebot import AsyncTeleBot
+from telebot import asyncio_filters
+import config
+import metrics
+from logging_setup import setup_logging, parse_sample_rates
+from config import BOT_TOKEN
+from database.async_db import AsyncDatabase
+
+# Настройка логирования: запись на диск в отдельном потоке
+log_listener = setup_logging(
+        level=config.LOG_LEVEL,
+        filename=config.LOG_FILE,
+        max_bytes=config.LOG_MAX_BYTES,
+        backup_count=config.LOG_BACKUP_COUNT,
+        queue_size=config.LOG_QUEUE_SIZE,
+        sample_rates=parse_sample_rates(config.LOG_SAMPLE_RATES),
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    logger.info("Запуск бота в асинхронном режиме...")
+
+    db = AsyncDatabase()
+    try:
+        # Инициализация базы данных
+        logger.info("Создание пула соединений с базой данных...")
+        await db.connect()
+
+        logger.info("Инициализация базы данных...")
+        await db.initialize(force=not config.DB_FAST_STARTUP)
+        logger.info("База данных успешно инициализирована")
+
+        # Проверка доступности БД без записи
+        if not await db.ping():
+            raise RuntimeError("База данных не отвечает")
+
+        # Обработчики загружаются только после проверки БД
+        from bot.async_handlers import register_async_handlers
+        from bot.keyboards import NEXT_BUTTON, START_BUTTON
+        from bot.throttle import UserThrottle, AsyncThrottleMiddleware
+
+        # Создание бота
+        logger.info("Создание бота с токеном: %s...", BOT_TOKEN[:10])
+        bot = AsyncTeleBot(BOT_TOKEN)
+
+        # Повторные нажатия «Дальше» и слишком частые сообщения отбрасываются до обработчиков
+        throttle = UserThrottle(config.THROTTLE_RATE, config.THROTTLE_BURST, config.THROTTLE_DEBOUNCE)
+        bot.setup_middleware(AsyncThrottleMiddleware(bot, throttle, (NEXT_BUTTON, START_BUTTON)))
+
+        # Регистрация обработчиков
+        logger.info("Регистрация обработчиков сообщений...")
+        register_async_handlers(bot, db)
+
+        # Замер обработчиков и запросов к Bot API
+        metrics.instrument_handlers(bot)
+        metrics.instrument_async_telegram_api()
+        metrics.start_exporters(
+                config.METRICS_HOST, config.METRICS_PORT,
+                config.METRICS_SNAPSHOT_FILE, config.METRICS_SNAPSHOT_INTERVAL
+        )
+
+        # Регистрация кастомных фильтров
+        logger.info("Добавление кастомных фильтров...")
+        bot.add_custom_filter(asyncio_filters.StateFilter(bot))
+
+        # Запуск бота
+        logger.info("Бот запущен и готов к работе...")
+        await bot.infinity_polling()
+
+    except Exception as e:
+        logger.exception("Критическая ошибка в работе бота: %s", e)
+    finally:
+        logger.info("Закрытие соединений с базой данных...")
+        await db.close()
+        logger.info("Работа бота завершена")
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
+    finally:
+        # Дописываем в журнал всё, что осталось в очереди
+        log_listener.stop()
@@ -0,0 +1,344 @@
+# metrics.py
+# Счётчики и гистограммы времени выполнения; отдаются в формате Prometheus
+# по HTTP или периодически сохраняются в JSON-файл
+import json
+import time
+import inspect
+import logging
+import threading
+import contextvars
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм, секунды
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Монотонный счётчик с метками"""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount: float = 1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues) -> float:
+        with self._lock:
+            return self._values.get(labelvalues, 0)
+
+    def render(self) -> list:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labelvalues, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {value}")
+        return lines
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {",".join(map(str, k)): v for k, v in self._values.items()}
+
+
+class Histogram:
+    """Гистограмма длительностей с фиксированными корзинами"""
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labelvalues -> [счётчики по корзинам, сумма, количество]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues):
+        with self._lock:
+            series = self._values.get(labelvalues)
+            if series is None:
+                series = self._values[labelvalues] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list:
+        with self._lock:
+            values = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labelvalues, (counts, total, count) in values:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                labels = _format_labels(self.labelnames, labelvalues, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                    ",".join(map(str, k)): {"count": v[2], "sum": v[1], "buckets": dict(zip(self.buckets, v[0]))}
+                    for k, v in self._values.items()
+            }
+
+
+class Registry:
+    """Набор метрик процесса и дополнительные источники текста метрик"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        """Добавляет функцию, возвращающую готовые строки метрик (например, глубину очереди)"""
+        with self._lock:
+            self._collectors.append(collect)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics, collectors = list(self._metrics), list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        text = "\n".join(lines) + "\n"
+        for collect in collectors:
+            try:
+                text += collect()
+            except Exception as e:
+                logger.error("Ошибка при сборе метрик: %s", e)
+        return text
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            metrics = list(self._metrics)
+        return {"timestamp": time.time(), "metrics": {m.name: m.snapshot() for m in metrics}}
+
+
+REGISTRY = Registry()
+
+DB_CALLS = REGISTRY.counter("db_calls_total", "Вызовы методов Database", ("method",))
+DB_ERRORS = REGISTRY.counter("db_errors_total", "Ошибки запросов в методах Database", ("method",))
+DB_LATENCY = REGISTRY.histogram("db_call_seconds", "Время выполнения методов Database", ("method",))
+DB_POOL_WAIT = REGISTRY.histogram("db_pool_wait_seconds", "Ожидание соединения из пула")
+HANDLER_LATENCY = REGISTRY.histogram("handler_seconds", "Время работы обработчиков", ("handler",))
+HANDLER_ERRORS = REGISTRY.counter("handler_errors_total", "Необработанные исключения в обработчиках", ("handler",))
+TELEGRAM_LATENCY = REGISTRY.histogram("telegram_api_seconds", "Время запросов к Bot API", ("method",))
+TELEGRAM_ERRORS = REGISTRY.counter("telegram_api_errors_total", "Ошибки запросов к Bot API", ("method",))
+UPDATES_THROTTLED = REGISTRY.counter("updates_throttled_total", "Отброшенные до обработчиков обновления", ("reason",))
+
+# Метод Database, внутри которого выполняется текущий запрос
+_db_method = contextvars.ContextVar("db_method", default="unknown")
+
+
+def instrument_db(func):
+    """Считает вызовы и время метода Database (синхронного или асинхронного)"""
+    name = func.__name__
+
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            token = _db_method.set(name)
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                DB_LATENCY.observe(time.perf_counter() - started, name)
+                DB_CALLS.inc(name)
+                _db_method.reset(token)
+
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _db_method.set(name)
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            DB_LATENCY.observe(time.perf_counter() - started, name)
+            DB_CALLS.inc(name)
+            _db_method.reset(token)
+
+    return wrapper
+
+
+def record_db_error():
+    """Отмечает ошибку запроса для текущего метода Database.
+
+    Методы Database перехватывают исключения сами, поэтому ошибка
+    учитывается там, где она проходит через выдачу соединения.
+    """
+    DB_ERRORS.inc(_db_method.get())
+
+
+def _timed_handler(func):
+    name = func.__name__
+
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                HANDLER_ERRORS.inc(name)
+                raise
+            finally:
+                HANDLER_LATENCY.observe(time.perf_counter() - started, name)
+
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - started, name)
+
+    return wrapper
+
+
+def instrument_handlers(bot):
+    """Оборачивает зарегистрированные обработчики сообщений замером времени"""
+    for handler in bot.message_handlers:
+        handler["function"] = _timed_handler(handler["function"])
+
+
+def instrument_telegram_api():
+    """Замеряет запросы к Bot API синхронного TeleBot"""
+    from telebot import apihelper
+
+    make_request = apihelper._make_request
+    if getattr(make_request, "_instrumented", False):
+        return
+
+    @wraps(make_request)
+    def timed_request(token, method_name, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return make_request(token, method_name, *args, **kwargs)
+        except Exception:
+            TELEGRAM_ERRORS.inc(method_name)
+            raise
+        finally:
+            TELEGRAM_LATENCY.observe(time.perf_counter() - started, method_name)
+
+    timed_request._instrumented = True
+    apihelper._make_request = timed_request
+
+
+def instrument_async_telegram_api():
+    """Замеряет запросы к Bot API AsyncTeleBot"""
+    from telebot import asyncio_helper
+
+    process_request = asyncio_helper._process_request
+    if getattr(process_request, "_instrumented", False):
+        return
+
+    @wraps(process_request)
+    async def timed_request(token, url, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await process_request(token, url, *args, **kwargs)
+        except Exception:
+            TELEGRAM_ERRORS.inc(url)
+            raise
+        finally:
+            TELEGRAM_LATENCY.observe(time.perf_counter() - started, url)
+
+    timed_request._instrumented = True
+    asyncio_helper._process_request = timed_request
+
+
+def start_http_server(host: str, port: int):
+    """Отдаёт метрики на http://host:port/metrics из фонового потока"""
+    # http.server тянет за собой email и http.client - импортируем, только если нужен
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            payload = REGISTRY.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            logger.debug("metrics: " + format % args)
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info("Метрики доступны на http://%s:%s/metrics", host, port)
+    return httpd
+
+
+def start_snapshot_writer(path: str, interval: float):
+    """Периодически сохраняет снимок метрик в JSON-файл"""
+    stopped = threading.Event()
+
+    def write_loop():
+        while not stopped.wait(interval):
+            try:
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(REGISTRY.snapshot(), f, ensure_ascii=False)
+            except OSError as e:
+                logger.error("Не удалось сохранить метрики в %s: %s", path, e)
+
+    threading.Thread(target=write_loop, name="metrics-snapshot", daemon=True).start()
+    return stopped
+
+
+def start_exporters(host: str, port: int, snapshot_file: str, snapshot_interval: float):
+    """Запускает включённые в настройках способы выгрузки метрик"""
+    if port:
+        start_http_server(host, port)
+    if snapshot_file:
+        start_snapshot_writer(snapshot_file, snapshot_interval)